@@ -8,6 +8,9 @@ from abc import ABC, abstractmethod
 from typing import Any, Dict, Optional
 from langchain_core.messages import HumanMessage
 from langgraph.prebuilt import create_react_agent
+from report_stream import ReportDeltaStreamer
+from outbound_queue import deliver
+from llm_cache import LLMCacheMissError
 import datetime
 
 
@@ -18,6 +21,9 @@ class BaseAgent(ABC):
     所有专业分析Agent都应该继承这个类
     """
     
+    # 该Agent需要使用的预取数据项（对应 MultiAgentWorkflow 的 data_prefetch 节点）
+    prefetch_keys = ()
+    
     def __init__(self, name: str, description: str, verbose: bool = True):
         """
         初始化基础Agent
@@ -33,14 +39,18 @@ class BaseAgent(ABC):
         self.llm = None
         self.tools = None
         self.websocket = None
+        self._executor = None  # 缓存的ReAct执行器
+        self._executor_key = None  # 构建执行器时使用的 (llm, tools)
         
     def set_llm(self, llm):
-        """设置语言模型"""
+        """设置语言模型（使缓存的执行器失效）"""
         self.llm = llm
+        self._executor = None
         
     def set_tools(self, tools):
-        """设置工具集合"""
+        """设置工具集合（使缓存的执行器失效）"""
         self.tools = tools
+        self._executor = None
         
     def set_websocket(self, websocket):
         """设置WebSocket连接用于日志发送"""
@@ -49,23 +59,56 @@ class BaseAgent(ABC):
     async def send_log(self, message: str, log_type: str = "info"):
         """发送日志消息"""
         if self.websocket:
-            import json
             timestamp = datetime.datetime.now().strftime("%H:%M:%S")
-            await self.websocket.send_text(json.dumps({
+            # 放入连接的出站队列，不等待网络
+            await deliver(self.websocket, {
                 "message": f"[{self.name}] {message}",
                 "type": log_type,
                 "timestamp": timestamp
-            }))
+            })
         else:
             # 根据verbose参数决定是否打印日志
             if self.verbose:
                 print(f"[{self.name}] [{log_type.upper()}] {message}")
     
+    async def send_event(self, payload: Dict[str, Any]):
+        """发送结构化消息（仅在连接前端时发送）"""
+        if self.websocket:
+            await deliver(self.websocket, payload)
+    
+    def create_streamer(self) -> ReportDeltaStreamer:
+        """创建将模型输出实时推送到前端的增量推送器"""
+        return ReportDeltaStreamer(self.send_event, stream=self.get_result_key(), title=self.description)
+    
+    def record_error(self, state: Dict[str, Any], error: Exception):
+        """在状态中记录本Agent执行失败（调用方据此判断结果是否可用，如回测不缓存失败的决策）"""
+        state.setdefault("errors", []).append(f"{self.description}: {error}")
+    
     def verbose_print(self, message: str):
         """根据verbose参数决定是否打印消息"""
         if self.verbose:
             print(message)
     
+    def get_executor_tools(self) -> list:
+        """执行器使用的工具列表，不需要工具的Agent可覆盖此方法返回空列表"""
+        return self.tools
+    
+    def get_executor(self):
+        """
+        获取ReAct执行器
+        
+        编译后的图不保存运行状态，可以被并发调用复用，
+        因此每个 (llm, tools) 组合只构建一次
+        
+        Returns:
+            编译后的agent executor
+        """
+        tools = self.get_executor_tools()
+        if self._executor is None or self._executor_key[0] is not self.llm or self._executor_key[1] != tools:
+            self._executor = create_react_agent(self.llm, tools)
+            self._executor_key = (self.llm, tools)
+        return self._executor
+    
     def create_prompt(self, state: Dict[str, Any]) -> str:
         """
         创建分析提示词
@@ -119,15 +162,16 @@ class BaseAgent(ABC):
             # 创建提示词
             prompt = self.create_prompt(state)
             
-            # 创建agent executor
-            agent_executor = create_react_agent(self.llm, self.tools)
+            # 获取agent executor（按 llm/tools 缓存，不再每次重新构建）
+            agent_executor = self.get_executor()
             
             # 准备初始消息
             initial_messages = [HumanMessage(content=prompt)]
             config = {"configurable": {"thread_id": "1"}}
             
-            # 初始化思考内容累积器
+            # 初始化思考内容累积器和增量推送器
             thinking_buffer = ""
+            streamer = self.create_streamer()
             
             def flush_thinking():
                 """输出累积的思考内容"""
@@ -152,15 +196,21 @@ class BaseAgent(ABC):
             # 执行分析并显示优化的中间过程
             await self.send_log(f"⚡ 开始执行{self.description}，实时显示关键步骤", "info")
             
-            # 使用流式执行来捕获中间步骤
+            # 使用流式执行来捕获中间步骤，同时从同一次执行中收集最终状态
             tool_count = 0
             reasoning_count = 0
+            root_run_id = None
+            output_messages = []
             
             async for event in agent_executor.astream_events(
                 {"messages": initial_messages}, 
                 config=config,
                 version="v1"
             ):
+                if root_run_id is None:
+                    root_run_id = event["run_id"]
+                self.collect_graph_output(event, root_run_id, output_messages)
+                
                 # 处理不同类型的事件
                 if event["event"] == "on_chat_model_start":
                     await self.send_log("🧠 模型开始分析思考...", "info")
@@ -175,11 +225,13 @@ class BaseAgent(ABC):
                             if isinstance(content, list):
                                 content = str(content)
                             thinking_buffer += content
+                            await streamer.push(content)
                 
                 elif event["event"] == "on_tool_start":
                     # 工具调用前，输出完整的思考过程
+                    # 连接前端时思考内容已通过 report_delta 实时推送，不再重复发送
                     thinking_content = flush_thinking()
-                    if thinking_content:
+                    if thinking_content and not self.websocket:
                         await self.send_log(f"💭 **思考过程**\n{thinking_content}", "info")
                     
                     tool_count += 1
@@ -202,32 +254,22 @@ class BaseAgent(ABC):
                     if "agent" in event["name"].lower():
                         reasoning_count += 1
                         await self.send_log(f"🔄 **推理循环 #{reasoning_count}** 开始", "info")
+                        await streamer.start_turn()
                 
                 elif event["event"] == "on_chain_end":
                     if "agent" in event["name"].lower():
                         # 推理循环结束时，输出最后的思考内容
                         thinking_content = flush_thinking()
-                        if thinking_content:
+                        if thinking_content and not self.websocket:
                             await self.send_log(f"💭 **最终思考 #{reasoning_count}**\n{thinking_content}", "info")
                         await self.send_log(f"✨ **推理循环 #{reasoning_count}** 完成", "success")
             
-            # 获取最终结果
+            # 获取最终结果（直接使用流式执行得到的最终状态，无需再次执行）
             await self.send_log("📋 正在整理分析结果...", "info")
-            final_response = await agent_executor.ainvoke({"messages": initial_messages})
+            final_response = {"messages": initial_messages + output_messages}
             
             # 提取结果
-            if final_response and "messages" in final_response:
-                last_message = final_response["messages"][-1]
-                if hasattr(last_message, 'content'):
-                    # 确保content是字符串类型
-                    if isinstance(last_message.content, list):
-                        result = str(last_message.content)
-                    else:
-                        result = last_message.content
-                else:
-                    result = str(last_message)
-            else:
-                result = str(final_response)
+            result = self.extract_result(final_response)
             
             # 存储结果
             result_key = self.get_result_key()
@@ -242,18 +284,89 @@ class BaseAgent(ABC):
             word_count = len(result.split())
             await self.send_log(f"📊 **分析完成**: 生成 {result_length} 字符，约 {word_count} 词", "success")
             
-            # 显示完整结果
-            await self.send_log(f"📄 **完整分析结果**\n{result}", "success")
+            # 显示完整结果（连接前端时结果已逐步推送，这里只结束推送流）
+            await streamer.end(result)
+            if not self.websocket:
+                await self.send_log(f"📄 **完整分析结果**\n{result}", "success")
             
             await self.send_log(f"🎉 **{self.description}** 执行完成！", "success")
             
+        except LLMCacheMissError:
+            # 严格回放时缓存未命中需要中止回放，不能当作普通的分析失败
+            raise
         except Exception as e:
             await self.send_log(f"❌ **{self.description}失败**: {str(e)}", "error")
             result_key = self.get_result_key()
             state[result_key] = f"{self.description}执行失败: {e}"
+            self.record_error(state, e)
         
         return state
     
+    def collect_graph_output(self, event: Dict[str, Any], root_run_id: Optional[str], output_messages: list):
+        """
+        从根图的流式输出中累积新增消息
+        
+        根图每完成一个节点都会发出 on_chain_stream 事件，其中包含该节点写入的消息，
+        按顺序累积即可得到与 ainvoke 相同的最终消息列表，避免重复执行整个ReAct循环
+        
+        Args:
+            event: astream_events 产生的事件
+            root_run_id: 根图的运行ID
+            output_messages: 用于累积消息的列表（原地更新）
+        """
+        if event["event"] != "on_chain_stream" or event["run_id"] != root_run_id:
+            return
+        
+        chunk = event["data"].get("chunk")
+        if not isinstance(chunk, dict):
+            return
+        
+        for update in chunk.values():
+            if isinstance(update, dict) and update.get("messages"):
+                output_messages.extend(update["messages"])
+    
+    def extract_result(self, final_response: Any) -> str:
+        """
+        从agent的最终状态中提取结果文本
+        
+        Args:
+            final_response: agent执行后的最终状态
+            
+        Returns:
+            结果字符串
+        """
+        if final_response and final_response.get("messages"):
+            last_message = final_response["messages"][-1]
+            if hasattr(last_message, 'content'):
+                # 确保content是字符串类型
+                if isinstance(last_message.content, list):
+                    return str(last_message.content)
+                return last_message.content
+            return str(last_message)
+        return str(final_response)
+    
+    def get_prefetched_context(self, state: Dict[str, Any]) -> str:
+        """
+        获取系统预先获取的数据，用于注入到分析提示词中
+        
+        Args:
+            state: 状态字典
+            
+        Returns:
+            预取数据的提示词片段，没有可用数据时返回空字符串
+        """
+        prefetched_data = state.get('prefetched_data') or {}
+        sections = []
+        for key in self.prefetch_keys:
+            item = prefetched_data.get(key)
+            if item and item.get('content'):
+                sections.append(f"### {item['title']}（工具 `{item['tool']}`，参数 {item['args']}）\n{item['content']}")
+        
+        if not sections:
+            return ""
+        
+        return "\n## 已预先获取的数据\n以下数据已由系统统一获取，请直接基于这些数据分析，不要重复调用工具获取相同数据；仅在需要补充其他数据时再调用工具。\n\n" + "\n\n".join(sections) + "\n"
+    
     def get_common_context(self, state: Dict[str, Any]) -> str:
         """
         获取通用的上下文信息
@@ -11,6 +11,8 @@ from .base_agent import BaseAgent
 class FundamentalAgent(BaseAgent):
     """基本面分析Agent"""
     
+    prefetch_keys = ("basic_info", "industry", "profit", "growth", "balance", "cash_flow")
+    
     def __init__(self, verbose: bool = True):
         super().__init__(
             name="基本面分析Agent",
@@ -25,10 +27,11 @@ class FundamentalAgent(BaseAgent):
     def get_analysis_prompt(self, state: Dict[str, Any]) -> str:
         """生成基本面分析的提示词"""
         context = self.get_common_context(state)
+        prefetched = self.get_prefetched_context(state)
         
         return f"""请分析{state['company_name']}（股票代码：{state['stock_code']}）的基本面情况。
 {context}
-
+{prefetched}
 请进行以下基本面分析：
 
 ## 分析任务
@@ -7,7 +7,7 @@
 from typing import Any, Dict
 from .base_agent import BaseAgent
 from langchain_core.messages import HumanMessage
-from langgraph.prebuilt import create_react_agent
+from llm_cache import LLMCacheMissError
 import json
 import re
 
@@ -22,6 +22,10 @@ class InvestmentAgent(BaseAgent):
             verbose=verbose
         )
     
+    def get_executor_tools(self) -> list:
+        """不使用工具"""
+        return []
+    
     def get_result_key(self) -> str:
         """返回投资决策结果的键名"""
         return "investment_decision"
@@ -44,8 +48,8 @@ class InvestmentAgent(BaseAgent):
             
             await self.send_log(f"📝 正在基于综合分析和市场数据生成投资决策...", "info")
             
-            # 创建一个不带工具的agent executor
-            agent_executor = create_react_agent(self.llm, [])
+            # 获取不带工具的agent executor（按 llm 缓存）
+            agent_executor = self.get_executor()
             
             # 准备初始消息
             initial_messages = [HumanMessage(content=prompt)]
@@ -76,10 +80,14 @@ class InvestmentAgent(BaseAgent):
             
             await self.send_log(f"🎉 **{self.description}** 执行完成！", "success")
             
+        except LLMCacheMissError:
+            # 严格回放时缓存未命中需要中止回放，不能当作普通的分析失败
+            raise
         except Exception as e:
             await self.send_log(f"❌ **{self.description}失败**: {str(e)}", "error")
             result_key = self.get_result_key()
             state[result_key] = self.get_default_decision()
+            self.record_error(state, e)
         
         return state
     
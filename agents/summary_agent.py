@@ -7,7 +7,7 @@
 from typing import Any, Dict
 from .base_agent import BaseAgent
 from langchain_core.messages import HumanMessage
-from langgraph.prebuilt import create_react_agent
+from llm_cache import LLMCacheMissError
 
 
 class SummaryAgent(BaseAgent):
@@ -20,6 +20,10 @@ class SummaryAgent(BaseAgent):
             verbose=verbose
         )
     
+    def get_executor_tools(self) -> list:
+        """不使用工具"""
+        return []
+    
     def get_result_key(self) -> str:
         """返回汇总分析结果的键名"""
         return "summary_analysis"
@@ -43,8 +47,8 @@ class SummaryAgent(BaseAgent):
             # 汇总agent不需要工具，直接使用LLM
             await self.send_log(f"📝 正在整合三个专业分析结果，生成综合报告...", "info")
             
-            # 创建一个不带工具的agent executor用于汇总
-            agent_executor = create_react_agent(self.llm, [])  # 空工具列表
+            # 获取不带工具的agent executor（按 llm 缓存）
+            agent_executor = self.get_executor()
             
             # 准备初始消息
             initial_messages = [HumanMessage(content=prompt)]
@@ -52,6 +56,7 @@ class SummaryAgent(BaseAgent):
             
             # 初始化思考内容累积器
             thinking_buffer = ""
+            streamer = self.create_streamer()
             
             def flush_thinking():
                 """输出累积的思考内容"""
@@ -73,12 +78,19 @@ class SummaryAgent(BaseAgent):
                 thinking_buffer = ""
                 return None
             
-            # 使用流式执行来显示思考过程
+            # 使用流式执行来显示思考过程，同时从同一次执行中收集最终状态
+            root_run_id = None
+            output_messages = []
+            
             async for event in agent_executor.astream_events(
                 {"messages": initial_messages}, 
                 config=config,
                 version="v1"
             ):
+                if root_run_id is None:
+                    root_run_id = event["run_id"]
+                self.collect_graph_output(event, root_run_id, output_messages)
+                
                 # 处理不同类型的事件
                 if event["event"] == "on_chat_model_start":
                     await self.send_log("🧠 开始整合分析结果...", "info")
@@ -93,40 +105,33 @@ class SummaryAgent(BaseAgent):
                             if isinstance(content, list):
                                 content = str(content)
                             thinking_buffer += content
+                            await streamer.push(content)
                 
                 elif event["event"] == "on_chain_start":
                     if "agent" in event["name"].lower():
                         await self.send_log("🔄 **开始生成综合投资报告**", "info")
+                        await streamer.start_turn()
                 
                 elif event["event"] == "on_chain_end":
                     if "agent" in event["name"].lower():
                         # 报告生成结束时，输出完整的思考内容
+                        # 连接前端时报告内容已通过 report_delta 实时推送，不再重复发送
                         thinking_content = flush_thinking()
-                        if thinking_content:
+                        if thinking_content and not self.websocket:
                             await self.send_log(f"💭 **整合思考**:\n{thinking_content}", "info")
                         await self.send_log("✨ **综合报告生成完成**", "success")
             
-            # 获取最终结果
+            # 获取最终结果（直接使用流式执行得到的最终状态，无需再次执行）
             await self.send_log("📋 正在整理综合报告...", "info")
-            final_response = await agent_executor.ainvoke({"messages": initial_messages})
+            final_response = {"messages": initial_messages + output_messages}
             
             # 提取结果
-            if final_response and "messages" in final_response:
-                last_message = final_response["messages"][-1]
-                if hasattr(last_message, 'content'):
-                    # 确保content是字符串类型
-                    if isinstance(last_message.content, list):
-                        result = str(last_message.content)
-                    else:
-                        result = last_message.content
-                else:
-                    result = str(last_message)
-            else:
-                result = str(final_response)
+            result = self.extract_result(final_response)
             
             # 存储结果
             result_key = self.get_result_key()
             state[result_key] = result
+            await streamer.end(result if isinstance(result, str) else str(result))
             
             # 显示报告统计信息
             # 确保result是字符串
@@ -146,10 +151,14 @@ class SummaryAgent(BaseAgent):
             
             await self.send_log(f"🎉 **{self.description}** 执行完成！", "success")
             
+        except LLMCacheMissError:
+            # 严格回放时缓存未命中需要中止回放，不能当作普通的分析失败
+            raise
         except Exception as e:
             await self.send_log(f"❌ **{self.description}失败**: {str(e)}", "error")
             result_key = self.get_result_key()
             state[result_key] = f"{self.description}执行失败: {e}"
+            self.record_error(state, e)
         
         return state
     
@@ -11,6 +11,8 @@ from .base_agent import BaseAgent
 class TechnicalAgent(BaseAgent):
     """技术分析Agent"""
     
+    prefetch_keys = ("basic_info", "k_data")
+    
     def __init__(self, verbose: bool = True):
         super().__init__(
             name="技术分析Agent",
@@ -22,13 +24,28 @@ class TechnicalAgent(BaseAgent):
         """返回技术分析结果的键名"""
         return "technical_analysis"
     
+    def get_indicator_context(self, state: Dict[str, Any]) -> str:
+        """格式化系统预先计算的技术指标（无数据时返回空字符串）"""
+        indicators = state.get("technical_indicators")
+        if not indicators:
+            return ""
+        
+        return f"""## 系统计算的技术指标
+以下数值由程序根据日K线精确计算，请直接引用，不要再自行计算：
+
+{indicators}
+"""
+    
     def get_analysis_prompt(self, state: Dict[str, Any]) -> str:
         """生成技术分析的提示词"""
         context = self.get_common_context(state)
+        prefetched = self.get_prefetched_context(state)
+        indicators = self.get_indicator_context(state)
         
         return f"""请分析{state['company_name']}（股票代码：{state['stock_code']}）的技术指标。
 {context}
-
+{prefetched}
+{indicators}
 请进行以下技术分析：
 
 ## 分析任务
@@ -53,7 +70,7 @@ class TechnicalAgent(BaseAgent):
    - 评估成交量对价格走势的确认作用
 
 5. **移动平均线分析**
-   - 计算和分析短期、中期、长期移动平均线
+   - 分析短期、中期、长期移动平均线（优先使用系统计算的数值）
    - 分析均线的排列和支撑阻力作用
    - 判断均线系统的多空信号
 
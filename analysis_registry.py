@@ -0,0 +1,126 @@
+"""
+进行中分析的合并登记
+
+相同 (股票代码, 日期, 工作流类型) 的并发请求共享同一次分析：
+第一个请求启动分析，后到的请求直接订阅其日志流并等待同一个结果
+"""
+
+import asyncio
+import json
+from typing import Any, Awaitable, Callable, Dict, List, Tuple
+
+
+# 进行中分析的键: (股票代码, 日期, 工作流类型)
+AnalysisKey = Tuple[str, str, str]
+
+
+class LogBroadcaster:
+    """
+    将日志消息分发给多个订阅者（提供与 OutboundQueue 相同的 send_message 接口）
+
+    保留完整的消息历史，后加入的订阅者会先收到历史消息，再接收实时消息
+    """
+
+    def __init__(self):
+        self.history: List[Dict[str, Any]] = []
+        self.subscribers: List[Any] = []
+
+    def send_message(self, message: Dict[str, Any]) -> bool:
+        """记录消息并放入所有订阅者的出站队列（不等待网络，已关闭的订阅者会被移除）"""
+        self.history.append(message)
+        for subscriber in list(self.subscribers):
+            if not subscriber.send_message(message):
+                if getattr(subscriber, "closed", False):
+                    self.unsubscribe(subscriber)
+        return True
+
+    async def send_text(self, text: str):
+        """兼容 WebSocket.send_text 接口"""
+        self.send_message(json.loads(text))
+
+    def subscribe(self, subscriber):
+        """
+        添加订阅者，先补发历史消息
+
+        Args:
+            subscriber: 支持 send_message 的出站队列（如 OutboundQueue）
+        """
+        for message in self.history:
+            subscriber.send_message(message)
+        if not getattr(subscriber, "closed", False):
+            self.subscribers.append(subscriber)
+
+    def unsubscribe(self, subscriber):
+        """移除订阅者"""
+        if subscriber in self.subscribers:
+            self.subscribers.remove(subscriber)
+
+
+class _Flight:
+    """一次进行中的分析"""
+
+    def __init__(self, task: asyncio.Task, broadcaster: LogBroadcaster):
+        self.task = task
+        self.broadcaster = broadcaster
+        self.waiters = 0  # 正在等待结果的请求数
+
+
+class InflightAnalysisRegistry:
+    """进行中分析的登记表（singleflight）"""
+
+    def __init__(self):
+        self._inflight: Dict[AnalysisKey, _Flight] = {}
+
+    def is_running(self, key: AnalysisKey) -> bool:
+        """判断指定分析是否正在进行"""
+        return key in self._inflight
+
+    async def run(self, key: AnalysisKey, websocket,
+                  runner: Callable[[LogBroadcaster], Awaitable[Any]]) -> Any:
+        """
+        执行分析或加入正在进行的相同分析
+
+        某个请求被取消（如客户端断开）时只退出等待；最后一个请求也离开时才取消分析本身，
+        避免无人需要的分析继续占用模型和MCP资源
+
+        Args:
+            key: 分析键 (股票代码, 日期, 工作流类型)
+            websocket: 当前请求连接的出站队列，用于接收日志
+            runner: 启动分析的协程函数，参数为日志分发器（作为工作流的websocket使用）
+
+        Returns:
+            分析结果（加入已有分析时与第一个请求得到同一个结果）
+        """
+        flight = self._inflight.get(key)
+        if flight is None:
+            broadcaster = LogBroadcaster()
+            flight = _Flight(asyncio.create_task(runner(broadcaster)), broadcaster)
+            self._inflight[key] = flight
+            flight.task.add_done_callback(
+                lambda done: self._inflight.pop(key, None) if self._inflight.get(key) is flight else None
+            )
+
+        flight.broadcaster.subscribe(websocket)
+        flight.waiters += 1
+        try:
+            # shield: 某个请求方断开时不影响其他共享该分析的请求
+            return await asyncio.shield(flight.task)
+        finally:
+            flight.broadcaster.unsubscribe(websocket)
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                print(f"🛑 分析已无请求方，取消: {key[0]} @ {key[1]}")
+                flight.task.cancel()
+                # 取消后立即从登记表移除，新的相同请求会重新启动分析
+                self._inflight.pop(key, None)
+
+    def stats(self) -> Dict[str, Any]:
+        """进行中分析的概况"""
+        return {
+            "inflight": len(self._inflight),
+            "analyses": [
+                {"stock_code": key[0], "date": key[1], "workflow": key[2],
+                 "subscribers": len(flight.broadcaster.subscribers), "waiters": flight.waiters}
+                for key, flight in self._inflight.items()
+            ]
+        }
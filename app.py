@@ -2,16 +2,41 @@ from fastapi import FastAPI, WebSocket, WebSocketDisconnect
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 import json
+import os
 import asyncio
 from typing import List
 import uvicorn
+from contextlib import asynccontextmanager
 from multi_agent_websocket import MultiAgentWebSocketManager
+from resource_pool import AgentResourcePool
+from analysis_registry import InflightAnalysisRegistry
+from report_cache import ReportCache, DEFAULT_REPORT_TTL
+from outbound_queue import OutboundQueue
+
+# 进程级共享资源池（MCP会话、LLM客户端、工具结果缓存），所有WebSocket连接共用
+resource_pool = AgentResourcePool()
+# 进行中分析的登记表，相同股票的并发请求共享同一次分析
+analysis_registry = InflightAnalysisRegistry()
+# 已完成报告的缓存（有效期可通过 REPORT_CACHE_TTL 环境变量配置，单位秒）
+report_cache = ReportCache(ttl=float(os.getenv("REPORT_CACHE_TTL", DEFAULT_REPORT_TTL)))
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """启动时预热共享资源池，关闭时释放MCP会话"""
+    print("🔥 正在预热共享资源池...")
+    # 后台预热，不阻塞服务启动；预热期间到达的分析请求会等待预热完成后直接借用
+    warmup = asyncio.create_task(resource_pool.start())
+    yield
+    warmup.cancel()
+    await resource_pool.close()
+    print("🧹 共享资源池已关闭")
 
 # 创建 FastAPI 应用
 app = FastAPI(
     title="多Agent股票分析系统 API",
     description="基于LangGraph的多Agent并行股票分析系统，支持基本面、技术面、估值分析",
-    version="3.0.0"
+    version="3.0.0",
+    lifespan=lifespan
 )
 
 # 添加 CORS 支持
@@ -86,6 +111,9 @@ async def health_check():
     return {
         "status": "healthy",
         "active_connections": len(manager.active_connections),
+        "resource_pool": resource_pool.status(),
+        "inflight_analyses": analysis_registry.stats(),
+        "report_cache": report_cache.stats(),
         "timestamp": asyncio.get_event_loop().time()
     }
 
@@ -106,7 +134,10 @@ async def get_connections():
 async def multi_agent_websocket_endpoint(websocket: WebSocket):
     """多Agent分析的WebSocket端点"""
     await manager.connect(websocket)
-    multi_agent_manager = MultiAgentWebSocketManager(websocket)
+    # 每个连接一个出站队列：分析过程只把消息放入队列，由后台任务批量发送
+    outbound = OutboundQueue(websocket)
+    outbound.start()
+    multi_agent_manager = MultiAgentWebSocketManager(outbound, resource_pool, analysis_registry, report_cache)
     
     try:
         while True:
@@ -118,38 +149,46 @@ async def multi_agent_websocket_endpoint(websocket: WebSocket):
                 print(f"[多Agent] 收到消息: {message.get('type', 'unknown')}")
                 
                 if message["type"] == "execute_multi_agent":
+                    # force_refresh: 忽略缓存的报告重新分析；replay_logs: 命中缓存时重放完整日志
+                    force_refresh = bool(message.get("force_refresh", False))
+                    replay_logs = bool(message.get("replay_logs", False))
                     # 支持两种格式：新格式（直接传递公司名和股票代码）和旧格式（查询字符串）
                     if "company_name" in message and "stock_code" in message:
                         # 新格式：直接传递公司名和股票代码
                         company_name = message["company_name"]
                         stock_code = message["stock_code"]
                         print(f"[多Agent] 开始执行分析: {company_name} ({stock_code})")
-                        await multi_agent_manager.execute_multi_agent_analysis_direct(company_name, stock_code)
+                        # 分析作为任务运行，接收循环继续监听，客户端断开时可以立即取消
+                        multi_agent_manager.start_analysis(multi_agent_manager.execute_multi_agent_analysis_direct(
+                            company_name, stock_code, force_refresh, replay_logs
+                        ))
                     else:
                         # 旧格式：查询字符串（向后兼容）
                         query = message["query"]
                         print(f"[多Agent] 开始执行查询: {query[:50]}...")
-                        await multi_agent_manager.execute_multi_agent_analysis(query)
+                        multi_agent_manager.start_analysis(
+                            multi_agent_manager.execute_multi_agent_analysis(query, force_refresh, replay_logs)
+                        )
                     
                 elif message["type"] == "ping":
                     # 心跳检测
-                    await websocket.send_text(json.dumps({
+                    outbound.send_message({
                         "type": "pong",
                         "timestamp": asyncio.get_event_loop().time()
-                    }))
+                    })
                     
             except json.JSONDecodeError as e:
                 print(f"[多Agent] JSON 解析错误: {e}")
-                await websocket.send_text(json.dumps({
+                outbound.send_message({
                     "type": "error",
                     "message": "无效的 JSON 格式"
-                }))
+                })
             except Exception as e:
                 print(f"[多Agent] 处理消息时出错: {e}")
-                await websocket.send_text(json.dumps({
+                outbound.send_message({
                     "type": "error",
                     "message": f"处理消息时出错: {str(e)}"
-                }))
+                })
                 
     except WebSocketDisconnect:
         manager.disconnect(websocket)
@@ -157,6 +196,10 @@ async def multi_agent_websocket_endpoint(websocket: WebSocket):
     except Exception as e:
         print(f"[多Agent] WebSocket 错误: {e}")
         manager.disconnect(websocket)
+    finally:
+        # 取消该连接的分析，释放模型和MCP资源（仍有其他连接等待的共享分析不受影响）
+        await multi_agent_manager.cancel_tasks()
+        await outbound.close()
 
 # 启动配置
 if __name__ == "__main__":
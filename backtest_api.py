@@ -4,14 +4,12 @@
 提供回测系统的HTTP API接口，支持前端调用
 """
 
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, Response, request, jsonify, send_from_directory, stream_with_context
 from flask_cors import CORS
-import asyncio
 import json
 import os
-import threading
 from datetime import datetime
-from backtest_system import BacktestSystem
+from backtest_jobs import BacktestJobManager, DEFAULT_MAX_CONCURRENT_JOBS, DEFAULT_MAX_FINISHED_JOBS
 import logging
 
 # 设置日志
@@ -21,10 +19,11 @@ logger = logging.getLogger(__name__)
 app = Flask(__name__, static_folder='frontend', static_url_path='/static')
 CORS(app)  # 允许跨域请求
 
-# 全局变量存储回测实例
-current_backtest = None
-backtest_results = None
-backtest_status = {"is_running": False, "progress": 0, "message": ""}
+# 回测任务管理器：每个回测一个任务ID，多个回测在有界线程池中并发执行
+job_manager = BacktestJobManager(
+    max_concurrent_jobs=int(os.getenv("BACKTEST_MAX_JOBS", DEFAULT_MAX_CONCURRENT_JOBS)),
+    max_finished_jobs=int(os.getenv("BACKTEST_MAX_FINISHED_JOBS", DEFAULT_MAX_FINISHED_JOBS))
+)
 
 @app.route('/')
 def index():
@@ -55,9 +54,7 @@ def suggest_stocks():
 
 @app.route('/api/backtest/start', methods=['POST'])
 def start_backtest():
-    """启动回测"""
-    global current_backtest, backtest_status, backtest_results
-    
+    """提交回测任务，立即返回任务ID"""
     try:
         data = request.get_json()
         
@@ -67,190 +64,133 @@ def start_backtest():
             if field not in data:
                 return jsonify({'error': f'缺少必需参数: {field}'}), 400
         
-        # 检查是否已有回测在运行
-        if backtest_status["is_running"]:
-            return jsonify({'error': '已有回测在运行中，请等待完成'}), 400
-        
-        # 更新状态
-        backtest_status.update({
-            "is_running": True,
-            "progress": 0,
-            "message": "正在初始化回测系统..."
-        })
-        
-        # 清空之前的结果
-        backtest_results = None
-        
-        # 在新线程中运行回测
-        def run_backtest():
-            global current_backtest, backtest_results, backtest_status
-            
-            try:
-                # 创建回测实例
-                current_backtest = BacktestSystem(
-                    initial_capital=float(data['initial_capital']),
-                    verbose=True
-                )
-                
-                backtest_status.update({
-                    "progress": 10,
-                    "message": "回测系统初始化完成，开始运行回测..."
-                })
-                
-                # 定义进度回调函数
-                def progress_callback(progress, message):
-                    backtest_status.update({
-                        "progress": progress,
-                        "message": message
-                    })
-                    logger.info(f"进度更新: {progress}% - {message}")
-                
-                # 运行回测
-                loop = asyncio.new_event_loop()
-                asyncio.set_event_loop(loop)
-                
-                backtest_status.update({
-                    "progress": 15,
-                    "message": f"正在初始化回测 {data['company_name']} ({data['stock_code']})..."
-                })
-                
-                results = loop.run_until_complete(current_backtest.run_backtest(
-                    stock_code=data['stock_code'],
-                    company_name=data['company_name'],
-                    start_date=data['start_date'],
-                    end_date=data['end_date'],
-                    frequency=data['frequency'],
-                    progress_callback=progress_callback
-                ))
-                
-                backtest_status.update({
-                    "progress": 95,
-                    "message": "正在处理回测结果..."
-                })
-                
-                # 处理结果以便JSON序列化
-                processed_results = process_results_for_json(results)
-                backtest_results = processed_results
-                
-                backtest_status.update({
-                    "is_running": False,
-                    "progress": 100,
-                    "message": "回测完成！"
-                })
-                
-                logger.info("回测完成")
-                
-            except Exception as e:
-                logger.error(f"回测错误: {e}")
-                backtest_status.update({
-                    "is_running": False,
-                    "progress": 0,
-                    "message": f"回测失败: {str(e)}"
-                })
-            finally:
-                if loop:
-                    loop.close()
-        
-        # 启动回测线程
-        thread = threading.Thread(target=run_backtest)
-        thread.daemon = True
-        thread.start()
+        job = job_manager.submit(data)
         
         return jsonify({
-            'message': '回测已启动',
-            'status': backtest_status
-        })
+            'message': '回测已提交',
+            'job_id': job.job_id,
+            'status': job.status()
+        }), 202
         
     except Exception as e:
         logger.error(f"启动回测失败: {e}")
-        backtest_status.update({
-            "is_running": False,
-            "progress": 0,
-            "message": f"启动失败: {str(e)}"
-        })
         return jsonify({'error': str(e)}), 500
 
+def resolve_job(job_id=None):
+    """按ID查找任务；未指定ID时使用最近提交的任务（兼容旧接口）"""
+    job_id = job_id or request.args.get('job_id')
+    return job_manager.get(job_id) if job_id else job_manager.latest()
+
+@app.route('/api/backtest/jobs', methods=['GET'])
+def list_backtest_jobs():
+    """获取全部回测任务"""
+    return jsonify({
+        'jobs': job_manager.list_jobs(),
+        'stats': job_manager.stats()
+    })
+
 @app.route('/api/backtest/status', methods=['GET'])
-def get_backtest_status():
+@app.route('/api/backtest/jobs/<job_id>', methods=['GET'])
+def get_backtest_status(job_id=None):
     """获取回测状态"""
-    return jsonify(backtest_status)
+    job = resolve_job(job_id)
+    if job is None:
+        return jsonify({'error': '回测任务不存在'}), 404
+    
+    return jsonify(job.status())
+
+@app.route('/api/backtest/jobs/<job_id>/events', methods=['GET'])
+def stream_backtest_events(job_id):
+    """
+    回测事件流（Server-Sent Events）
+
+    推送 progress、decision、trade、status 事件，任务结束后关闭；
+    新订阅者先收到最近的事件，断线重连时按 Last-Event-ID 从断点继续
+    """
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({'error': '回测任务不存在'}), 404
+    
+    try:
+        last_event_id = int(request.headers.get('Last-Event-ID') or request.args.get('last_event_id') or 0)
+    except ValueError:
+        last_event_id = 0
+    
+    def generate():
+        # 告知浏览器断线后的重连间隔（毫秒）
+        yield "retry: 3000\n\n"
+        for event in job.stream_events(last_event_id):
+            if event is None:
+                yield ": heartbeat\n\n"
+                continue
+            data = json.dumps(event['data'], ensure_ascii=False, default=str)
+            yield f"id: {event['id']}\nevent: {event['type']}\ndata: {data}\n\n"
+    
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 @app.route('/api/backtest/results', methods=['GET'])
-def get_backtest_results():
+@app.route('/api/backtest/jobs/<job_id>/results', methods=['GET'])
+def get_backtest_results(job_id=None):
     """获取回测结果"""
-    global backtest_results
-    
-    if backtest_results is None:
+    job = resolve_job(job_id)
+    if job is None or job.results is None:
         return jsonify({'error': '暂无回测结果'}), 404
     
-    return jsonify(backtest_results)
+    return jsonify(job.results)
 
 @app.route('/api/backtest/stop', methods=['POST'])
-def stop_backtest():
+@app.route('/api/backtest/jobs/<job_id>/stop', methods=['POST'])
+def stop_backtest(job_id=None):
     """停止回测"""
-    global backtest_status
-    
-    if not backtest_status["is_running"]:
+    job = resolve_job(job_id)
+    if job is None or not job.is_running:
         return jsonify({'error': '没有正在运行的回测'}), 400
     
-    # 这里可以添加停止逻辑
-    backtest_status.update({
-        "is_running": False,
-        "progress": 0,
-        "message": "回测已停止"
-    })
+    job_manager.stop(job.job_id)
     
-    return jsonify({'message': '回测已停止'})
+    # 运行中的任务会在当前分析被中断后结束，最终状态通过事件流或状态接口获取
+    return jsonify({'message': '回测已停止' if not job.is_running else '正在停止回测', 'status': job.status()})
+
+@app.route('/api/backtest/jobs/<job_id>/resume', methods=['POST'])
+def resume_backtest(job_id):
+    """从检查点恢复中断的回测（已完成的决策点直接重放，从下一个决策点继续）"""
+    job = job_manager.get(job_id)
+    if job is not None and job.is_running:
+        return jsonify({'error': '回测仍在运行中'}), 400
+    
+    job = job_manager.resume(job_id)
+    if job is None:
+        return jsonify({'error': '没有可恢复的检查点'}), 404
+    
+    return jsonify({
+        'message': '回测已恢复',
+        'job_id': job.job_id,
+        'status': job.status()
+    }), 202
 
 @app.route('/api/backtest/download', methods=['GET'])
-def download_results():
+@app.route('/api/backtest/jobs/<job_id>/download', methods=['GET'])
+def download_results(job_id=None):
     """下载回测结果"""
-    global backtest_results
-    
-    if backtest_results is None:
+    job = resolve_job(job_id)
+    if job is None or job.results is None:
         return jsonify({'error': '暂无回测结果'}), 404
     
     try:
         # 生成文件名
-        filename = f"backtest_results_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
-        
-        # 保存结果到文件
-        with open(filename, 'w', encoding='utf-8') as f:
-            json.dump(backtest_results, f, ensure_ascii=False, indent=2, default=str)
+        finished = datetime.fromtimestamp(job.finished_at or job.created_at).strftime('%Y%m%d_%H%M%S')
+        filename = f"backtest_results_{finished}_{job.job_id}.json"
         
-        return send_from_directory('.', filename, as_attachment=True)
+        # 直接返回内容，不在服务器上写文件
+        body = json.dumps(job.results, ensure_ascii=False, indent=2, default=str)
+        return Response(body, mimetype='application/json',
+                        headers={'Content-Disposition': f'attachment; filename="{filename}"'})
         
     except Exception as e:
         logger.error(f"下载结果失败: {e}")
         return jsonify({'error': str(e)}), 500
 
-def process_results_for_json(results):
-    """处理回测结果以便JSON序列化"""
-    def convert_to_serializable(obj):
-        if hasattr(obj, 'isoformat'):  # datetime对象
-            return obj.isoformat()
-        elif hasattr(obj, 'item'):  # numpy对象
-            return obj.item()
-        elif hasattr(obj, 'tolist'):  # numpy数组
-            return obj.tolist()
-        else:
-            return str(obj)
-    
-    def process_dict(d):
-        if isinstance(d, dict):
-            return {k: process_dict(v) for k, v in d.items()}
-        elif isinstance(d, list):
-            return [process_dict(item) for item in d]
-        else:
-            try:
-                # 尝试JSON序列化
-                json.dumps(d)
-                return d
-            except (TypeError, ValueError):
-                return convert_to_serializable(d)
-    
-    return process_dict(results)
-
 if __name__ == '__main__':
     print("🚀 启动回测系统Web服务器...")
     print("📱 前端地址: http://localhost:5000")
@@ -0,0 +1,114 @@
+"""
+回测检查点
+
+每个回测任务一个只追加的JSONL日志：首行记录回测参数，之后每完成一个决策点追加一行
+（决策、成交价和执行后的持仓）。进程崩溃或模型服务中断后可以从日志恢复，
+已完成的决策直接重放，不会再次调用模型
+"""
+
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+
+# 默认的检查点目录
+DEFAULT_CHECKPOINT_DIR = os.path.join("data", "backtest_checkpoints")
+
+
+class BacktestCheckpoint:
+    """单个回测任务的只追加检查点日志"""
+
+    def __init__(self, job_id: str, directory: str = DEFAULT_CHECKPOINT_DIR):
+        """
+        Args:
+            job_id: 回测任务ID
+            directory: 检查点文件所在目录
+        """
+        self.job_id = job_id
+        self.path = os.path.join(directory, f"{job_id}.jsonl")
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    @property
+    def exists(self) -> bool:
+        """检查点文件是否存在"""
+        return os.path.exists(self.path)
+
+    def _append(self, record: Dict[str, Any]):
+        """追加一条记录并刷到磁盘，崩溃时最多丢失正在写入的一行"""
+        line = json.dumps({**record, "time": time.time()}, ensure_ascii=False, default=str)
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+
+    def start(self, params: Dict[str, Any]):
+        """记录回测参数（文件已存在时不重复写入，用于恢复）"""
+        if not self.exists:
+            self._append({"type": "start", "params": params})
+
+    def record_decision(self, date: str, price: float, decision: Dict[str, Any],
+                        analyzed: bool, portfolio: Dict[str, Any]):
+        """
+        记录一个已执行的决策点
+
+        Args:
+            date: 决策日期
+            price: 成交价
+            decision: 投资决策
+            analyzed: 决策是否来自成功的分析（失败时的默认决策恢复后会重新分析）
+            portfolio: 执行后的现金、持仓和总资产
+        """
+        self._append({"type": "decision", "date": date, "price": price, "decision": decision,
+                      "analyzed": analyzed, **portfolio})
+
+    def finish(self, cancelled: bool):
+        """记录回测结束"""
+        self._append({"type": "end", "cancelled": cancelled})
+
+    def load(self) -> List[Dict[str, Any]]:
+        """
+        读取全部记录（忽略崩溃时写了一半的最后一行）
+
+        Returns:
+            记录列表
+        """
+        if not self.exists:
+            return []
+        records = []
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    continue
+        return records
+
+    def params(self) -> Optional[Dict[str, Any]]:
+        """回测参数，检查点不存在时返回None"""
+        for record in self.load():
+            if record.get("type") == "start":
+                return record["params"]
+        return None
+
+    def decisions(self) -> Dict[str, Dict[str, Any]]:
+        """
+        已完成分析的决策（按日期），恢复时作为分析缓存使用
+
+        Returns:
+            日期 -> 投资决策
+        """
+        return {
+            record["date"]: record["decision"]
+            for record in self.load()
+            if record.get("type") == "decision" and record.get("analyzed")
+        }
+
+    def remove(self):
+        """删除检查点文件"""
+        with self._lock:
+            if self.exists:
+                os.remove(self.path)
@@ -0,0 +1,398 @@
+"""
+回测任务管理
+
+每次提交的回测作为一个带ID的任务进入有界线程池排队执行，多个回测可以同时运行；
+各任务的状态、进度和结果相互独立，已结束的任务按最近使用保留有限数量。
+任务运行中产生的进度、决策和交易事件保存在有界的重放缓冲区中，供事件流订阅者实时接收；
+每个任务写入检查点日志，中断的任务可以按任务ID恢复
+"""
+
+import asyncio
+import json
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterator, List, Optional
+
+from backtest_checkpoint import BacktestCheckpoint, DEFAULT_CHECKPOINT_DIR
+from benchmark_series import BenchmarkSeriesCache
+from backtest_system import BacktestSystem, CancellationToken, DEFAULT_ANALYSIS_CONCURRENCY
+from llm_cache import PersistentLLMCache
+from market_data_store import MarketDataStore
+
+
+# 默认同时运行的回测数量
+DEFAULT_MAX_CONCURRENT_JOBS = 2
+# 默认保留的已结束任务数量
+DEFAULT_MAX_FINISHED_JOBS = 50
+# 每个任务保留的最近事件数量（后加入的订阅者先收到这些事件）
+EVENT_REPLAY_SIZE = 500
+# 事件流无新事件时发送心跳的间隔（秒）
+EVENT_HEARTBEAT_INTERVAL = 15.0
+
+# 任务状态
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_COMPLETED = "completed"
+JOB_FAILED = "failed"
+JOB_STOPPED = "stopped"
+FINISHED_STATES = {JOB_COMPLETED, JOB_FAILED, JOB_STOPPED}
+
+
+def process_results_for_json(results):
+    """处理回测结果以便JSON序列化"""
+    def convert_to_serializable(obj):
+        if hasattr(obj, 'isoformat'):  # datetime对象
+            return obj.isoformat()
+        elif hasattr(obj, 'item'):  # numpy对象
+            return obj.item()
+        elif hasattr(obj, 'tolist'):  # numpy数组
+            return obj.tolist()
+        else:
+            return str(obj)
+
+    def process_dict(d):
+        if isinstance(d, dict):
+            return {k: process_dict(v) for k, v in d.items()}
+        elif isinstance(d, list):
+            return [process_dict(item) for item in d]
+        else:
+            try:
+                # 尝试JSON序列化
+                json.dumps(d)
+                return d
+            except (TypeError, ValueError):
+                return convert_to_serializable(d)
+
+    return process_dict(results)
+
+
+class BacktestJob:
+    """一个回测任务"""
+
+    def __init__(self, params: Dict[str, Any], job_id: Optional[str] = None):
+        """
+        Args:
+            params: 回测参数（stock_code、company_name、start_date、end_date、initial_capital、frequency 等）
+            job_id: 任务ID，恢复任务时沿用原ID，默认新建
+        """
+        self.job_id = job_id or uuid.uuid4().hex[:12]
+        self.params = params
+        self.state = JOB_QUEUED
+        self.progress = 0
+        self.message = "排队等待执行..."
+        self.results: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.future = None
+        self.cancel_token = CancellationToken()
+
+        self._events = deque(maxlen=EVENT_REPLAY_SIZE)  # 最近的事件 {"id", "type", "data"}
+        self._last_event_id = 0
+        self._condition = threading.Condition()
+
+    @property
+    def is_running(self) -> bool:
+        """任务是否尚未结束（排队或运行中）"""
+        return self.state not in FINISHED_STATES
+
+    def publish(self, event_type: str, data: Dict[str, Any]):
+        """
+        发布事件并唤醒所有订阅者（可在任意线程调用）
+
+        Args:
+            event_type: 事件类型（progress、decision、trade、status）
+            data: 事件数据
+        """
+        with self._condition:
+            self._last_event_id += 1
+            self._events.append({"id": self._last_event_id, "type": event_type, "data": data})
+            self._condition.notify_all()
+
+    def update(self, progress: int, message: str):
+        """更新进度"""
+        self.progress = progress
+        self.message = message
+        self.publish("progress", {"progress": progress, "message": message})
+
+    def set_state(self, state: str):
+        """更新任务状态并发布状态事件（结束状态是事件流的最后一个事件）"""
+        self.state = state
+        if state in FINISHED_STATES:
+            self.finished_at = time.time()
+        self.publish("status", self.status())
+
+    def stream_events(self, last_event_id: int = 0,
+                      heartbeat_interval: float = EVENT_HEARTBEAT_INTERVAL) -> Iterator[Optional[Dict[str, Any]]]:
+        """
+        订阅事件：先补发重放缓冲区中 last_event_id 之后的事件，再实时接收新事件，任务结束后停止
+
+        Args:
+            last_event_id: 已收到的最后一个事件ID（断线重连时使用）
+            heartbeat_interval: 无新事件时产出 None 的间隔，供调用方发送心跳
+
+        Returns:
+            事件迭代器（None 表示心跳）
+        """
+        while True:
+            with self._condition:
+                pending = [event for event in self._events if event["id"] > last_event_id]
+                if not pending:
+                    if not self.is_running:
+                        return
+                    self._condition.wait(heartbeat_interval)
+                    pending = [event for event in self._events if event["id"] > last_event_id]
+
+            if not pending:
+                yield None
+                continue
+            for event in pending:
+                last_event_id = event["id"]
+                yield event
+
+    def status(self) -> Dict[str, Any]:
+        """任务状态（兼容原 backtest_status 的 is_running/progress/message 字段）"""
+        return {
+            "job_id": self.job_id,
+            "state": self.state,
+            "is_running": self.is_running,
+            "progress": self.progress,
+            "message": self.message,
+            "stock_code": self.params.get("stock_code"),
+            "company_name": self.params.get("company_name"),
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "error": self.error,
+            "stopping": self.is_running and self.cancel_token.cancelled,
+            "has_results": self.results is not None
+        }
+
+
+class BacktestJobManager:
+    """回测任务管理器（有界线程池 + 已结束任务LRU）"""
+
+    def __init__(self, max_concurrent_jobs: int = DEFAULT_MAX_CONCURRENT_JOBS,
+                 max_finished_jobs: int = DEFAULT_MAX_FINISHED_JOBS,
+                 data_store: Optional[MarketDataStore] = None,
+                 llm_cache: Optional[PersistentLLMCache] = None,
+                 checkpoint_dir: str = DEFAULT_CHECKPOINT_DIR):
+        """
+        初始化任务管理器
+
+        Args:
+            max_concurrent_jobs: 同时运行的回测数量上限，超出的任务排队等待
+            max_finished_jobs: 保留的已结束任务数量，超出时淘汰最久未访问的任务
+            data_store: 所有任务共享的本地行情存储
+            llm_cache: 所有任务共享的LLM响应缓存
+            checkpoint_dir: 检查点目录
+        """
+        self.max_concurrent_jobs = max_concurrent_jobs
+        self.max_finished_jobs = max_finished_jobs
+        self.checkpoint_dir = checkpoint_dir
+        # 各任务共享行情存储和LLM缓存，相同股票、相同决策点的数据和模型响应只获取一次
+        self.data_store = data_store or MarketDataStore()
+        self.llm_cache = llm_cache or PersistentLLMCache()
+        # 基准序列在进程内缓存，各任务对比同一基准时不重复加载
+        self.benchmark_cache = BenchmarkSeriesCache(self.data_store)
+
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrent_jobs, thread_name_prefix="backtest")
+        self._active: "OrderedDict[str, BacktestJob]" = OrderedDict()  # 排队和运行中的任务
+        self._finished: "OrderedDict[str, BacktestJob]" = OrderedDict()  # 已结束的任务（LRU）
+        self._lock = threading.Lock()
+
+    def submit(self, params: Dict[str, Any], job_id: Optional[str] = None) -> BacktestJob:
+        """
+        提交回测任务
+
+        Args:
+            params: 回测参数
+            job_id: 任务ID，默认新建
+
+        Returns:
+            新建的任务（立即返回，任务在线程池中排队执行）
+        """
+        job = BacktestJob(params, job_id)
+        with self._lock:
+            self._active[job.job_id] = job
+        job.future = self._executor.submit(self._run, job)
+        print(f"📥 回测任务已提交: {job.job_id} {params.get('company_name')} ({params.get('stock_code')})")
+        return job
+
+    def resume(self, job_id: str) -> Optional[BacktestJob]:
+        """
+        从检查点恢复中断的回测（包括进程重启前的任务）
+
+        沿用原任务ID重新排队执行：检查点中已完成的决策点按原决策重放重建持仓，
+        从下一个决策点继续分析，已完成的决策不会再次调用模型
+
+        Args:
+            job_id: 原任务ID
+
+        Returns:
+            恢复后的任务；检查点不存在或任务仍在运行时返回None
+        """
+        job = self.get(job_id)
+        if job is not None and job.is_running:
+            return None
+
+        params = BacktestCheckpoint(job_id, self.checkpoint_dir).params()
+        if params is None:
+            return None
+
+        with self._lock:
+            self._finished.pop(job_id, None)
+        print(f"♻️ 恢复回测任务: {job_id}")
+        return self.submit(params, job_id)
+
+    def get(self, job_id: str) -> Optional[BacktestJob]:
+        """按ID查找任务（访问已结束的任务会刷新其LRU位置）"""
+        with self._lock:
+            job = self._active.get(job_id)
+            if job is None:
+                job = self._finished.get(job_id)
+                if job is not None:
+                    self._finished.move_to_end(job_id)
+            return job
+
+    def latest(self) -> Optional[BacktestJob]:
+        """最近提交的任务"""
+        with self._lock:
+            jobs = list(self._active.values()) + list(self._finished.values())
+        return max(jobs, key=lambda job: job.created_at) if jobs else None
+
+    def list_jobs(self) -> List[Dict[str, Any]]:
+        """全部任务的状态，按提交时间倒序"""
+        with self._lock:
+            jobs = list(self._active.values()) + list(self._finished.values())
+        return [job.status() for job in sorted(jobs, key=lambda job: job.created_at, reverse=True)]
+
+    def stop(self, job_id: str) -> bool:
+        """
+        停止任务
+
+        排队中的任务直接取消；运行中的任务通过取消令牌中断进行中的分析，
+        回测在数秒内结束并保留截至最后一个完成决策点的部分结果
+
+        Returns:
+            是否已请求停止
+        """
+        job = self.get(job_id)
+        if job is None or not job.is_running:
+            return False
+        if job.state == JOB_QUEUED and job.future.cancel():
+            job.update(0, "回测已停止")
+            self._finish(job, JOB_STOPPED)
+            return True
+        job.cancel_token.cancel()
+        job.update(job.progress, "正在停止回测...")
+        print(f"🛑 正在停止回测任务: {job.job_id}")
+        return True
+
+    def _finish(self, job: BacktestJob, state: str):
+        """设置结束状态并将任务移入已结束列表，超出上限时淘汰最久未访问的任务"""
+        job.set_state(state)
+        with self._lock:
+            self._active.pop(job.job_id, None)
+            self._finished[job.job_id] = job
+            while len(self._finished) > self.max_finished_jobs:
+                self._finished.popitem(last=False)
+
+    def _run(self, job: BacktestJob):
+        """在工作线程中运行回测（每个任务使用独立的事件循环）"""
+        params = job.params
+        job.started_at = time.time()
+        job.set_state(JOB_RUNNING)
+        job.update(5, "正在初始化回测系统...")
+        state = JOB_FAILED
+
+        checkpoint = BacktestCheckpoint(job.job_id, self.checkpoint_dir)
+        loop = asyncio.new_event_loop()
+        try:
+            asyncio.set_event_loop(loop)
+            backtest = BacktestSystem(
+                initial_capital=float(params['initial_capital']),
+                verbose=True,
+                data_store=self.data_store,
+                llm_cache=self.llm_cache,
+                strict_replay=bool(params.get('strict_replay', False)),
+                benchmark_cache=self.benchmark_cache
+            )
+            job.update(15, f"正在初始化回测 {params['company_name']} ({params['stock_code']})...")
+
+            results = loop.run_until_complete(backtest.run_backtest(
+                stock_code=params['stock_code'],
+                company_name=params['company_name'],
+                start_date=params['start_date'],
+                end_date=params['end_date'],
+                frequency=params['frequency'],
+                progress_callback=job.update,
+                event_callback=job.publish,
+                mode=params.get('mode', 'sequential'),
+                max_concurrency=int(params.get('max_concurrency', DEFAULT_ANALYSIS_CONCURRENCY)),
+                cancel_token=job.cancel_token,
+                checkpoint=checkpoint,
+                benchmark=params.get('benchmark') or None
+            ))
+
+            job.update(95, "正在处理回测结果...")
+            job.results = process_results_for_json(results)
+            if results.get('cancelled'):
+                job.update(job.progress, f"回测已停止，保留了 {results['completed_decisions']} 个已完成决策点的结果")
+                state = JOB_STOPPED
+                print(f"🛑 回测任务已停止: {job.job_id}")
+            elif results.get('failed_decisions'):
+                # 部分决策点分析失败（如模型服务中断）时保留检查点，恢复后只重新分析这些决策点
+                job.update(100, f"回测完成，{len(results['failed_decisions'])} 个决策点分析失败，可恢复任务重新分析")
+                state = JOB_COMPLETED
+                print(f"⚠️ 回测任务完成但有分析失败的决策点: {job.job_id}")
+            else:
+                job.update(100, "回测完成！")
+                state = JOB_COMPLETED
+                # 全部决策点都已成功分析，无需恢复，删除检查点；停止和失败的任务保留检查点以便恢复
+                checkpoint.remove()
+                print(f"✅ 回测任务完成: {job.job_id}")
+
+        except Exception as e:
+            print(f"❌ 回测任务失败: {job.job_id} {e}")
+            job.error = str(e)
+            job.update(0, f"回测失败: {str(e)}")
+        finally:
+            self._close_loop(loop)
+            self._finish(job, state)
+
+    @staticmethod
+    def _close_loop(loop: asyncio.AbstractEventLoop):
+        """取消事件循环中残留的任务（如被中断的分析）后关闭循环，释放工作线程"""
+        try:
+            pending = asyncio.all_tasks(loop)
+            for task in pending:
+                task.cancel()
+            if pending:
+                loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+            loop.run_until_complete(loop.shutdown_asyncgens())
+        except Exception as e:
+            print(f"关闭回测事件循环时出错: {e}")
+        finally:
+            loop.close()
+            asyncio.set_event_loop(None)
+
+    def stats(self) -> Dict[str, Any]:
+        """任务统计"""
+        with self._lock:
+            states = [job.state for job in self._active.values()]
+            return {
+                "max_concurrent_jobs": self.max_concurrent_jobs,
+                "queued": states.count(JOB_QUEUED),
+                "running": states.count(JOB_RUNNING),
+                "finished": len(self._finished),
+                "benchmark_cache": self.benchmark_cache.stats()
+            }
+
+    def shutdown(self):
+        """停止接收新任务并取消排队中的任务"""
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -9,44 +9,281 @@ import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
 from typing import Dict, Any, List, Optional
-import baostock as bs
 import json
 import os
+import threading
 from multi_agent_workflow import MultiAgentWorkflow
+from market_data_store import MarketDataStore
+from llm_cache import LLMCacheMissError, PersistentLLMCache, StrictLLMCache
+from technical_indicators import compute_indicators, summarize, format_summary
+from backtest_checkpoint import BacktestCheckpoint
+from position_ledger import PositionLedger
+from trade_lots import analyze_trades
+from performance_metrics import TRADING_DAYS_PER_YEAR, compute_metrics, max_drawdown, relative_metrics, rolling_metrics, to_scalar
+from benchmark_series import BUY_AND_HOLD, BenchmarkSeriesCache, benchmark_name
+
+
+# 预加载行情时向前多取的自然日天数（覆盖历史价格窗口和60日均线等指标的预热期）
+PRELOAD_LOOKBACK_DAYS = 120
+# 查找最接近交易日时允许的最大日期偏差（自然日）
+PRICE_LOOKUP_WINDOW_DAYS = 5
+# 回测中以决策日收盘时间作为分析时间，保证相同决策点的提示词可复现（便于LLM缓存命中）
+DECISION_TIME = "15:00:00"
+# 两阶段回测中并发执行市场分析的默认上限
+DEFAULT_ANALYSIS_CONCURRENCY = 4
+
+
+class BacktestCancelled(Exception):
+    """回测已被取消"""
+
+
+class CancellationToken:
+    """
+    回测取消令牌
+    
+    回测在决策点之间检查令牌；通过 run 执行的分析任务在取消时会被立即中断，
+    cancel 可以在任意线程调用（如处理停止请求的Web线程）
+    """
+    
+    def __init__(self):
+        self._cancelled = threading.Event()
+        self._lock = threading.Lock()
+        self._tasks = {}  # 进行中的任务 -> 所属事件循环
+    
+    @property
+    def cancelled(self) -> bool:
+        """是否已请求取消"""
+        return self._cancelled.is_set()
+    
+    def cancel(self):
+        """请求取消，并中断所有进行中的分析任务"""
+        self._cancelled.set()
+        with self._lock:
+            for task, loop in self._tasks.items():
+                loop.call_soon_threadsafe(task.cancel)
+    
+    def raise_if_cancelled(self):
+        """已请求取消时抛出 BacktestCancelled"""
+        if self.cancelled:
+            raise BacktestCancelled()
+    
+    async def run(self, coroutine):
+        """
+        以可取消的任务执行协程
+        
+        Args:
+            coroutine: 要执行的协程（如一次工作流运行）
+            
+        Returns:
+            协程结果，取消时抛出 BacktestCancelled
+        """
+        task = asyncio.ensure_future(coroutine)
+        with self._lock:
+            self._tasks[task] = asyncio.get_running_loop()
+        if self.cancelled:
+            task.cancel()
+        try:
+            return await task
+        except asyncio.CancelledError:
+            if self.cancelled:
+                raise BacktestCancelled()
+            raise
+        finally:
+            with self._lock:
+                self._tasks.pop(task, None)
 
 
 class BacktestSystem:
     """简化的回测系统"""
     
-    def __init__(self, initial_capital: float = 100000.0, verbose: bool = True):
+    def __init__(self, initial_capital: float = 100000.0, verbose: bool = True,
+                 data_store: Optional[MarketDataStore] = None, offline: bool = False,
+                 llm_cache: Optional[PersistentLLMCache] = None, strict_replay: bool = False,
+                 benchmark_cache: Optional[BenchmarkSeriesCache] = None):
         """
         初始化回测系统
         
         Args:
             initial_capital: 初始资金
+            data_store: 本地行情存储，默认使用 data/market_data.sqlite
+            offline: 离线模式，只使用本地已存储的行情数据
+            llm_cache: LLM响应缓存，默认使用 data/llm_cache.sqlite
+            strict_replay: 严格回放模式，LLM缓存未命中时不调用模型，直接以 LLMCacheMissError 中止回测
+            benchmark_cache: 基准序列缓存，默认基于本回测的行情存储新建
         """
         self.initial_capital = initial_capital
         self.current_capital = initial_capital
         self.positions = {}  # 股票代码 -> 持仓数量
         self.transactions = []  # 交易记录
+        self.ledger = PositionLedger()  # 按股票增量维护的持仓成本和已实现盈亏
         self.daily_values = []  # 每日资产价值
-        self.workflow = MultiAgentWorkflow(verbose=False)
+        self.event_callback = None  # 决策和交易事件回调，由 run_backtest 设置
+        self.cancel_token = CancellationToken()  # 取消令牌，由 run_backtest 设置
+        self.checkpoint: Optional[BacktestCheckpoint] = None  # 检查点日志，由 run_backtest 设置
+        self._checkpointed_dates = set()  # 检查点中已有分析结果的决策日期
+        self.failed_decisions = []  # 分析失败、使用默认决策的日期（从检查点恢复时会重新分析）
+        # 严格回放只作用于本回测：在（可能被多个任务共享的）缓存外包一层严格视图
+        llm_cache = llm_cache or PersistentLLMCache()
+        self.llm_cache = StrictLLMCache(llm_cache) if strict_replay else llm_cache
+        self.strict_replay = strict_replay
+        self.workflow = MultiAgentWorkflow(verbose=False, llm_cache=self.llm_cache)
         
         # 添加缓存机制
         self.price_cache = {}  # 缓存股票价格数据
         self.analysis_cache = {}  # 缓存分析结果
+        self.price_data = {}  # 股票代码 -> 预加载的日线列数据 (numpy数组)
+        self.indicator_data = {}  # 股票代码 -> 预加载区间内批量计算的技术指标
         
-        # 初始化baostock
-        lg = bs.login()
-        if lg.error_code != '0':
-            raise Exception(f"登录baostock失败: {lg.error_msg}")
+        # 本地行情存储（按需登录baostock，只下载缺失的区间）
+        self.data_store = data_store or MarketDataStore(offline=offline)
+        self.benchmark_cache = benchmark_cache or BenchmarkSeriesCache(self.data_store)
     
-    def __del__(self):
-        """析构函数，登出baostock"""
+    def emit_event(self, event_type: str, data: Dict[str, Any]):
+        """
+        发送回测事件（如推送给前端的事件流），回调异常不影响回测
+        
+        Args:
+            event_type: 事件类型（decision、trade）
+            data: 事件数据
+        """
+        if self.event_callback is None:
+            return
         try:
-            bs.logout()
-        except:
-            pass
+            self.event_callback(event_type, data)
+        except Exception as e:
+            print(f"发送回测事件失败: {e}")
+    
+    def _load_price_arrays(self, stock_code: str, start_date: str, end_date: str) -> Dict[str, Any]:
+        """
+        从本地行情存储读取区间内的日线，并转换为numpy列数组
+        
+        Args:
+            stock_code: 股票代码
+            start_date: 开始日期
+            end_date: 结束日期
+            
+        Returns:
+            列数组字典
+        """
+        df = self.data_store.get_bars(stock_code, start_date, end_date, frequency="d", adjustflag="3")
+        return self._to_price_arrays(df, start_date, end_date)
+    
+    def preload_price_data(self, stock_codes: List[str], start_date: str, end_date: str,
+                           lookback_days: int = PRELOAD_LOOKBACK_DAYS) -> Dict[str, int]:
+        """
+        批量预加载日线行情，每只股票只读取一次本地行情存储
+        
+        预加载区间为 [start_date - lookback_days, end_date + 查找窗口]，
+        之后的价格和历史数据查询都直接在内存中按索引切片完成；
+        技术指标也在此对整个区间一次性计算，各决策日按索引取值
+        
+        Args:
+            stock_codes: 股票代码列表
+            start_date: 回测开始日期
+            end_date: 回测结束日期
+            lookback_days: 向前多取的自然日天数
+            
+        Returns:
+            每只股票加载的K线数量
+        """
+        load_start = (datetime.strptime(start_date, '%Y-%m-%d') - timedelta(days=lookback_days)).strftime('%Y-%m-%d')
+        load_end = (datetime.strptime(end_date, '%Y-%m-%d') + timedelta(days=PRICE_LOOKUP_WINDOW_DAYS)).strftime('%Y-%m-%d')
+        
+        loaded = {}
+        for stock_code in stock_codes:
+            print(f"📡 预加载行情数据: {stock_code} {load_start} ~ {load_end}")
+            try:
+                data = self._load_price_arrays(stock_code, load_start, load_end)
+                self.price_data[stock_code] = data
+                self.indicator_data[stock_code] = compute_indicators(
+                    data["close"], data["high"], data["low"], data["volume"]
+                )
+                loaded[stock_code] = len(data["dates"])
+                print(f"✅ 预加载完成: {stock_code} 共 {loaded[stock_code]} 条K线")
+                
+            except Exception as e:
+                print(f"预加载行情失败 {stock_code}: {e}")
+                loaded[stock_code] = 0
+        
+        return loaded
+    
+    @staticmethod
+    def _to_price_arrays(df: pd.DataFrame, range_start: str, range_end: str) -> Dict[str, Any]:
+        """
+        将K线DataFrame转换为按日期排序的numpy列数组
+        
+        Args:
+            df: 包含 date/open/high/low/close/volume 列的DataFrame
+            range_start: 数据覆盖的开始日期
+            range_end: 数据覆盖的结束日期
+            
+        Returns:
+            列数组字典
+        """
+        for column in ("open", "high", "low", "close", "volume"):
+            df[column] = pd.to_numeric(df[column], errors='coerce')
+        df = df.dropna(subset=["date", "close"]).sort_values("date")
+        
+        return {
+            "dates": df["date"].to_numpy(dtype='datetime64[D]'),
+            "open": df["open"].to_numpy(dtype=float),
+            "high": df["high"].to_numpy(dtype=float),
+            "low": df["low"].to_numpy(dtype=float),
+            "close": df["close"].to_numpy(dtype=float),
+            "volume": df["volume"].to_numpy(dtype=float),
+            "range_start": np.datetime64(range_start, 'D'),
+            "range_end": np.datetime64(range_end, 'D'),
+        }
+    
+    @staticmethod
+    def _closest_price(data: Dict[str, Any], date: str) -> Optional[float]:
+        """
+        在列数组中查找最接近指定日期的收盘价
+        
+        在 ±PRICE_LOOKUP_WINDOW_DAYS 天内取日期最接近的价格，距离相同时取较早的一天
+        """
+        dates = data["dates"]
+        if len(dates) == 0:
+            return None
+        
+        target = np.datetime64(date, 'D')
+        idx = int(np.searchsorted(dates, target))
+        
+        candidates = [i for i in (idx - 1, idx) if 0 <= i < len(dates)]
+        best = min(candidates, key=lambda i: (abs(int((dates[i] - target).astype(int))), i))
+        if abs(int((dates[best] - target).astype(int))) > PRICE_LOOKUP_WINDOW_DAYS:
+            return None
+        
+        return float(data["close"][best])
+    
+    def _is_preloaded(self, stock_code: str, start_date: str, end_date: str) -> bool:
+        """判断预加载数据是否覆盖给定区间"""
+        data = self.price_data.get(stock_code)
+        if data is None:
+            return False
+        return data["range_start"] <= np.datetime64(start_date, 'D') and np.datetime64(end_date, 'D') <= data["range_end"]
+    
+    def get_technical_indicators(self, stock_code: str, date: str) -> str:
+        """
+        获取决策日的技术指标摘要（取当日及之前最后一根K线，不使用未来数据）
+        
+        Args:
+            stock_code: 股票代码
+            date: 决策日期
+            
+        Returns:
+            格式化的指标摘要，未预加载时返回空字符串
+        """
+        indicators = self.indicator_data.get(stock_code)
+        if indicators is None:
+            return ""
+        
+        dates = self.price_data[stock_code]["dates"]
+        idx = int(np.searchsorted(dates, np.datetime64(date, 'D'), side='right')) - 1
+        if idx < 0:
+            return ""
+        
+        return format_summary(summarize(indicators, idx), as_of=str(dates[idx]))
     
     def get_stock_price(self, stock_code: str, date: str) -> Optional[float]:
         """
@@ -65,52 +302,22 @@ class BacktestSystem:
             print(f"💾 使用缓存价格: {date} = {self.price_cache[cache_key]:.2f}")
             return self.price_cache[cache_key]
         
+        window_start = (datetime.strptime(date, '%Y-%m-%d') - timedelta(days=PRICE_LOOKUP_WINDOW_DAYS)).strftime('%Y-%m-%d')
+        window_end = (datetime.strptime(date, '%Y-%m-%d') + timedelta(days=PRICE_LOOKUP_WINDOW_DAYS)).strftime('%Y-%m-%d')
+        
         try:
-            # 确保baostock已登录
-            lg = bs.login()
-            if lg.error_code != '0':
-                print(f"重新登录baostock失败: {lg.error_msg}")
-                return None
-            
-            print(f"📡 获取股票价格: {stock_code} @ {date}")
-            
-            # 获取前后几天的数据，确保能获取到价格
-            start_date = (datetime.strptime(date, '%Y-%m-%d') - timedelta(days=5)).strftime('%Y-%m-%d')
-            end_date = (datetime.strptime(date, '%Y-%m-%d') + timedelta(days=5)).strftime('%Y-%m-%d')
-            
-            rs = bs.query_history_k_data_plus(
-                stock_code,
-                "date,close",
-                start_date=start_date,
-                end_date=end_date,
-                frequency="d",
-                adjustflag="3"
-            )
-            
-            data_list = []
-            if rs and rs.error_code == '0':
-                while rs.next():
-                    data_list.append(rs.get_row_data())
-            
-            if not data_list:
-                return None
-            
-            # 找到最接近目标日期的价格
-            target_date = datetime.strptime(date, '%Y-%m-%d')
-            closest_price = None
-            min_diff = float('inf')
+            # 优先使用预加载数据，否则从本地行情存储读取前后几天的数据
+            if self._is_preloaded(stock_code, window_start, window_end):
+                data = self.price_data[stock_code]
+            else:
+                print(f"📡 获取股票价格: {stock_code} @ {date}")
+                data = self._load_price_arrays(stock_code, window_start, window_end)
             
-            for row in data_list:
-                row_date = datetime.strptime(row[0], '%Y-%m-%d')
-                diff = abs((row_date - target_date).days)
-                if diff < min_diff:
-                    min_diff = diff
-                    closest_price = float(row[1])
+            closest_price = self._closest_price(data, date)
             
             # 缓存结果
             if closest_price:
                 self.price_cache[cache_key] = closest_price
-                print(f"✅ 价格获取成功: {closest_price:.2f}")
             
             return closest_price
             
@@ -135,36 +342,23 @@ class BacktestSystem:
             print(f"💾 使用缓存历史数据: {len(self.price_cache[cache_key])} 个价格点")
             return self.price_cache[cache_key]
         
+        start_date = (datetime.strptime(end_date, '%Y-%m-%d') - timedelta(days=days+10)).strftime('%Y-%m-%d')
+        
         try:
-            print(f"📡 获取历史价格数据: {stock_code} 最近 {days} 天")
-            
-            start_date = (datetime.strptime(end_date, '%Y-%m-%d') - timedelta(days=days+10)).strftime('%Y-%m-%d')
-            
-            rs = bs.query_history_k_data_plus(
-                stock_code,
-                "date,close",
-                start_date=start_date,
-                end_date=end_date,
-                frequency="d",
-                adjustflag="3"
-            )
-            
-            prices = []
-            if rs and rs.error_code == '0':
-                while rs.next():
-                    try:
-                        close_price = float(rs.get_row_data()[1])
-                        prices.append(close_price)
-                    except (ValueError, IndexError):
-                        continue
+            # 优先使用预加载数据，否则从本地行情存储读取
+            if self._is_preloaded(stock_code, start_date, end_date):
+                data = self.price_data[stock_code]
+            else:
+                print(f"📡 获取历史价格数据: {stock_code} 最近 {days} 天")
+                data = self._load_price_arrays(stock_code, start_date, end_date)
             
-            # 只保留最近的天数
-            if len(prices) > days:
-                prices = prices[-days:]
+            # 按日期区间切片，只保留最近的天数
+            lo = np.searchsorted(data["dates"], np.datetime64(start_date, 'D'), side='left')
+            hi = np.searchsorted(data["dates"], np.datetime64(end_date, 'D'), side='right')
+            prices = data["close"][lo:hi][-days:].tolist()
             
             # 缓存结果
             self.price_cache[cache_key] = prices
-            print(f"✅ 历史数据获取成功: {len(prices)} 个价格点")
             return prices
             
         except Exception as e:
@@ -173,7 +367,7 @@ class BacktestSystem:
     
     def get_portfolio_state(self, stock_code: str, current_price: float) -> Dict[str, Any]:
         """
-        获取当前投资组合状态
+        获取当前投资组合状态（只读取持仓账本，不扫描交易记录）
         
         Args:
             stock_code: 股票代码
@@ -186,14 +380,10 @@ class BacktestSystem:
         stock_value = current_shares * current_price
         total_value = self.current_capital + stock_value
         
-        # 计算成本信息
-        avg_cost = 0.0
-        total_cost = 0.0
-        if current_shares > 0:
-            buy_transactions = [t for t in self.transactions if t['stock_code'] == stock_code and t['action'] == 'BUY']
-            if buy_transactions:
-                total_cost = sum(t['amount'] for t in buy_transactions)
-                avg_cost = total_cost / current_shares
+        # 成本信息（平均成本法，卖出时已按比例结转）
+        position = self.ledger.get(stock_code)
+        avg_cost = position.avg_cost if current_shares > 0 else 0.0
+        total_cost = position.cost_basis if current_shares > 0 else 0.0
         
         # 计算盈亏
         unrealized_pnl = (current_price - avg_cost) * current_shares if current_shares > 0 else 0.0
@@ -212,14 +402,44 @@ class BacktestSystem:
             "total_cost": total_cost,
             "unrealized_pnl": unrealized_pnl,
             "unrealized_pnl_percent": unrealized_pnl_percent,
+            "realized_pnl": position.realized_pnl,
             "capital_usage": capital_usage,
             "available_cash_ratio": self.current_capital / self.initial_capital,
             "stock_ratio": stock_value / total_value if total_value > 0 else 0.0,
-            "total_trades": len(self.transactions),
+            "total_trades": self.ledger.trade_count,
+            "buy_trades": position.buy_count,
+            "sell_trades": position.sell_count,
             "recent_transactions": self.transactions[-5:] if self.transactions else []
         }
     
-    async def get_investment_decision(self, stock_code: str, company_name: str, date: str, current_price: float) -> Dict[str, Any]:
+    async def get_market_analysis(self, stock_code: str, company_name: str, date: str, current_price: float) -> Dict[str, str]:
+        """
+        运行与投资组合无关的三个专业分析（基本面、技术、估值）
+        
+        Args:
+            stock_code: 股票代码
+            company_name: 公司名称
+            date: 分析日期
+            current_price: 当前价格
+            
+        Returns:
+            三个专业分析结果
+        """
+        input_data = {
+            "stock_code": stock_code,
+            "company_name": company_name,
+            "current_date": date,
+            "current_time_info": f"{date} {DECISION_TIME}",
+            "current_price": current_price,
+            "historical_prices": self.get_historical_prices(stock_code, date, days=30),
+            "technical_indicators": self.get_technical_indicators(stock_code, date)
+        }
+        
+        print(f"🔍 {date} - 开始市场分析 {company_name} ({stock_code})")
+        return await self.cancel_token.run(self.workflow.run_market_analysis(input_data))
+    
+    async def get_investment_decision(self, stock_code: str, company_name: str, date: str, current_price: float,
+                                      market_analysis: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
         """
         运行multi_agent_workflow获取投资决策
         
@@ -228,6 +448,7 @@ class BacktestSystem:
             company_name: 公司名称
             date: 分析日期
             current_price: 当前价格
+            market_analysis: 已完成的三个专业分析结果，提供时只运行投资决策步骤
             
         Returns:
             JSON格式的投资决策
@@ -250,9 +471,10 @@ class BacktestSystem:
                 "stock_code": stock_code,
                 "company_name": company_name,
                 "current_date": date,
-                "current_time_info": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                "current_time_info": f"{date} {DECISION_TIME}",
                 "current_price": current_price,
                 "historical_prices": historical_prices,
+                "technical_indicators": self.get_technical_indicators(stock_code, date),
                 "portfolio_state": portfolio_state
             }
             
@@ -260,19 +482,32 @@ class BacktestSystem:
             print(f"💰 当前状态: 价格{current_price:.2f} | 持股{portfolio_state['current_shares']}股 | 现金{portfolio_state['cash']:.2f} | 总值{portfolio_state['total_value']:.2f}")
             
             # 运行workflow
-            result = await self.workflow.run(input_data)
+            if market_analysis is not None:
+                input_data.update(market_analysis)
+                result = await self.cancel_token.run(self.workflow.run_investment_decision(input_data))
+            else:
+                result = await self.cancel_token.run(self.workflow.run(input_data))
             
             # 获取投资决策
             decision = result.get('investment_decision', {})
             
             print(f"💡 投资决策: {decision.get('action', 'HOLD')} | 信心度: {decision.get('confidence', 0):.2f} | 仓位: {decision.get('position_size', 0):.1%}")
             
+            # 分析失败时的决策不缓存（检查点记为未分析），恢复回测时重新分析
+            if result.get('error'):
+                print(f"⚠️ {date} - 分析失败: {result['error']}")
+                self.failed_decisions.append(date)
+                return decision
+            
             # 缓存结果
             self.analysis_cache[cache_key] = decision
             return decision
             
+        except (BacktestCancelled, LLMCacheMissError):
+            raise
         except Exception as e:
             print(f"获取投资决策失败: {e}")
+            self.failed_decisions.append(date)
             return {
                 "action": "HOLD",
                 "confidence": 0.5,
@@ -313,7 +548,7 @@ class BacktestSystem:
                 self.positions[stock_code] = current_position + shares_to_buy
                 
                 # 记录交易
-                self.transactions.append({
+                self.record_transaction({
                     'date': date, 'stock_code': stock_code, 'action': 'BUY',
                     'shares': shares_to_buy, 'price': current_price, 'amount': amount_to_invest,
                     'confidence': confidence
@@ -337,7 +572,7 @@ class BacktestSystem:
             self.positions[stock_code] = current_position - shares_to_sell
             
             # 记录交易
-            self.transactions.append({
+            self.record_transaction({
                 'date': date, 'stock_code': stock_code, 'action': 'SELL',
                 'shares': shares_to_sell, 'price': current_price, 'amount': revenue,
                 'confidence': confidence
@@ -353,6 +588,14 @@ class BacktestSystem:
         if reasons:
             print(f"💭 决策理由: {'; '.join(reasons)}")
     
+    def record_transaction(self, transaction: Dict[str, Any]):
+        """记录一笔交易（同时更新持仓账本）并发送交易事件"""
+        realized_pnl = self.ledger.record(transaction)
+        if transaction['action'] == 'SELL':
+            transaction['realized_pnl'] = realized_pnl
+        self.transactions.append(transaction)
+        self.emit_event("trade", transaction)
+    
     def calculate_portfolio_value(self, date: str) -> float:
         """
         计算投资组合总价值
@@ -376,7 +619,13 @@ class BacktestSystem:
     async def run_backtest(self, stock_code: str, company_name: str, 
                           start_date: str, end_date: str, 
                           frequency: str = "weekly", 
-                          progress_callback=None) -> Dict[str, Any]:
+                          progress_callback=None,
+                          mode: str = "sequential",
+                          max_concurrency: int = DEFAULT_ANALYSIS_CONCURRENCY,
+                          event_callback=None,
+                          cancel_token: Optional[CancellationToken] = None,
+                          checkpoint: Optional[BacktestCheckpoint] = None,
+                          benchmark: Optional[str] = None) -> Dict[str, Any]:
         """
         运行回测
         
@@ -387,10 +636,27 @@ class BacktestSystem:
             end_date: 结束日期
             frequency: 决策频率 ("daily" 或 "weekly" 或 "monthly")
             progress_callback: 进度回调函数
+            mode: 执行模式，"sequential" 逐个决策点完整运行；
+                  "two_phase" 先并发完成所有决策点的市场分析，再顺序生成投资决策
+            max_concurrency: two_phase 模式下并发市场分析的上限
+            event_callback: 事件回调 (event_type, data)，每个决策点执行后发送 decision 事件，每笔交易发送 trade 事件
+            cancel_token: 取消令牌，取消后中断进行中的分析，并返回截至最后一个完成决策点的部分结果
+            checkpoint: 检查点日志，每个决策点执行后追加记录；日志中已有的决策直接重放，不再调用模型
+            benchmark: 对比基准，指数代码（如 sh.000300）或 "buy_and_hold"（买入并持有回测股票），默认不对比
             
         Returns:
-            回测结果
+            回测结果（被取消时 cancelled 为True）
         """
+        self.event_callback = event_callback
+        self.cancel_token = cancel_token or CancellationToken()
+        if checkpoint is not None:
+            self.restore_checkpoint(checkpoint, stock_code)
+            checkpoint.start({
+                "stock_code": stock_code, "company_name": company_name,
+                "start_date": start_date, "end_date": end_date, "frequency": frequency,
+                "initial_capital": self.initial_capital, "mode": mode, "max_concurrency": max_concurrency,
+                "benchmark": benchmark, "strict_replay": self.strict_replay
+            })
         print(f"🚀 开始回测: {company_name} ({stock_code})")
         print(f"📅 回测期间: {start_date} - {end_date}")
         print(f"🔄 决策频率: {frequency}")
@@ -403,6 +669,9 @@ class BacktestSystem:
         
         print(f"📊 将进行 {total_dates} 次决策分析")
         
+        # 一次性预加载整个回测区间的行情数据
+        self.preload_price_data([stock_code], start_date, end_date)
+        
         if progress_callback:
             progress_callback(10, f"回测初始化完成，共需分析 {total_dates} 个决策点")
         
@@ -419,7 +688,76 @@ class BacktestSystem:
         if progress_callback:
             progress_callback(15, f"预计耗时 {estimated_total_minutes:.1f} 分钟，正在开始分析...")
         
+        try:
+            if mode == "two_phase":
+                await self._run_two_phase(stock_code, company_name, decision_dates, max_concurrency, progress_callback)
+            else:
+                await self._run_sequential(stock_code, company_name, decision_dates, progress_callback)
+            cancelled = False
+        except BacktestCancelled:
+            cancelled = True
+            print(f"🛑 回测已取消，保留已完成的 {len(self.daily_values)} 个决策点")
+            if progress_callback:
+                progress_callback(90, f"回测已取消，正在整理已完成的 {len(self.daily_values)} 个决策点...")
+        
+        if progress_callback and not cancelled:
+            progress_callback(90, "正在计算回测结果...")
+        
+        if self.checkpoint is not None:
+            self.checkpoint.finish(cancelled)
+        
+        # 计算回测结果（按交易日逐日估值；被取消时估值到最后一个完成的决策点）
+        curve_end = self.daily_values[-1]['date'] if cancelled and self.daily_values else end_date
+        benchmark_series = self.load_benchmark(benchmark, stock_code, start_date, curve_end) if benchmark else None
+        results = self.calculate_performance(start_date, curve_end, benchmark_series)
+        results['cancelled'] = cancelled
+        results['completed_decisions'] = len(self.daily_values)
+        results['total_decisions'] = total_dates
+        results['failed_decisions'] = list(self.failed_decisions)
+        results['llm_cache'] = self.llm_cache.stats()
+        results['tool_cache'] = self.workflow.tool_cache.stats()
+        results['benchmark_cache'] = self.benchmark_cache.stats()
+        print(f"💾 LLM缓存: 命中 {results['llm_cache']['hits']} 次，未命中 {results['llm_cache']['misses']} 次")
+        
+        if progress_callback and not cancelled:
+            progress_callback(100, "回测完成！")
+        
+        return results
+    
+    def restore_checkpoint(self, checkpoint: BacktestCheckpoint, stock_code: str):
+        """
+        从检查点恢复：已完成分析的决策放入分析缓存
+        
+        回测从头按日期重新执行时，这些决策点直接使用缓存的决策，按相同价格重放交易，
+        重建持仓、交易记录和每日价值，之后的决策点正常分析
+        
+        Args:
+            checkpoint: 检查点日志
+            stock_code: 股票代码
+        """
+        self.checkpoint = checkpoint
+        decisions = checkpoint.decisions()
+        for date, decision in decisions.items():
+            self.analysis_cache[f"decision_{stock_code}_{date}"] = decision
+        self._checkpointed_dates = set(decisions)
+        if decisions:
+            print(f"♻️ 从检查点恢复 {len(decisions)} 个已完成的决策点: {checkpoint.path}")
+    
+    async def _run_sequential(self, stock_code: str, company_name: str, decision_dates: List[str],
+                              progress_callback=None):
+        """
+        逐个决策点完整运行分析并执行决策（每个决策点开始前检查取消令牌）
+        
+        Args:
+            stock_code: 股票代码
+            company_name: 公司名称
+            decision_dates: 决策日期列表
+            progress_callback: 进度回调函数
+        """
+        total_dates = len(decision_dates)
         for i, date in enumerate(decision_dates):
+            self.cancel_token.raise_if_cancelled()
+            
             # 计算进度
             progress = 15 + int((i / total_dates) * 70)  # 15-85%的进度用于分析
             
@@ -437,35 +775,137 @@ class BacktestSystem:
             # 获取投资决策
             decision = await self.get_investment_decision(stock_code, company_name, date, current_price)
             
-            # 执行决策
-            self.execute_decision(stock_code, decision, current_price, date)
+            # 执行决策并记录价值
+            self.apply_decision(stock_code, decision, current_price, date)
+    
+    async def _run_two_phase(self, stock_code: str, company_name: str, decision_dates: List[str],
+                             max_concurrency: int, progress_callback=None):
+        """
+        两阶段回测
+        
+        第一阶段并发执行所有决策点的市场分析（与投资组合无关），
+        第二阶段按时间顺序结合实时投资组合状态生成并执行投资决策
+        
+        Args:
+            stock_code: 股票代码
+            company_name: 公司名称
+            decision_dates: 决策日期列表
+            max_concurrency: 并发市场分析的上限
+            progress_callback: 进度回调函数
+        """
+        # 准备价格，跳过无法获取价格的日期
+        priced_dates = []
+        for date in decision_dates:
+            current_price = self.get_stock_price(stock_code, date)
+            if not current_price:
+                print(f"⚠️ {date} - 无法获取价格，跳过")
+                continue
+            priced_dates.append((date, current_price))
+        
+        # 已有缓存决策的日期无需再做市场分析
+        pending = [(date, price) for date, price in priced_dates
+                   if f"decision_{stock_code}_{date}" not in self.analysis_cache]
+        
+        # 第一阶段：并发市场分析
+        print(f"⚡ 第一阶段: 并发分析 {len(pending)} 个决策点 (并发上限 {max_concurrency})")
+        if not await self.cancel_token.run(self.workflow.initialize_tools_and_model()):
+            print("❌ 分析系统初始化失败，所有决策点将使用默认决策")
+        
+        semaphore = asyncio.Semaphore(max(1, max_concurrency))
+        completed = 0
+        
+        async def analyze(date: str, price: float) -> Dict[str, str]:
+            nonlocal completed
+            async with semaphore:
+                self.cancel_token.raise_if_cancelled()
+                analysis = await self.get_market_analysis(stock_code, company_name, date, price)
+            completed += 1
+            if progress_callback:
+                progress = 15 + int((completed / max(len(pending), 1)) * 50)  # 15-65%的进度用于市场分析
+                progress_callback(progress, f"市场分析完成 {completed}/{len(pending)}: {date}")
+            return analysis
+        
+        results = await asyncio.gather(*[analyze(date, price) for date, price in pending], return_exceptions=True)
+        self.cancel_token.raise_if_cancelled()
+        
+        market_analyses = {}
+        for (date, _), result in zip(pending, results):
+            if isinstance(result, LLMCacheMissError):
+                raise result
+            if isinstance(result, Exception):
+                print(f"⚠️ {date} - 市场分析失败: {result}")
+                market_analyses[date] = {"errors": [f"市场分析: {result}"]}
+            else:
+                market_analyses[date] = result
+        
+        # 第二阶段：顺序生成并执行投资决策
+        print(f"📈 第二阶段: 顺序执行 {len(priced_dates)} 个投资决策")
+        for i, (date, current_price) in enumerate(priced_dates):
+            self.cancel_token.raise_if_cancelled()
+            
+            if progress_callback:
+                progress = 65 + int((i / max(len(priced_dates), 1)) * 20)  # 65-85%的进度用于投资决策
+                progress_callback(progress, f"正在决策第 {i+1}/{len(priced_dates)} 个决策点: {date}")
             
-            # 记录每日价值
-            portfolio_value = self.calculate_portfolio_value(date)
-            self.daily_values.append({
-                'date': date,
-                'portfolio_value': portfolio_value,
-                'cash': self.current_capital,
-                'stock_value': portfolio_value - self.current_capital
-            })
+            print(f"\n📈 [{i+1}/{len(priced_dates)}] 决策点: {date}")
             
-            print(f"📈 投资组合价值: {portfolio_value:,.2f} | 现金: {self.current_capital:,.2f}")
-            print("-" * 30)
+            decision = await self.get_investment_decision(
+                stock_code, company_name, date, current_price,
+                market_analysis=market_analyses.get(date)
+            )
+            self.apply_decision(stock_code, decision, current_price, date)
+    
+    def apply_decision(self, stock_code: str, decision: Dict[str, Any], current_price: float, date: str):
+        """
+        执行投资决策并记录当日投资组合价值
         
-        if progress_callback:
-            progress_callback(90, "正在计算回测结果...")
+        Args:
+            stock_code: 股票代码
+            decision: 投资决策
+            current_price: 当前价格
+            date: 决策日期
+        """
+        # 执行决策
+        self.execute_decision(stock_code, decision, current_price, date)
         
-        # 计算回测结果
-        results = self.calculate_performance()
+        # 记录每日价值
+        portfolio_value = self.calculate_portfolio_value(date)
+        daily_value = {
+            'date': date,
+            'portfolio_value': portfolio_value,
+            'cash': self.current_capital,
+            'stock_value': portfolio_value - self.current_capital
+        }
+        self.daily_values.append(daily_value)
         
-        if progress_callback:
-            progress_callback(100, "回测完成！")
+        # 追加检查点（重放的决策点已在日志中，不重复记录）
+        if self.checkpoint is not None and date not in self._checkpointed_dates:
+            analyzed = f"decision_{stock_code}_{date}" in self.analysis_cache
+            self.checkpoint.record_decision(date, current_price, decision, analyzed, {
+                "cash": self.current_capital,
+                "positions": dict(self.positions),
+                "portfolio_value": portfolio_value
+            })
+            if analyzed:
+                self._checkpointed_dates.add(date)
+        self.emit_event("decision", {
+            **daily_value,
+            'stock_code': stock_code,
+            'price': current_price,
+            'action': decision.get('action', 'HOLD'),
+            'confidence': decision.get('confidence', 0.0),
+            'position_size': decision.get('position_size', 0.0)
+        })
         
-        return results
+        print(f"📈 投资组合价值: {portfolio_value:,.2f} | 现金: {self.current_capital:,.2f}")
+        print("-" * 30)
     
     def generate_decision_dates(self, start_date: str, end_date: str, frequency: str) -> List[str]:
         """
-        生成决策日期列表
+        基于交易日历生成决策日期列表
+        
+        daily 为区间内每个交易日，weekly 为每周第一个交易日，monthly 为每月第一个交易日，
+        避免在周末和节假日重复运行分析
         
         Args:
             start_date: 开始日期
@@ -475,25 +915,127 @@ class BacktestSystem:
         Returns:
             日期列表
         """
+        trade_dates = self.data_store.get_trade_dates(start_date, end_date)
+        if not trade_dates:
+            # 无法获取交易日历时退化为工作日
+            print("⚠️ 无法获取交易日历，使用工作日生成决策日期")
+            trade_dates = [d.strftime('%Y-%m-%d') for d in pd.bdate_range(start_date, end_date)]
+        
+        if frequency == "daily":
+            return trade_dates
+        
         dates = []
-        current = datetime.strptime(start_date, '%Y-%m-%d')
-        end = datetime.strptime(end_date, '%Y-%m-%d')
-        
-        while current <= end:
-            dates.append(current.strftime('%Y-%m-%d'))
-            if frequency == "daily":
-                current += timedelta(days=1)
-            elif frequency == "weekly":
-                current += timedelta(days=7)
-            else:
-                current += timedelta(days=30)  # monthly
+        last_period = None
+        for date in trade_dates:
+            current = datetime.strptime(date, '%Y-%m-%d')
+            if frequency == "weekly":
+                period = current.isocalendar()[:2]
+            else:  # monthly
+                period = (current.year, current.month)
+            
+            if period != last_period:
+                dates.append(date)
+                last_period = period
         
         return dates
     
-    def calculate_performance(self) -> Dict[str, Any]:
+    def load_benchmark(self, benchmark: str, stock_code: str, start_date: str, end_date: str) -> Dict[str, Any]:
+        """
+        加载对比基准的收盘价序列
+        
+        Args:
+            benchmark: 指数代码，或 "buy_and_hold" 表示买入并持有回测股票（直接使用预加载行情）
+            stock_code: 回测股票代码
+            start_date: 开始日期
+            end_date: 结束日期
+            
+        Returns:
+            {"code", "name", "dates", "close"}，没有数据时 dates/close 为空数组
+        """
+        if benchmark == BUY_AND_HOLD:
+            data = self.price_data.get(stock_code)
+            series = {"dates": data["dates"], "close": data["close"]} if data is not None else None
+        else:
+            series = self.benchmark_cache.get(benchmark, start_date, end_date)
+        
+        if series is None:
+            print(f"⚠️ 基准数据不可用: {benchmark_name(benchmark)}")
+            series = {"dates": np.array([], dtype='datetime64[D]'), "close": np.array([])}
+        return {"code": benchmark, "name": benchmark_name(benchmark), **series}
+    
+    def build_equity_curve(self, start_date: str, end_date: str) -> List[Dict[str, Any]]:
+        """
+        按交易日逐日估值，生成资产曲线
+        
+        由交易记录得到持仓和现金的时间线，与预加载的收盘价数组按日期对齐，一次性计算
+        区间内每个交易日收盘时的现金、持仓市值和总资产（交易日当天计入当天的交易）；
+        没有任何交易时按预加载股票的交易日生成全部为现金的平坦曲线
+        
+        Args:
+            start_date: 开始日期
+            end_date: 结束日期
+            
+        Returns:
+            每个交易日的 {date, portfolio_value, cash, stock_value}；没有预加载行情时返回空列表
+        """
+        stock_codes = {t['stock_code'] for t in self.transactions} | set(self.positions)
+        if any(code not in self.price_data for code in stock_codes):
+            return []
+        # 只持有现金时，交易日取自回测股票的预加载行情
+        calendar_codes = stock_codes or set(self.price_data)
+        if not calendar_codes:
+            return []
+        
+        start, end = np.datetime64(start_date, 'D'), np.datetime64(end_date, 'D')
+        all_dates = np.unique(np.concatenate([self.price_data[code]["dates"] for code in calendar_codes]))
+        grid = all_dates[(all_dates >= start) & (all_dates <= end)]
+        if len(grid) == 0:
+            return []
+        
+        trade_dates = np.array([t['date'] for t in self.transactions], dtype='datetime64[D]')
+        is_buy = np.array([t['action'] == 'BUY' for t in self.transactions], dtype=bool)
+        amounts = np.array([t['amount'] for t in self.transactions], dtype=float)
+        shares = np.array([t['shares'] for t in self.transactions], dtype=float)
+        codes = np.array([t['stock_code'] for t in self.transactions], dtype=object)
+        
+        # 每个交易日收盘时已发生的交易数量（交易记录按时间顺序排列）
+        executed = np.searchsorted(trade_dates, grid, side='right')
+        
+        cash_flow = np.concatenate(([0.0], np.cumsum(np.where(is_buy, -amounts, amounts))))
+        cash = self.initial_capital + cash_flow[executed]
+        
+        stock_value = np.zeros(len(grid))
+        for code in stock_codes:
+            signed = np.where(codes == code, np.where(is_buy, shares, -shares), 0.0)
+            held = np.concatenate(([0.0], np.cumsum(signed)))[executed]
+            
+            # 收盘价按日期对齐，停牌等没有K线的日期沿用之前最近的收盘价
+            data = self.price_data[code]
+            price_index = np.searchsorted(data["dates"], grid, side='right') - 1
+            close = np.where(price_index >= 0, data["close"][np.maximum(price_index, 0)], 0.0)
+            stock_value += held * close
+        
+        portfolio_value = cash + stock_value
+        return [
+            {'date': str(date), 'portfolio_value': value, 'cash': cash_value, 'stock_value': stock}
+            for date, value, cash_value, stock in zip(
+                grid.astype(str), portfolio_value.tolist(), cash.tolist(), stock_value.tolist()
+            )
+        ]
+    
+    def calculate_performance(self, start_date: Optional[str] = None, end_date: Optional[str] = None,
+                              benchmark: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         """
         计算回测表现
         
+        收益、年化波动率、夏普/索提诺/卡玛比率、最大回撤、换手率和仓位暴露基于逐日估值的资产曲线计算；
+        无法逐日估值时（如缺少预加载行情）退回到决策点的资产价值，并按决策点的平均间隔年化
+        
+        Args:
+            start_date: 资产曲线开始日期，默认第一个决策点
+            end_date: 资产曲线结束日期，默认最后一个决策点
+            benchmark: 对比基准的收盘价序列（load_benchmark 的返回值），提供时计算相对基准的表现
+            
         Returns:
             表现指标
         """
@@ -501,38 +1043,48 @@ class BacktestSystem:
             return {"error": "没有数据"}
         
         try:
+            equity_curve = self.build_equity_curve(
+                start_date or self.daily_values[0]['date'],
+                end_date or self.daily_values[-1]['date']
+            )
+            is_daily = len(equity_curve) >= 2
+            curve = equity_curve if is_daily else self.daily_values
+            
             # 计算总收益
-            final_value = self.daily_values[-1]['portfolio_value']
+            final_value = curve[-1]['portfolio_value']
             total_return = (final_value - self.initial_capital) / self.initial_capital
             
-            # 计算收益率序列
-            values = [d['portfolio_value'] for d in self.daily_values]
-            returns = np.diff(values) / values[:-1] if len(values) > 1 else np.array([])
+            values = np.array([d['portfolio_value'] for d in curve], dtype=float)
+            dates = np.array([d['date'] for d in curve], dtype='datetime64[D]')
+            periods_per_year = TRADING_DAYS_PER_YEAR if is_daily else self._decision_periods_per_year(dates)
+            
+            # 每个估值日的成交金额，用于计算换手率
+            trade_index = np.searchsorted(dates, np.array([t['date'] for t in self.transactions], dtype='datetime64[D]'))
+            trade_amounts = np.bincount(
+                np.minimum(trade_index, len(dates) - 1),
+                weights=[t['amount'] for t in self.transactions],
+                minlength=len(dates)
+            )
+            
+            metrics = compute_metrics(
+                values,
+                trade_amounts=trade_amounts,
+                stock_value=[d['stock_value'] for d in curve],
+                periods_per_year=periods_per_year
+            )
             
         except Exception as e:
             return {"error": f"计算收益时出错: {e}"}
         
-        # 计算交易统计
-        buy_trades = [t for t in self.transactions if t['action'] == 'BUY']
-        sell_trades = [t for t in self.transactions if t['action'] == 'SELL']
-        
-        # 计算盈利交易数量和胜率
-        profitable_trades = 0
-        total_completed_trades = 0
-        
-        if buy_trades and sell_trades:
-            # 将买卖交易配对计算盈亏
-            for sell_trade in sell_trades:
-                # 找到对应的买入交易（简化为价格比较）
-                corresponding_buys = [b for b in buy_trades if b['date'] <= sell_trade['date']]
-                if corresponding_buys:
-                    avg_buy_price = sum(b['price'] for b in corresponding_buys) / len(corresponding_buys)
-                    if sell_trade['price'] > avg_buy_price:
-                        profitable_trades += 1
-                    total_completed_trades += 1
+        # 计算交易统计：卖出按先进先出匹配买入批次，每笔卖出构成一次往返交易
+        buy_trades = sum(1 for t in self.transactions if t['action'] == 'BUY')
+        sell_trades = len(self.transactions) - buy_trades
+        trade_analysis = analyze_trades(self.transactions)
+        trade_stats = trade_analysis['summary']
         
-        # 计算胜率 - 只有完成买卖对的交易才计算胜率
-        win_rate = (profitable_trades / total_completed_trades) if total_completed_trades > 0 else 0.0
+        # 胜率 - 只有完成买卖往返的交易才计算胜率
+        profitable_trades = trade_stats['winning_trades']
+        win_rate = trade_stats['win_rate']
         
         # 计算各种指标
         performance = {
@@ -540,39 +1092,105 @@ class BacktestSystem:
             'final_value': final_value,
             'total_return': total_return,
             'total_profit': final_value - self.initial_capital,
-            'max_value': max(values) if values else self.initial_capital,
-            'min_value': min(values) if values else self.initial_capital,
-            'volatility': float(np.std(returns)) if len(returns) > 1 else 0.0,
-            'sharpe_ratio': float(np.mean(returns) / np.std(returns)) if len(returns) > 1 and np.std(returns) > 0 else 0.0,
-            'max_drawdown': self.calculate_max_drawdown(values),
+            'max_value': float(values.max()),
+            'min_value': float(values.min()),
+            'annual_return': metrics['annual_return'],
+            'volatility': metrics['volatility'],
+            'sharpe_ratio': metrics['sharpe_ratio'],
+            'sortino_ratio': metrics['sortino_ratio'],
+            'calmar_ratio': metrics['calmar_ratio'],
+            'max_drawdown': metrics['max_drawdown'],
+            'max_drawdown_duration': int(metrics['max_drawdown_duration']),
+            'turnover': metrics['turnover'],
+            'avg_exposure': metrics['avg_exposure'],
+            'time_in_market': metrics['time_in_market'],
             'total_trades': len(self.transactions),
-            'buy_trades': len(buy_trades),
-            'sell_trades': len(sell_trades),
+            'buy_trades': buy_trades,
+            'sell_trades': sell_trades,
             'profitable_trades': profitable_trades,
             'win_rate': win_rate,
             'winning_trades': profitable_trades,  # 保持兼容性
+            'completed_trades': trade_stats['round_trips'],
+            'losing_trades': trade_stats['losing_trades'],
+            'profit_factor': trade_stats['profit_factor'],
+            'avg_win': trade_stats['avg_win'],
+            'avg_loss': trade_stats['avg_loss'],
+            'avg_trade_return': trade_stats['avg_return'],
+            'avg_holding_days': trade_stats['avg_holding_days'],
+            # 已实现盈亏：realized_pnl 与持仓账本和卖出记录一致（平均成本法），
+            # fifo_realized_pnl 与往返交易明细一致（FIFO批次成本），全部清仓后两者相等
+            'realized_pnl': self.ledger.realized_pnl,
+            'fifo_realized_pnl': trade_stats['fifo_realized_pnl'],
+            'round_trips': trade_analysis['round_trips'],
+            'rolling_metrics': self._rolling_metrics(dates, values, periods_per_year) if is_daily else [],
+            'benchmark': self._compare_benchmark(benchmark, dates, values, periods_per_year) if benchmark else None,
             'daily_values': self.daily_values,
+            'equity_curve': equity_curve,
             'transactions': self.transactions
         }
         
         return performance
     
+    def _compare_benchmark(self, benchmark: Dict[str, Any], dates: np.ndarray, values: np.ndarray,
+                           periods_per_year: float) -> Dict[str, Any]:
+        """
+        在资产曲线的同一日期网格上与基准对比
+        
+        基准收盘价按日期对齐（没有基准K线的日期沿用之前最近的收盘价），
+        网格开头早于基准数据的日期不参与对比
+        
+        Returns:
+            基准收益、超额收益、跟踪误差、信息比率、阿尔法/贝塔，以及按初始资产折算的基准曲线
+        """
+        comparison = {'code': benchmark['code'], 'name': benchmark['name']}
+        price_index = np.searchsorted(benchmark['dates'], dates, side='right') - 1
+        valid = price_index >= 0
+        if valid.sum() < 2:
+            comparison['error'] = "基准数据不足"
+            return comparison
+        
+        values = values[valid]
+        close = benchmark['close'][price_index[valid]]
+        metrics = relative_metrics(values, close, periods_per_year=periods_per_year)
+        comparison.update({name: to_scalar(series[0]) for name, series in metrics.items()})
+        
+        # 基准曲线按对比起点的资产价值折算，便于与资产曲线画在同一坐标轴
+        curve = values[0] * close / close[0]
+        comparison['curve'] = [
+            {'date': date, 'value': value}
+            for date, value in zip(dates[valid].astype(str).tolist(), curve.tolist())
+        ]
+        return comparison
+    
+    def _decision_periods_per_year(self, dates: np.ndarray) -> float:
+        """按决策点的平均间隔估算每年的期数（资产曲线只有决策点时用于年化）"""
+        span_days = int((dates[-1] - dates[0]).astype(int)) if len(dates) > 1 else 0
+        if span_days <= 0:
+            return TRADING_DAYS_PER_YEAR
+        return (len(dates) - 1) * 365.25 / span_days
+    
+    def _rolling_metrics(self, dates: np.ndarray, values: np.ndarray, periods_per_year: float) -> List[Dict[str, Any]]:
+        """逐日的滚动窗口指标（窗口不足的日期为None）"""
+        rolling = {name: series[0].tolist() for name, series in rolling_metrics(values, periods_per_year=periods_per_year).items()}
+        return [
+            {
+                'date': date,
+                'return': to_scalar(window_return),
+                'volatility': to_scalar(volatility),
+                'sharpe': to_scalar(sharpe),
+                'drawdown': to_scalar(drawdown)
+            }
+            for date, window_return, volatility, sharpe, drawdown in zip(
+                dates.astype(str).tolist(), rolling['rolling_return'], rolling['rolling_volatility'],
+                rolling['rolling_sharpe'], rolling['drawdown']
+            )
+        ]
+    
     def calculate_max_drawdown(self, values: List[float]) -> float:
         """计算最大回撤"""
         if len(values) < 2:
             return 0.0
-        
-        peak = values[0]
-        max_drawdown = 0.0
-        
-        for value in values[1:]:
-            if value > peak:
-                peak = value
-            else:
-                drawdown = (peak - value) / peak
-                max_drawdown = max(max_drawdown, drawdown)
-        
-        return max_drawdown
+        return float(max_drawdown(values)['max_drawdown'][0])
     
     def save_results(self, results: Dict[str, Any], filename: str):
         """
@@ -602,11 +1220,26 @@ class BacktestSystem:
         print(f"💰 最终价值: {results['final_value']:,.2f}")
         print(f"📈 总收益: {results['total_profit']:,.2f}")
         print(f"📊 总收益率: {results['total_return']:.2%}")
-        print(f"📉 最大回撤: {results['max_drawdown']:.2%}")
-        print(f"📊 波动率: {results['volatility']:.4f}")
+        annual_return = results['annual_return']
+        print(f"📊 年化收益率: {annual_return:.2%}" if annual_return is not None else "📊 年化收益率: 无法计算")
+        print(f"📉 最大回撤: {results['max_drawdown']:.2%} (持续 {results['max_drawdown_duration']} 期)")
+        print(f"📊 年化波动率: {results['volatility']:.2%}")
         print(f"📈 夏普比率: {results['sharpe_ratio']:.4f}")
+        for label, key in (("📈 索提诺比率", 'sortino_ratio'), ("📈 卡玛比率", 'calmar_ratio')):
+            print(f"{label}: {results[key]:.4f}" if results[key] is not None else f"{label}: 无法计算")
+        print(f"🔁 年化换手率: {results['turnover']:.2f} | 平均仓位: {results['avg_exposure']:.2%}")
         print(f"🔄 总交易次数: {results['total_trades']}")
-        print(f"✅ 盈利交易: {results['winning_trades']}")
+        print(f"✅ 盈利交易: {results['winning_trades']}/{results['completed_trades']} (胜率 {results['win_rate']:.2%})")
+        profit_factor = results['profit_factor']
+        print(f"⚖️ 盈亏比: {profit_factor:.2f}" if profit_factor is not None else "⚖️ 盈亏比: 无亏损交易")
+        print(f"⏳ 平均持有天数: {results['avg_holding_days']:.1f}")
+        benchmark = results.get('benchmark')
+        if benchmark and 'error' not in benchmark:
+            print(f"📐 基准 {benchmark['name']}: 收益 {benchmark['benchmark_return']:.2%} | 超额收益 {benchmark['excess_return']:.2%}")
+            information_ratio = benchmark['information_ratio']
+            print(f"📐 跟踪误差: {benchmark['tracking_error']:.2%} | 信息比率: "
+                  + (f"{information_ratio:.4f}" if information_ratio is not None else "无法计算")
+                  + (f" | 贝塔: {benchmark['beta']:.4f}" if benchmark['beta'] is not None else ""))
         print("="*50)
 
 
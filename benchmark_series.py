@@ -0,0 +1,122 @@
+"""
+基准序列缓存
+
+回测结果与基准（如沪深300指数）对比时使用的收盘价序列。基准数据通过本地行情存储获取，
+并在进程内按代码缓存已加载的区间：所有回测任务共享同一个缓存，
+同一基准在覆盖区间内的后续回测直接切片，不再读取行情存储。
+与行情存储的增量刷新一致，只有昨天及之前的数据视为已定稿：当天及之后的数据不缓存，每次请求时重新读取
+"""
+
+import threading
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+from market_data_store import MarketDataStore
+
+
+# 沪深300指数代码
+CSI300_CODE = "sh.000300"
+# 以买入并持有回测股票作为基准
+BUY_AND_HOLD = "buy_and_hold"
+# 基准显示名称
+BENCHMARK_NAMES = {
+    CSI300_CODE: "沪深300",
+    BUY_AND_HOLD: "买入持有",
+}
+# 向前多取的自然日天数，保证回测首日之前有可沿用的收盘价
+BENCHMARK_LOOKBACK_DAYS = 10
+
+
+def benchmark_name(code: str) -> str:
+    """基准的显示名称（未登记的代码直接使用代码）"""
+    return BENCHMARK_NAMES.get(code, code)
+
+
+class BenchmarkSeriesCache:
+    """进程内共享的基准收盘价序列缓存"""
+
+    def __init__(self, data_store: Optional[MarketDataStore] = None):
+        """
+        Args:
+            data_store: 本地行情存储，默认使用 data/market_data.sqlite
+        """
+        self.data_store = data_store or MarketDataStore()
+        self._series: Dict[str, Dict[str, Any]] = {}  # 代码 -> 已加载区间的日期和收盘价
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.loads = 0
+
+    def _load(self, code: str, start_date: str, end_date: str) -> Optional[Dict[str, Any]]:
+        """从行情存储读取区间内的收盘价，没有数据时返回None"""
+        df = self.data_store.get_bars(code, start_date, end_date, frequency="d", adjustflag="3")
+        df["close"] = pd.to_numeric(df["close"], errors='coerce')
+        df = df.dropna(subset=["date", "close"]).sort_values("date")
+        if df.empty:
+            return None
+        return {
+            "dates": df["date"].to_numpy(dtype='datetime64[D]'),
+            "close": df["close"].to_numpy(dtype=float),
+        }
+
+    def get(self, code: str, start_date: str, end_date: str) -> Optional[Dict[str, Any]]:
+        """
+        获取基准在区间内的收盘价（含回测首日之前的少量交易日，用于按日期对齐）
+
+        缓存区间未覆盖请求区间时，按两者的并集重新读取一次并替换缓存；
+        缓存只保留到昨天为止的数据，涉及当天及之后的请求总是重新读取
+
+        Args:
+            code: 基准代码（如 sh.000300）
+            start_date: 开始日期
+            end_date: 结束日期
+
+        Returns:
+            {"dates": 日期数组, "close": 收盘价数组}，获取失败时返回None
+        """
+        load_start = (datetime.strptime(start_date, '%Y-%m-%d') - timedelta(days=BENCHMARK_LOOKBACK_DAYS)).strftime('%Y-%m-%d')
+        start, end = np.datetime64(load_start, 'D'), np.datetime64(end_date, 'D')
+        last_final_date = np.datetime64((datetime.now() - timedelta(days=1)).strftime('%Y-%m-%d'), 'D')
+
+        with self._lock:
+            series = self._series.get(code)
+            if series is not None and series["range_start"] <= start and end <= series["range_end"]:
+                self.hits += 1
+            else:
+                if series is not None:
+                    start, end = min(start, series["range_start"]), max(end, series["range_end"])
+                print(f"📡 加载基准数据: {benchmark_name(code)} ({code}) {start} ~ {end}")
+                try:
+                    loaded = self._load(code, str(start), str(end))
+                except Exception as e:
+                    print(f"加载基准数据失败 {code}: {e}")
+                    loaded = None
+                if loaded is None:
+                    # 不缓存失败结果，下次请求时重试
+                    return None
+                self.loads += 1
+                # 只缓存已定稿（昨天及之前）的部分，之后的数据可能尚未收盘，下次请求时重新读取
+                cached_end = min(end, last_final_date)
+                if start <= cached_end:
+                    final = loaded["dates"] <= cached_end
+                    self._series[code] = {
+                        "dates": loaded["dates"][final],
+                        "close": loaded["close"][final],
+                        "range_start": start,
+                        "range_end": cached_end,
+                    }
+                series = loaded
+
+        mask = (series["dates"] >= np.datetime64(load_start, 'D')) & (series["dates"] <= np.datetime64(end_date, 'D'))
+        return {"dates": series["dates"][mask], "close": series["close"][mask]}
+
+    def stats(self) -> Dict[str, Any]:
+        """缓存概况"""
+        with self._lock:
+            return {
+                "series": len(self._series),
+                "hits": self.hits,
+                "loads": self.loads,
+            }
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ReAct执行器与工作流图缓存的基准测试
+
+对比每次调用都重新构建（create_react_agent / StateGraph.compile）与使用
+BaseAgent.get_executor、MultiAgentWorkflow.get_workflow 缓存的耗时。
+使用假模型和假工具，不连接MCP服务器，也不调用大模型
+
+用法: python benchmarks/bench_executor_cache.py [--iterations 50] [--tools 20]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.tools import StructuredTool
+from langgraph.prebuilt import create_react_agent
+
+from agents import FundamentalAgent, TechnicalAgent, ValuationAgent, SummaryAgent, InvestmentAgent
+from multi_agent_workflow import MultiAgentWorkflow
+
+
+class FakeChatModel(GenericFakeChatModel):
+    """只用于构建执行器的假模型，绑定工具时返回自身"""
+
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+
+def make_tools(count: int) -> list:
+    """构建指定数量的假工具（与MCP工具数量相当）"""
+    def lookup(code: str) -> str:
+        return code
+    return [
+        StructuredTool.from_function(lookup, name=f"tool_{i}", description=f"假工具 {i}")
+        for i in range(count)
+    ]
+
+
+def measure(func, iterations: int) -> float:
+    """返回单次调用的平均耗时（秒）"""
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - start) / iterations
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ReAct执行器与工作流图缓存的基准测试")
+    parser.add_argument("--iterations", type=int, default=50, help="每项测量的重复次数")
+    parser.add_argument("--tools", type=int, default=20, help="专业分析agent绑定的工具数量")
+    args = parser.parse_args()
+
+    llm = FakeChatModel(messages=iter([]))
+    tools = make_tools(args.tools)
+    agents = [FundamentalAgent(verbose=False), TechnicalAgent(verbose=False), ValuationAgent(verbose=False),
+              SummaryAgent(verbose=False), InvestmentAgent(verbose=False)]
+    for agent in agents:
+        agent.set_llm(llm)
+        agent.set_tools(tools)
+        agent.get_executor()
+
+    workflow = MultiAgentWorkflow(verbose=False)
+    workflow.get_workflow("full")
+    workflow.get_workflow("investment")
+
+    # 缓存前：每次分析都为每个agent重新构建执行器、重新编译工作流
+    build_executors = measure(lambda: [create_react_agent(llm, agent.get_executor_tools()) for agent in agents],
+                              args.iterations)
+    compile_graph = measure(workflow.create_investment_workflow, args.iterations)
+    # 缓存后：直接取回已构建的执行器和编译后的图
+    cached_executors = measure(lambda: [agent.get_executor() for agent in agents], args.iterations)
+    cached_graph = measure(lambda: workflow.get_workflow("investment"), args.iterations)
+
+    print(f"📊 {len(agents)} 个agent，{args.tools} 个工具，每项 {args.iterations} 次")
+    print(f"  构建全部执行器: {build_executors * 1e3:8.2f} ms  ->  缓存 {cached_executors * 1e6:8.2f} us")
+    print(f"  编译投资决策流程: {compile_graph * 1e3:8.2f} ms  ->  缓存 {cached_graph * 1e6:8.2f} us")
+    before = build_executors + compile_graph
+    after = cached_executors + cached_graph
+    print(f"✅ 每个回测日期的构建开销: {before * 1e3:.2f} ms -> {after * 1e6:.2f} us")
+
+
+if __name__ == "__main__":
+    main()
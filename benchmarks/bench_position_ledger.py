@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+持仓账本的基准测试
+
+对比每笔交易后读取持仓成本的两种方式：
+- 回扫：按原实现扫描全部交易记录求买入总额（每次查询 O(交易数)，总耗时为平方级）
+- 账本：PositionLedger 增量更新，查询只读取当前持仓（每次查询 O(1)）
+
+回扫在大规模下耗时过长，超过 --rescan-limit 笔时按平方级外推
+
+用法: python benchmarks/bench_position_ledger.py [--trades 100000] [--rescan-limit 10000]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from position_ledger import PositionLedger
+
+
+STOCK_CODE = "sh.600519"
+
+
+def synthetic_trades(count: int, seed: int = 0) -> list:
+    """生成单只股票的随机买卖交易（卖出不超过当前持仓）"""
+    rng = random.Random(seed)
+    trades = []
+    shares_held = 0.0
+    for i in range(count):
+        price = 10 + rng.random()
+        if shares_held > 0 and rng.random() < 0.4:
+            shares = shares_held * rng.random()
+            action = "SELL"
+            shares_held -= shares
+        else:
+            shares = rng.random() * 100
+            action = "BUY"
+            shares_held += shares
+        trades.append({"date": str(i), "stock_code": STOCK_CODE, "action": action,
+                       "shares": shares, "price": price, "amount": shares * price})
+    return trades
+
+
+def rescan_cost(transactions: list, stock_code: str, current_shares: float):
+    """原实现：扫描全部买入记录计算平均成本和总成本"""
+    if current_shares <= 0:
+        return 0.0, 0.0
+    buys = [t for t in transactions if t['stock_code'] == stock_code and t['action'] == 'BUY']
+    total_cost = sum(t['amount'] for t in buys)
+    return total_cost / current_shares, total_cost
+
+
+def run_rescan(trades: list) -> float:
+    """每笔交易后回扫交易记录，返回总耗时（秒）"""
+    transactions = []
+    shares = 0.0
+    start = time.perf_counter()
+    for trade in trades:
+        shares += trade['shares'] if trade['action'] == 'BUY' else -trade['shares']
+        transactions.append(trade)
+        rescan_cost(transactions, STOCK_CODE, shares)
+    return time.perf_counter() - start
+
+
+def run_ledger(trades: list) -> float:
+    """每笔交易后更新账本并读取持仓成本，返回总耗时（秒）"""
+    ledger = PositionLedger()
+    start = time.perf_counter()
+    for trade in trades:
+        ledger.record(trade)
+        position = ledger.get(STOCK_CODE)
+        avg_cost, total_cost = position.avg_cost, position.cost_basis
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="持仓账本与回扫交易记录的基准测试")
+    parser.add_argument("--trades", type=int, default=100000, help="交易笔数")
+    parser.add_argument("--rescan-limit", type=int, default=10000, help="回扫方式实际运行的最大交易笔数")
+    args = parser.parse_args()
+
+    trades = synthetic_trades(args.trades)
+
+    ledger_time = run_ledger(trades)
+    rescan_count = min(args.trades, args.rescan_limit)
+    rescan_time = run_rescan(trades[:rescan_count])
+
+    print(f"📊 {args.trades} 笔交易，每笔交易后读取持仓成本")
+    print(f"  账本: {ledger_time:8.3f} s  ({ledger_time / args.trades * 1e6:.2f} us/笔)")
+    if rescan_count < args.trades:
+        estimated = rescan_time * (args.trades / rescan_count) ** 2
+        print(f"  回扫: {rescan_time:8.3f} s  ({rescan_count} 笔实测，{args.trades} 笔按平方级外推约 {estimated:.0f} s)")
+    else:
+        estimated = rescan_time
+        print(f"  回扫: {rescan_time:8.3f} s  ({rescan_time / args.trades * 1e6:.2f} us/笔)")
+    print(f"✅ 加速约 {estimated / ledger_time:.0f} 倍")
+
+
+if __name__ == "__main__":
+    main()
@@ -6,6 +6,7 @@ let reconnectAttempts = 0; // 重连尝试次数
 let maxReconnectAttempts = 3; // 最大重连次数
 let reconnectTimer = null; // 重连定时器
 let finalReport = null; // 存储最终报告
+let reportStreams = {}; // 增量推送的报告块: "流标识#轮次" -> {element, text, renderPending}
 
 // 查询模板
 const queryTemplates = {
@@ -71,18 +72,17 @@ function connect() {
     };
     
     ws.onmessage = function(event) {
+        let data;
         try {
-            const data = JSON.parse(event.data);
-            addLog(data.message, data.type, data.timestamp);
-            
-            if (data.type === "execution_complete") {
-                isExecuting = false;
-                updateExecuteButton();
-                updateStatus("connected", "已连接");
-            }
+            data = JSON.parse(event.data);
         } catch (e) {
             addLog(event.data, "info");
+            return;
         }
+        
+        // 服务端会把同一发送间隔内的多条消息合并为一个数组
+        const messages = Array.isArray(data) ? data : [data];
+        messages.forEach(handleServerMessage);
     };
     
     ws.onclose = function(event) {
@@ -115,6 +115,27 @@ function connect() {
     };
 }
 
+// 处理单条服务端消息
+function handleServerMessage(data) {
+    // 报告增量推送（report_delta / report_end）
+    if (data.type === "report_delta" || data.type === "report_end") {
+        handleReportStream(data);
+        return;
+    }
+    
+    if (data.type === "pong") {
+        return;
+    }
+    
+    addLog(data.message, data.type, data.timestamp);
+    
+    if (data.type === "execution_complete") {
+        isExecuting = false;
+        updateExecuteButton();
+        updateStatus("connected", "已连接");
+    }
+}
+
 function updateStatus(status, text) {
     const statusElement = document.getElementById("status");
     if (statusElement) {
@@ -497,6 +518,84 @@ function addLog(message, type = "info", timestamp = null) {
     }
 }
 
+// 创建一个用于显示增量报告的日志块
+function createReportEntry(data) {
+    const logsContainer = document.getElementById("logs");
+    const logEntry = document.createElement("div");
+    logEntry.className = "log-entry log-info";
+    logEntry.innerHTML = `
+        <div class="timestamp">${data.timestamp || new Date().toLocaleTimeString()}</div>
+        <div class="log-message"><strong class="report-title"></strong><div class="report-body"></div></div>
+    `;
+    logEntry.querySelector(".report-title").textContent = `💭 ${data.title} #${data.turn}`;
+    
+    if (logsContainer) {
+        logsContainer.appendChild(logEntry);
+        logCount++;
+        const logCountElement = document.getElementById("logCount");
+        if (logCountElement) {
+            logCountElement.textContent = logCount;
+        }
+    }
+    
+    return {
+        element: logEntry,
+        title: logEntry.querySelector(".report-title"),
+        body: logEntry.querySelector(".report-body"),
+        text: "",
+        renderPending: false
+    };
+}
+
+// 渲染报告块并自动滚动
+function renderReportEntry(entry) {
+    entry.renderPending = false;
+    entry.body.innerHTML = renderMarkdown(entry.text);
+    
+    const logsContainer = document.getElementById("logs");
+    const autoScrollElement = document.getElementById("autoScroll");
+    if (logsContainer && autoScrollElement && autoScrollElement.checked) {
+        logsContainer.scrollTop = logsContainer.scrollHeight;
+    }
+}
+
+// 处理报告增量推送：每个推理轮次一个文本块，收到 report_end 时标记为最终结果
+function handleReportStream(data) {
+    const key = `${data.stream}#${data.turn}`;
+    let entry = reportStreams[key];
+    if (!entry) {
+        entry = createReportEntry(data);
+        reportStreams[key] = entry;
+    }
+    
+    if (data.type === "report_delta") {
+        entry.text += data.delta;
+        // 合并到下一帧渲染，避免每条增量都重新渲染整个文本
+        if (!entry.renderPending) {
+            entry.renderPending = true;
+            requestAnimationFrame(() => renderReportEntry(entry));
+        }
+        return;
+    }
+    
+    // report_end: 最后一轮即为完整结果
+    entry.element.className = "log-entry log-success";
+    entry.title.textContent = `📄 ${data.title}`;
+    renderReportEntry(entry);
+    
+    if (data.stream === "final_report" && entry.text.trim().length > 10) {
+        finalReport = entry.text.trim();
+        console.log("✅ 最终报告接收完成，长度:", finalReport.length);
+        
+        const downloadTxtBtn = document.getElementById("downloadTxtBtn");
+        if (downloadTxtBtn) {
+            downloadTxtBtn.disabled = false;
+        }
+        
+        addLog("📄 最终报告已准备就绪，可以下载", "success");
+    }
+}
+
 function executeAgent() {
     if (!ws || ws.readyState !== WebSocket.OPEN) {
         addLog("WebSocket 未连接，请等待连接建立", "error");
@@ -524,8 +623,9 @@ function executeAgent() {
         return;
     }
     
-    // 重置最终报告和下载按钮状态
+    // 重置最终报告、增量报告块和下载按钮状态
     finalReport = null;
+    reportStreams = {};
     const downloadTxtBtn = document.getElementById("downloadTxtBtn");
     if (downloadTxtBtn) {
         downloadTxtBtn.disabled = true;
@@ -536,12 +636,16 @@ function executeAgent() {
     updateStatus("running", "执行中");
     
     const messageType = 'execute_multi_agent';
+    const forceRefreshElement = document.getElementById("forceRefresh");
+    const replayLogsElement = document.getElementById("replayLogs");
     
     addLog(`开始执行多Agent并行分析: ${companyName} (${stockCode})`, "info");
     ws.send(JSON.stringify({
         type: messageType,
         company_name: companyName,
-        stock_code: stockCode
+        stock_code: stockCode,
+        force_refresh: forceRefreshElement ? forceRefreshElement.checked : false,
+        replay_logs: replayLogsElement ? replayLogsElement.checked : false
     }));
 }
 
@@ -620,6 +724,7 @@ function clearLogs() {
         logsElement.innerHTML = "";
     }
     
+    reportStreams = {};
     logCount = 0;
     const logCountElement = document.getElementById("logCount");
     if (logCountElement) {
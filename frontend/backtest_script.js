@@ -5,9 +5,12 @@
 
 // 全局变量
 let statusInterval = null;
+let eventSource = null;  // 回测事件流连接
+let liveValues = [];  // 运行中收到的每个决策点的资产价值
 let valueChart = null;
 let returnsChart = null;
 let currentResults = null;
+let currentJobId = null;  // 当前页面跟踪的回测任务ID
 
 // API 基础URL
 const API_BASE = '/api';
@@ -311,8 +314,9 @@ async function startBacktest() {
         
         const result = await response.json();
         console.log('✅ 回测启动成功:', result);
+        currentJobId = result.job_id;
         
-        showToast('回测已启动，正在运行...', 'success');
+        showToast(`回测已提交，任务ID: ${currentJobId}`, 'success');
         updateSystemStatus('回测运行中', 'running');
         
         // 开始监控进度
@@ -383,7 +387,10 @@ function calculateEstimatedTime(params) {
  */
 async function stopBacktest() {
     try {
-        const response = await fetch(`${API_BASE}/backtest/stop`, {
+        if (!currentJobId) {
+            throw new Error('没有正在运行的回测');
+        }
+        const response = await fetch(`${API_BASE}/backtest/jobs/${currentJobId}/stop`, {
             method: 'POST'
         });
         
@@ -392,14 +399,10 @@ async function stopBacktest() {
             throw new Error(error.error || `HTTP ${response.status}`);
         }
         
-        showToast('回测已停止', 'warning');
-        updateSystemStatus('回测已停止', 'warning');
-        
-        // 停止进度监控
-        stopProgressMonitoring();
-        
-        // 更新按钮状态
-        updateButtonStates(false);
+        // 运行中的回测会在当前分析中断后结束，最终状态（含部分结果）由进度监控接收
+        const result = await response.json();
+        showToast(result.message, 'warning');
+        updateSystemStatus('正在停止回测', 'warning');
         
     } catch (error) {
         console.error('❌ 停止回测失败:', error);
@@ -415,6 +418,7 @@ function resetForm() {
     document.getElementById('stockCode').value = 'sh.600519';
     document.getElementById('initialCapital').value = '100000';
     document.getElementById('frequency').value = 'weekly';
+    document.getElementById('benchmark').value = 'sh.000300';
     
     // 重置日期
     setupDefaultDates();
@@ -479,7 +483,8 @@ function collectFormData() {
         start_date: document.getElementById('startDate').value,
         end_date: document.getElementById('endDate').value,
         initial_capital: parseFloat(document.getElementById('initialCapital').value),
-        frequency: document.getElementById('frequency').value
+        frequency: document.getElementById('frequency').value,
+        benchmark: document.getElementById('benchmark').value
     };
 }
 
@@ -545,53 +550,106 @@ function updateProgress(percentage, message) {
 
 /**
  * 开始进度监控
+ * 优先订阅服务器推送的事件流，浏览器不支持 EventSource 时退回到轮询
  */
 function startProgressMonitoring(estimatedMinutes = 5) {
-    if (statusInterval) {
-        clearInterval(statusInterval);
-    }
+    stopProgressMonitoring();
+    resetLiveView();
     
     const startTime = Date.now();
     
+    if (!window.EventSource) {
+        startStatusPolling(estimatedMinutes, startTime);
+        return;
+    }
+    
+    eventSource = new EventSource(`${API_BASE}/backtest/jobs/${currentJobId}/events`);
+    
+    eventSource.addEventListener('progress', (event) => {
+        const progress = JSON.parse(event.data);
+        updateProgress(progress.progress || 0, withRemainingTime(progress, estimatedMinutes));
+    });
+    
+    eventSource.addEventListener('decision', (event) => {
+        const decision = JSON.parse(event.data);
+        liveValues.push(decision);
+        renderLiveValueChart();
+        appendLiveEvent(`${decision.date} ${decision.action} | 价格 ${Number(decision.price).toFixed(2)} | 资产 ${Number(decision.portfolio_value).toFixed(2)}`);
+    });
+    
+    eventSource.addEventListener('trade', (event) => {
+        const trade = JSON.parse(event.data);
+        const label = trade.action === 'BUY' ? '买入' : '卖出';
+        appendLiveEvent(`✅ ${trade.date} ${label} ${Number(trade.shares).toFixed(2)} 股 @ ${Number(trade.price).toFixed(2)}`, 'trade');
+    });
+    
+    eventSource.addEventListener('status', (event) => {
+        handleJobStatus(JSON.parse(event.data));
+    });
+    
+    eventSource.onerror = () => {
+        // 连接中断时浏览器会按服务器指定的间隔自动重连，并携带 Last-Event-ID 从断点继续
+        console.warn('⚠️ 回测事件流连接中断，正在重连...');
+    };
+}
+
+/**
+ * 在进度消息后附加预计剩余时间
+ */
+function withRemainingTime(status, estimatedMinutes) {
+    const progressPercent = status.progress || 0;
+    let timeMessage = status.message;
+    
+    if (progressPercent > 10 && progressPercent < 90) {
+        const remainingPercent = (100 - progressPercent) / 100;
+        const estimatedRemainingMinutes = (estimatedMinutes * remainingPercent);
+        
+        if (estimatedRemainingMinutes > 1) {
+            timeMessage += ` (预计剩余${Math.ceil(estimatedRemainingMinutes)}分钟)`;
+        } else {
+            timeMessage += ` (即将完成)`;
+        }
+    }
+    return timeMessage;
+}
+
+/**
+ * 处理任务状态变化，任务结束时停止监控
+ */
+async function handleJobStatus(status) {
+    if (status.state === 'completed') {
+        stopProgressMonitoring();
+        updateButtonStates(false);
+        updateSystemStatus('回测完成', 'success');
+        await loadResults();
+    } else if (status.state === 'stopped' && status.has_results) {
+        // 回测被中途停止，展示截至最后一个完成决策点的部分结果
+        stopProgressMonitoring();
+        updateButtonStates(false);
+        updateSystemStatus('回测已停止（部分结果）', 'warning');
+        await loadResults();
+    } else if (status.state === 'failed' || status.state === 'stopped') {
+        // 回测失败或被停止
+        stopProgressMonitoring();
+        updateButtonStates(false);
+        hideProgressSection();
+        updateSystemStatus(status.state === 'stopped' ? '回测已停止' : '回测失败', 'error');
+        showToast(status.message, 'error');
+    }
+}
+
+/**
+ * 轮询任务状态（不支持事件流时的备用方案）
+ */
+function startStatusPolling(estimatedMinutes, startTime) {
     statusInterval = setInterval(async () => {
         try {
-            const response = await fetch(`${API_BASE}/backtest/status`);
+            const response = await fetch(`${API_BASE}/backtest/jobs/${currentJobId}`);
             if (!response.ok) throw new Error(`HTTP ${response.status}`);
             
             const status = await response.json();
-            
-            // 计算剩余时间
-            const elapsedMinutes = (Date.now() - startTime) / 60000;
-            const progressPercent = status.progress || 0;
-            let timeMessage = status.message;
-            
-            if (progressPercent > 10 && progressPercent < 90) {
-                const remainingPercent = (100 - progressPercent) / 100;
-                const estimatedRemainingMinutes = (estimatedMinutes * remainingPercent);
-                
-                if (estimatedRemainingMinutes > 1) {
-                    timeMessage += ` (预计剩余${Math.ceil(estimatedRemainingMinutes)}分钟)`;
-                } else {
-                    timeMessage += ` (即将完成)`;
-                }
-            }
-            
-            updateProgress(progressPercent, timeMessage);
-            
-            // 检查是否完成
-            if (!status.is_running && status.progress === 100) {
-                stopProgressMonitoring();
-                updateButtonStates(false);
-                updateSystemStatus('回测完成', 'success');
-                await loadResults();
-            } else if (!status.is_running && status.progress === 0) {
-                // 回测失败或被停止
-                stopProgressMonitoring();
-                updateButtonStates(false);
-                hideProgressSection();
-                updateSystemStatus('回测失败', 'error');
-                showToast(status.message, 'error');
-            }
+            updateProgress(status.progress || 0, withRemainingTime(status, estimatedMinutes));
+            await handleJobStatus(status);
             
         } catch (error) {
             console.error('❌ 获取状态失败:', error);
@@ -599,6 +657,46 @@ function startProgressMonitoring(estimatedMinutes = 5) {
     }, 2000); // 每2秒检查一次
 }
 
+/**
+ * 清空运行中的实时视图
+ */
+function resetLiveView() {
+    liveValues = [];
+    const liveEvents = document.getElementById('liveEvents');
+    if (liveEvents) liveEvents.innerHTML = '';
+    const wrapper = document.getElementById('liveChartWrapper');
+    if (wrapper) wrapper.style.display = 'none';
+}
+
+/**
+ * 增量绘制运行中的资产价值曲线
+ */
+function renderLiveValueChart() {
+    const wrapper = document.getElementById('liveChartWrapper');
+    const canvas = document.getElementById('liveValueChart');
+    if (!wrapper || !canvas) return;
+    
+    wrapper.style.display = 'block';
+    drawSimpleLineChart(canvas.getContext('2d'), liveValues, '实时资产价值');
+}
+
+/**
+ * 在实时事件列表顶部添加一条记录（只保留最近的记录）
+ */
+function appendLiveEvent(text, type = 'decision') {
+    const liveEvents = document.getElementById('liveEvents');
+    if (!liveEvents) return;
+    
+    const item = document.createElement('li');
+    item.className = `live-event ${type}`;
+    item.textContent = text;
+    liveEvents.prepend(item);
+    
+    while (liveEvents.children.length > 50) {
+        liveEvents.removeChild(liveEvents.lastChild);
+    }
+}
+
 /**
  * 停止进度监控
  */
@@ -607,6 +705,10 @@ function stopProgressMonitoring() {
         clearInterval(statusInterval);
         statusInterval = null;
     }
+    if (eventSource) {
+        eventSource.close();
+        eventSource = null;
+    }
 }
 
 /**
@@ -614,7 +716,7 @@ function stopProgressMonitoring() {
  */
 async function loadResults() {
     try {
-        const response = await fetch(`${API_BASE}/backtest/results`);
+        const response = await fetch(`${API_BASE}/backtest/jobs/${currentJobId}/results`);
         if (!response.ok) throw new Error(`HTTP ${response.status}`);
         
         const results = await response.json();
@@ -627,7 +729,11 @@ async function loadResults() {
         showResultsSection();
         hideProgressSection();
         
-        showToast('回测完成！', 'success');
+        if (results.cancelled) {
+            showToast(`回测已停止，显示已完成的 ${results.completed_decisions}/${results.total_decisions} 个决策点`, 'warning');
+        } else {
+            showToast('回测完成！', 'success');
+        }
         
     } catch (error) {
         console.error('❌ 加载结果失败:', error);
@@ -670,6 +776,13 @@ function updateMetrics(results) {
     returnElement.textContent = `${(totalReturn * 100).toFixed(2)}%`;
     returnElement.className = `metric-change ${totalReturn >= 0 ? 'positive' : 'negative'}`;
     
+    // 相对基准的超额收益
+    const benchmark = results.benchmark;
+    if (benchmark && benchmark.excess_return !== null && benchmark.excess_return !== undefined) {
+        const excessReturn = benchmark.excess_return;
+        returnElement.textContent += ` | 超额 ${excessReturn >= 0 ? '+' : ''}${(excessReturn * 100).toFixed(2)}% (vs ${benchmark.name})`;
+    }
+    
     // 最大回撤
     const maxDrawdown = results.max_drawdown || 0;
     const maxDrawdownElement = document.getElementById('maxDrawdown');
@@ -681,7 +794,7 @@ function updateMetrics(results) {
     sharpeElement.textContent = sharpeRatio.toFixed(3);
     
     // 添加指标说明
-    const dailyValuesCount = results.daily_values ? results.daily_values.length : 0;
+    const dailyValuesCount = getValueSeries(results).length;
     
     // 为最大回撤添加说明
     const maxDrawdownCard = document.querySelector('.metric-card:nth-child(2) .metric-sub');
@@ -690,6 +803,8 @@ function updateMetrics(results) {
             maxDrawdownCard.textContent = '数据点少，无回撤';
         } else if (maxDrawdown === 0) {
             maxDrawdownCard.textContent = '期间无回撤，表现稳定';
+        } else if (results.max_drawdown_duration) {
+            maxDrawdownCard.textContent = `最长水下 ${results.max_drawdown_duration} 个交易日`;
         } else {
             maxDrawdownCard.textContent = '风险控制指标';
         }
@@ -709,6 +824,10 @@ function updateMetrics(results) {
         } else {
             sharpeCard.textContent = '风险调整收益一般';
         }
+        const sortinoRatio = results.sortino_ratio;
+        if (sortinoRatio !== null && sortinoRatio !== undefined) {
+            sharpeCard.textContent += ` | 索提诺: ${sortinoRatio.toFixed(2)}`;
+        }
     }
     
     // 交易次数和胜率
@@ -728,7 +847,9 @@ function updateMetrics(results) {
         if (sellTrades === 0) {
             winRateElement.textContent = `胜率: 暂无卖出`;
         } else {
-            winRateElement.textContent = `胜率: ${(winRate * 100).toFixed(1)}%`;
+            const profitFactor = results.profit_factor;
+            const factorText = profitFactor === null || profitFactor === undefined ? '' : ` | 盈亏比: ${profitFactor.toFixed(2)}`;
+            winRateElement.textContent = `胜率: ${(winRate * 100).toFixed(1)}%${factorText}`;
         }
     }
     
@@ -824,7 +945,7 @@ function renderFallbackCharts(results) {
         
         if (valueCanvas) {
             const ctx = valueCanvas.getContext('2d');
-            drawSimpleLineChart(ctx, results.daily_values || [], '资产价值走势');
+            drawSimpleLineChart(ctx, getValueSeries(results), '资产价值走势');
             console.log('✅ 资产价值备用图表绘制成功');
         }
         
@@ -1079,6 +1200,28 @@ function drawSimpleLineChart(ctx, data, title = '数据走势') {
     ctx.fillText('高清图表 - 原生Canvas渲染', width / 2, height - 8);
 }
 
+/**
+ * 获取资产价值序列：优先使用逐日估值的资产曲线，旧结果退回到决策点的资产价值
+ */
+function getValueSeries(results) {
+    if (results.equity_curve && results.equity_curve.length > 0) {
+        return results.equity_curve;
+    }
+    return results.daily_values || [];
+}
+
+/**
+ * 将基准曲线按日期对齐到资产价值序列，没有基准时返回null
+ */
+function getBenchmarkValues(results, dailyValues) {
+    const curve = results.benchmark && results.benchmark.curve;
+    if (!curve || curve.length === 0) {
+        return null;
+    }
+    const valueByDate = new Map(curve.map(point => [point.date, point.value]));
+    return dailyValues.map(d => valueByDate.has(d.date) ? valueByDate.get(d.date) : null);
+}
+
 /**
  * 渲染资产价值图表
  */
@@ -1110,7 +1253,7 @@ function renderValueChart(results) {
         valueChart = null;
     }
     
-    const dailyValues = results.daily_values || [];
+    const dailyValues = getValueSeries(results);
     console.log('📊 日值数据条数:', dailyValues.length);
     
     if (dailyValues.length === 0) {
@@ -1125,6 +1268,7 @@ function renderValueChart(results) {
     const portfolioValues = dailyValues.map(d => d.portfolio_value);
     const cashValues = dailyValues.map(d => d.cash);
     const stockValues = dailyValues.map(d => d.stock_value);
+    const benchmarkValues = getBenchmarkValues(results, dailyValues);
     
     console.log('📈 图表数据准备:', {
         labels: labels.length,
@@ -1177,7 +1321,19 @@ function renderValueChart(results) {
                         borderWidth: 2,
                         pointRadius: 3,
                         pointHoverRadius: 5
-                    }
+                    },
+                    ...(benchmarkValues ? [{
+                        label: `基准: ${results.benchmark.name}`,
+                        data: benchmarkValues,
+                        borderColor: 'rgb(148, 163, 184)',
+                        backgroundColor: 'rgba(148, 163, 184, 0.1)',
+                        borderDash: [6, 4],
+                        tension: 0.4,
+                        borderWidth: 2,
+                        pointRadius: 0,
+                        pointHoverRadius: 4,
+                        spanGaps: true
+                    }] : [])
                 ]
             },
             options: {
@@ -1313,7 +1469,7 @@ function renderReturnsChart(results) {
         returnsChart.destroy();
     }
     
-    const dailyValues = results.daily_values || [];
+    const dailyValues = getValueSeries(results);
     console.log('📊 用于收益计算的日值数据:', dailyValues);
     
     if (dailyValues.length < 2) {
@@ -1484,7 +1640,7 @@ function renderReturnsChart(results) {
  * 使用Canvas绘制收益分布图（备用方案）
  */
 function drawReturnsChart(ctx, results) {
-    const dailyValues = results.daily_values || [];
+    const dailyValues = getValueSeries(results);
     
     if (dailyValues.length < 2) {
         showSimpleChart(ctx, '数据不足，无法显示收益分布');
@@ -1734,7 +1890,7 @@ async function downloadResults() {
     }
     
     try {
-        const response = await fetch(`${API_BASE}/backtest/download`);
+        const response = await fetch(`${API_BASE}/backtest/jobs/${currentJobId}/download`);
         if (!response.ok) throw new Error(`HTTP ${response.status}`);
         
         // 获取文件名
@@ -0,0 +1,289 @@
+"""
+持久化LLM响应缓存
+
+基于内容寻址的磁盘缓存，作为 ChatGoogleGenerativeAI 的 cache 使用。
+缓存键由模型参数（模型名、温度、绑定的工具等）和规范化后的消息列表
+（包括工具调用及其返回结果）共同决定，重复运行相同的回测时无需再次调用模型
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from langchain_core.caches import BaseCache, RETURN_VAL_TYPE
+from langchain_core.load import dumps, loads
+
+
+# 默认的缓存数据库路径
+DEFAULT_CACHE_PATH = os.path.join("data", "llm_cache.sqlite")
+# 默认最多保留的缓存条目数
+DEFAULT_MAX_ENTRIES = 50000
+# 默认缓存总大小上限（字节）
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+# 默认缓存有效期（秒），None 表示永不过期
+DEFAULT_MAX_AGE = 30 * 24 * 3600
+
+# 规范化时保留的消息字段（id、元数据等每次调用都会变化，不参与缓存键）
+_MESSAGE_KEYS = ("type", "content", "name", "status")
+
+
+class LLMCacheMissError(Exception):
+    """严格模式下缓存未命中"""
+
+
+def normalize_prompt(prompt: str) -> str:
+    """
+    规范化序列化后的消息列表
+
+    去掉消息id、工具调用id、响应元数据和token用量等每次运行都会变化的字段，
+    只保留消息类型、内容、工具调用（名称和参数）以及工具返回结果
+
+    Args:
+        prompt: langchain dumps 序列化的消息列表
+
+    Returns:
+        规范化后的JSON字符串
+    """
+    try:
+        messages = json.loads(prompt)
+    except (TypeError, ValueError):
+        return prompt
+
+    normalized = []
+    for message in messages if isinstance(messages, list) else [messages]:
+        kwargs = message.get("kwargs", {}) if isinstance(message, dict) else {}
+        item = {key: kwargs[key] for key in _MESSAGE_KEYS if key in kwargs}
+        if kwargs.get("tool_calls"):
+            item["tool_calls"] = [
+                {"name": call.get("name"), "args": call.get("args")}
+                for call in kwargs["tool_calls"]
+            ]
+        normalized.append(item)
+
+    return json.dumps(normalized, ensure_ascii=False, sort_keys=True)
+
+
+class PersistentLLMCache(BaseCache):
+    """基于SQLite的持久化LLM响应缓存（支持大小/时间淘汰和严格回放模式）"""
+
+    def __init__(self, db_path: str = DEFAULT_CACHE_PATH,
+                 max_entries: int = DEFAULT_MAX_ENTRIES,
+                 max_bytes: int = DEFAULT_MAX_BYTES,
+                 max_age: Optional[float] = DEFAULT_MAX_AGE,
+                 strict: bool = False):
+        """
+        初始化缓存
+
+        Args:
+            db_path: SQLite数据库文件路径
+            max_entries: 最多保留的条目数
+            max_bytes: 缓存总大小上限（字节）
+            max_age: 条目有效期（秒），None 表示永不过期
+            strict: 严格模式，未命中时抛出 LLMCacheMissError 而不是调用模型（用于确定性回放）
+        """
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.strict = strict
+
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS llm_cache (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_access REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_access ON llm_cache (last_access)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_created ON llm_cache (created_at)")
+            # 条目数和总大小由触发器增量维护，写入时无需扫描全表
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS llm_cache_totals (
+                    id INTEGER PRIMARY KEY CHECK (id = 0),
+                    entries INTEGER NOT NULL,
+                    size INTEGER NOT NULL
+                )
+            """)
+            conn.execute("""
+                INSERT OR IGNORE INTO llm_cache_totals (id, entries, size)
+                SELECT 0, COUNT(*), COALESCE(SUM(size), 0) FROM llm_cache
+            """)
+            conn.execute("""
+                CREATE TRIGGER IF NOT EXISTS llm_cache_totals_insert AFTER INSERT ON llm_cache BEGIN
+                    UPDATE llm_cache_totals SET entries = entries + 1, size = size + NEW.size WHERE id = 0;
+                END
+            """)
+            conn.execute("""
+                CREATE TRIGGER IF NOT EXISTS llm_cache_totals_update AFTER UPDATE OF size ON llm_cache BEGIN
+                    UPDATE llm_cache_totals SET size = size - OLD.size + NEW.size WHERE id = 0;
+                END
+            """)
+            conn.execute("""
+                CREATE TRIGGER IF NOT EXISTS llm_cache_totals_delete AFTER DELETE ON llm_cache BEGIN
+                    UPDATE llm_cache_totals SET entries = entries - 1, size = size - OLD.size WHERE id = 0;
+                END
+            """)
+
+    def _connect(self) -> sqlite3.Connection:
+        """创建数据库连接（每次操作独立连接，保证线程安全）"""
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    @staticmethod
+    def make_key(prompt: str, llm_string: str) -> str:
+        """根据模型参数和规范化的消息列表计算缓存键"""
+        content = f"{llm_string}\n{normalize_prompt(prompt)}"
+        return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+    def _is_expired(self, created_at: float, now: float) -> bool:
+        """判断条目是否已过期"""
+        return self.max_age is not None and now - created_at > self.max_age
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        """查询缓存"""
+        key = self.make_key(prompt, llm_string)
+        now = time.time()
+
+        with self._connect() as conn:
+            row = conn.execute("SELECT value, created_at FROM llm_cache WHERE key=?", (key,)).fetchone()
+            if row and not self._is_expired(row[1], now):
+                conn.execute("UPDATE llm_cache SET last_access=? WHERE key=?", (now, key))
+            else:
+                row = None
+
+        with self._lock:
+            if row is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+
+        if row is None:
+            if self.strict:
+                raise LLMCacheMissError(f"LLM缓存未命中（严格模式）: {key[:12]}")
+            return None
+
+        return [loads(generation) for generation in json.loads(row[0])]
+
+    def update(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        """写入缓存并执行淘汰"""
+        key = self.make_key(prompt, llm_string)
+        value = json.dumps([dumps(generation) for generation in return_val], ensure_ascii=False)
+        now = time.time()
+
+        with self._connect() as conn:
+            # 使用 UPSERT 而不是 REPLACE，覆盖已有条目时触发 UPDATE 触发器维护总大小
+            conn.execute(
+                "INSERT INTO llm_cache (key, value, size, created_at, last_access) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET value=excluded.value, size=excluded.size, "
+                "created_at=excluded.created_at, last_access=excluded.last_access",
+                (key, value, len(value.encode("utf-8")), now, now)
+            )
+            self._evict(conn, now)
+
+    def _totals(self, conn: sqlite3.Connection):
+        """当前的条目数和总大小（由触发器维护）"""
+        return conn.execute("SELECT entries, size FROM llm_cache_totals WHERE id = 0").fetchone()
+
+    def _evict(self, conn: sqlite3.Connection, now: float):
+        """
+        淘汰过期条目，并在超出条目数或大小上限时按最近访问时间淘汰
+
+        过期清理和按访问时间排序都走索引，超出大小上限时只按访问顺序读取到释放足够空间为止，
+        写入的开销与淘汰的条目数成正比，而不是与缓存大小成正比
+        """
+        if self.max_age is not None:
+            conn.execute("DELETE FROM llm_cache WHERE created_at < ?", (now - self.max_age,))
+
+        count, total_size = self._totals(conn)
+        if count > self.max_entries:
+            conn.execute(
+                "DELETE FROM llm_cache WHERE key IN (SELECT key FROM llm_cache ORDER BY last_access LIMIT ?)",
+                (count - self.max_entries,)
+            )
+            count, total_size = self._totals(conn)
+
+        if total_size > self.max_bytes:
+            keys, freed = [], 0
+            for key, size in conn.execute("SELECT key, size FROM llm_cache ORDER BY last_access"):
+                keys.append((key,))
+                freed += size
+                if total_size - freed <= self.max_bytes:
+                    break
+            conn.executemany("DELETE FROM llm_cache WHERE key=?", keys)
+
+    def clear(self, **kwargs: Any) -> None:
+        """清空缓存"""
+        with self._connect() as conn:
+            conn.execute("DELETE FROM llm_cache")
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        获取缓存统计信息
+
+        Returns:
+            命中次数、未命中次数、命中率、条目数和总大小
+        """
+        with self._connect() as conn:
+            count, total_size = self._totals(conn)
+
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": count,
+            "size_bytes": total_size,
+            "strict": self.strict
+        }
+
+
+class StrictLLMCache(BaseCache):
+    """
+    严格回放视图：读写共享的持久化缓存，未命中时抛出 LLMCacheMissError
+
+    多个回测共享同一个缓存存储时，每个回测可以单独决定是否严格回放，而不影响其他回测
+    """
+
+    def __init__(self, store: PersistentLLMCache):
+        """
+        Args:
+            store: 共享的持久化缓存
+        """
+        self.store = store
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        """查询缓存，未命中时抛出 LLMCacheMissError"""
+        result = self.store.lookup(prompt, llm_string)
+        if result is None:
+            key = self.store.make_key(prompt, llm_string)
+            raise LLMCacheMissError(f"LLM缓存未命中（严格模式）: {key[:12]}")
+        return result
+
+    def update(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        """写入共享缓存"""
+        self.store.update(prompt, llm_string, return_val)
+
+    def clear(self, **kwargs: Any) -> None:
+        """清空共享缓存"""
+        self.store.clear(**kwargs)
+
+    def stats(self) -> Dict[str, Any]:
+        """共享缓存的统计信息"""
+        return {**self.store.stats(), "strict": True}
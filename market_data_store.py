@@ -0,0 +1,399 @@
+"""
+本地行情数据存储
+
+基于SQLite的K线持久化存储，按 (股票代码, 频率, 复权类型) 记录已覆盖的日期区间，
+查询时只向baostock请求缺失的区间，之后的回测可以直接离线读取
+"""
+
+import atexit
+import os
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+from typing import Any, Callable, List, Optional, Tuple
+
+import baostock as bs
+import pandas as pd
+
+
+# 默认的本地数据库路径
+DEFAULT_DB_PATH = os.path.join("data", "market_data.sqlite")
+# 存储的K线字段
+BAR_FIELDS = ["date", "open", "high", "low", "close", "volume"]
+# 交易日历在覆盖表中使用的键
+CALENDAR_KEY = ("trade_calendar", "d", "")
+
+# 查询失败时最多尝试的次数（失败后重新登录再试，应对会话过期）
+BAOSTOCK_QUERY_ATTEMPTS = 2
+
+# baostock 使用全局连接，跨线程访问时需要串行化
+_BAOSTOCK_LOCK = threading.Lock()
+# 本进程是否登录过baostock
+_baostock_logged_in = False
+
+
+def baostock_logout():
+    """
+    登出baostock全局连接
+
+    连接由进程内所有行情存储共享，只应在进程退出时登出；
+    持有锁执行，不会打断其他线程正在进行的下载
+    """
+    global _baostock_logged_in
+    with _BAOSTOCK_LOCK:
+        if not _baostock_logged_in:
+            return
+        try:
+            bs.logout()
+        except Exception:
+            pass
+        _baostock_logged_in = False
+
+
+atexit.register(baostock_logout)
+
+
+class MarketDataStore:
+    """本地K线数据存储（支持增量刷新和离线读取）"""
+
+    def __init__(self, db_path: str = DEFAULT_DB_PATH, offline: bool = False):
+        """
+        初始化行情存储
+
+        Args:
+            db_path: SQLite数据库文件路径
+            offline: 离线模式，只读取本地数据，不访问网络
+        """
+        self.db_path = db_path
+        self.offline = offline
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._init_schema()
+
+    def _connect(self) -> sqlite3.Connection:
+        """创建数据库连接（每次操作独立连接，保证线程安全）"""
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def _init_schema(self):
+        """创建数据表"""
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS bars (
+                    code TEXT NOT NULL,
+                    frequency TEXT NOT NULL,
+                    adjustflag TEXT NOT NULL,
+                    date TEXT NOT NULL,
+                    open REAL,
+                    high REAL,
+                    low REAL,
+                    close REAL,
+                    volume REAL,
+                    PRIMARY KEY (code, frequency, adjustflag, date)
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS trade_calendar (
+                    date TEXT PRIMARY KEY,
+                    is_trading_day INTEGER NOT NULL
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS coverage (
+                    code TEXT NOT NULL,
+                    frequency TEXT NOT NULL,
+                    adjustflag TEXT NOT NULL,
+                    start_date TEXT NOT NULL,
+                    end_date TEXT NOT NULL
+                )
+            """)
+
+    def _ensure_login(self) -> bool:
+        """确保baostock已登录（已登录时直接返回，调用方需持有 _BAOSTOCK_LOCK）"""
+        global _baostock_logged_in
+        if _baostock_logged_in:
+            return True
+        lg = bs.login()
+        if lg.error_code != '0':
+            print(f"登录baostock失败: {lg.error_msg}")
+            return False
+        _baostock_logged_in = True
+        return True
+
+    def _query(self, query: Callable[[], Any]) -> Any:
+        """
+        执行baostock查询，失败时重新登录后重试（调用方需持有 _BAOSTOCK_LOCK）
+
+        登录状态在进程内复用，会话过期等导致的查询失败只在失败后才重新登录
+
+        Args:
+            query: 发起查询的函数，返回baostock结果集
+
+        Returns:
+            结果集，无法登录时返回None；重试后仍失败时返回最后一次的结果集
+        """
+        global _baostock_logged_in
+        rs = None
+        for attempt in range(BAOSTOCK_QUERY_ATTEMPTS):
+            if not self._ensure_login():
+                return None
+            try:
+                rs = query()
+            except Exception:
+                if attempt == BAOSTOCK_QUERY_ATTEMPTS - 1:
+                    raise
+                rs = None
+            if rs is not None and rs.error_code == '0':
+                return rs
+            # 标记为未登录，下一次尝试前重新登录
+            _baostock_logged_in = False
+        return rs
+
+    def get_coverage(self, code: str, frequency: str = "d", adjustflag: str = "3") -> List[Tuple[str, str]]:
+        """
+        获取已存储的日期区间（已合并、按开始日期排序）
+
+        Args:
+            code: 股票代码
+            frequency: K线频率
+            adjustflag: 复权类型
+
+        Returns:
+            [(start_date, end_date), ...]
+        """
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT start_date, end_date FROM coverage WHERE code=? AND frequency=? AND adjustflag=? ORDER BY start_date",
+                (code, frequency, adjustflag)
+            ).fetchall()
+        return rows
+
+    def missing_ranges(self, code: str, start_date: str, end_date: str,
+                       frequency: str = "d", adjustflag: str = "3") -> List[Tuple[str, str]]:
+        """
+        计算请求区间中尚未存储的日期区间
+
+        Args:
+            code: 股票代码
+            start_date: 开始日期
+            end_date: 结束日期
+            frequency: K线频率
+            adjustflag: 复权类型
+
+        Returns:
+            缺失的 [(start_date, end_date), ...]
+        """
+        missing = []
+        cursor = datetime.strptime(start_date, '%Y-%m-%d')
+        end = datetime.strptime(end_date, '%Y-%m-%d')
+
+        for covered_start, covered_end in self.get_coverage(code, frequency, adjustflag):
+            covered_start = datetime.strptime(covered_start, '%Y-%m-%d')
+            covered_end = datetime.strptime(covered_end, '%Y-%m-%d')
+            if covered_end < cursor:
+                continue
+            if covered_start > end:
+                break
+            if covered_start > cursor:
+                missing.append((cursor, covered_start - timedelta(days=1)))
+            cursor = max(cursor, covered_end + timedelta(days=1))
+            if cursor > end:
+                break
+
+        if cursor <= end:
+            missing.append((cursor, end))
+
+        return [(s.strftime('%Y-%m-%d'), e.strftime('%Y-%m-%d')) for s, e in missing]
+
+    def _add_coverage(self, conn: sqlite3.Connection, code: str, frequency: str, adjustflag: str,
+                      start_date: str, end_date: str):
+        """记录新的覆盖区间，并与相邻或重叠的区间合并"""
+        rows = conn.execute(
+            "SELECT start_date, end_date FROM coverage WHERE code=? AND frequency=? AND adjustflag=?",
+            (code, frequency, adjustflag)
+        ).fetchall()
+
+        intervals = sorted(rows + [(start_date, end_date)])
+        merged = []
+        for s, e in intervals:
+            if merged:
+                last_end = datetime.strptime(merged[-1][1], '%Y-%m-%d') + timedelta(days=1)
+                if datetime.strptime(s, '%Y-%m-%d') <= last_end:
+                    merged[-1] = (merged[-1][0], max(merged[-1][1], e))
+                    continue
+            merged.append((s, e))
+
+        conn.execute(
+            "DELETE FROM coverage WHERE code=? AND frequency=? AND adjustflag=?",
+            (code, frequency, adjustflag)
+        )
+        conn.executemany(
+            "INSERT INTO coverage (code, frequency, adjustflag, start_date, end_date) VALUES (?, ?, ?, ?, ?)",
+            [(code, frequency, adjustflag, s, e) for s, e in merged]
+        )
+
+    def _fetch_range(self, code: str, start_date: str, end_date: str,
+                     frequency: str, adjustflag: str) -> Optional[List[list]]:
+        """
+        从baostock获取一个日期区间的K线
+
+        Returns:
+            行数据列表，请求失败时返回None
+        """
+        with _BAOSTOCK_LOCK:
+            rs = self._query(lambda: bs.query_history_k_data_plus(
+                code,
+                ",".join(BAR_FIELDS),
+                start_date=start_date,
+                end_date=end_date,
+                frequency=frequency,
+                adjustflag=adjustflag
+            ))
+            if not rs or rs.error_code != '0':
+                print(f"获取K线失败 {code} {start_date}~{end_date}: {rs.error_msg if rs else '无响应'}")
+                return None
+
+            rows = []
+            while rs.next():
+                rows.append(rs.get_row_data())
+        return rows
+
+    def refresh(self, code: str, start_date: str, end_date: str,
+                frequency: str = "d", adjustflag: str = "3") -> int:
+        """
+        增量刷新：只获取并存储缺失的日期区间
+
+        当天及之后的数据可能尚未收盘定稿，不会被标记为已覆盖，下次查询时会重新获取
+
+        Returns:
+            新写入的K线数量
+        """
+        if self.offline:
+            return 0
+
+        with self._lock:
+            missing = self.missing_ranges(code, start_date, end_date, frequency, adjustflag)
+            if not missing:
+                return 0
+
+            last_final_date = (datetime.now() - timedelta(days=1)).strftime('%Y-%m-%d')
+            written = 0
+
+            for range_start, range_end in missing:
+                print(f"📡 下载行情数据: {code} {range_start} ~ {range_end}")
+                try:
+                    rows = self._fetch_range(code, range_start, range_end, frequency, adjustflag)
+                except Exception as e:
+                    print(f"下载行情数据失败 {code}: {e}")
+                    rows = None
+                if rows is None:
+                    continue
+
+                records = []
+                for row in rows:
+                    values = [self._to_float(v) for v in row[1:]]
+                    records.append((code, frequency, adjustflag, row[0], *values))
+
+                with self._connect() as conn:
+                    conn.executemany(
+                        "INSERT OR REPLACE INTO bars (code, frequency, adjustflag, date, open, high, low, close, volume) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        records
+                    )
+                    covered_end = min(range_end, last_final_date)
+                    if range_start <= covered_end:
+                        self._add_coverage(conn, code, frequency, adjustflag, range_start, covered_end)
+                written += len(records)
+
+            return written
+
+    @staticmethod
+    def _to_float(value: str) -> Optional[float]:
+        """将baostock返回的字符串转换为浮点数（空值返回None）"""
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return None
+
+    def get_bars(self, code: str, start_date: str, end_date: str,
+                 frequency: str = "d", adjustflag: str = "3") -> pd.DataFrame:
+        """
+        读取K线数据，必要时先增量下载缺失区间
+
+        Args:
+            code: 股票代码
+            start_date: 开始日期
+            end_date: 结束日期
+            frequency: K线频率
+            adjustflag: 复权类型
+
+        Returns:
+            按日期排序的DataFrame，列为 date/open/high/low/close/volume
+        """
+        self.refresh(code, start_date, end_date, frequency, adjustflag)
+
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT date, open, high, low, close, volume FROM bars "
+                "WHERE code=? AND frequency=? AND adjustflag=? AND date>=? AND date<=? ORDER BY date",
+                (code, frequency, adjustflag, start_date, end_date)
+            ).fetchall()
+
+        return pd.DataFrame(rows, columns=BAR_FIELDS)
+
+    def _refresh_trade_calendar(self, start_date: str, end_date: str):
+        """增量下载缺失区间的交易日历"""
+        if self.offline:
+            return
+
+        code, frequency, adjustflag = CALENDAR_KEY
+        with self._lock:
+            missing = self.missing_ranges(code, start_date, end_date, frequency, adjustflag)
+            last_final_date = (datetime.now() - timedelta(days=1)).strftime('%Y-%m-%d')
+
+            for range_start, range_end in missing:
+                print(f"📡 下载交易日历: {range_start} ~ {range_end}")
+                try:
+                    with _BAOSTOCK_LOCK:
+                        rs = self._query(lambda: bs.query_trade_dates(start_date=range_start, end_date=range_end))
+                        if not rs or rs.error_code != '0':
+                            print(f"获取交易日历失败: {rs.error_msg if rs else '无响应'}")
+                            continue
+                        rows = []
+                        while rs.next():
+                            rows.append(rs.get_row_data())
+                except Exception as e:
+                    print(f"下载交易日历失败: {e}")
+                    continue
+
+                with self._connect() as conn:
+                    conn.executemany(
+                        "INSERT OR REPLACE INTO trade_calendar (date, is_trading_day) VALUES (?, ?)",
+                        [(row[0], int(row[1])) for row in rows]
+                    )
+                    covered_end = min(range_end, last_final_date)
+                    if range_start <= covered_end:
+                        self._add_coverage(conn, code, frequency, adjustflag, range_start, covered_end)
+
+    def get_trade_dates(self, start_date: str, end_date: str) -> List[str]:
+        """
+        获取区间内的交易日（本地缓存交易日历，必要时增量下载）
+
+        Args:
+            start_date: 开始日期
+            end_date: 结束日期
+
+        Returns:
+            按日期排序的交易日列表
+        """
+        self._refresh_trade_calendar(start_date, end_date)
+
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT date FROM trade_calendar WHERE is_trading_day=1 AND date>=? AND date<=? ORDER BY date",
+                (start_date, end_date)
+            ).fetchall()
+
+        return [row[0] for row in rows]
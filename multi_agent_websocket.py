@@ -1,22 +1,174 @@
 from multi_agent_workflow import MultiAgentWorkflow
+from resource_pool import AgentResourcePool
+from analysis_registry import InflightAnalysisRegistry
+from report_cache import ReportCache
+from report_stream import ReportDeltaStreamer
+from outbound_queue import OutboundQueue, deliver
 from fastapi import WebSocket
+import asyncio
 import json
 import datetime
 import re
 
 class MultiAgentWebSocketManager:
-    def __init__(self, websocket: WebSocket):
+    def __init__(self, websocket: WebSocket, resource_pool: AgentResourcePool = None,
+                 registry: InflightAnalysisRegistry = None, report_cache: ReportCache = None):
+        if websocket is not None and not hasattr(websocket, "send_message"):
+            # 所有发送都经过出站队列，agent不会因为客户端网络慢而阻塞
+            websocket = OutboundQueue(websocket)
+            websocket.start()
         self.websocket = websocket
-        self.workflow = MultiAgentWorkflow(websocket)
+        self.output = websocket  # 当前日志输出目标（运行共享分析时为日志分发器）
+        # 连接只保留自己的WebSocket用于日志，MCP会话和模型从共享资源池借用
+        self.workflow = MultiAgentWorkflow(websocket, resource_pool=resource_pool)
+        # 进行中分析的登记表，多个连接共享时相同的分析只执行一次
+        self.registry = registry or InflightAnalysisRegistry()
+        # 已完成报告的缓存，为None时不使用缓存
+        self.report_cache = report_cache
+        # 当前连接正在执行的分析任务，连接断开时取消
+        self.current_task: asyncio.Task = None
+    
+    def start_analysis(self, coroutine) -> bool:
+        """
+        以任务方式启动分析，使接收循环可以继续检测连接断开
+        
+        Args:
+            coroutine: 分析协程（如 execute_multi_agent_analysis_direct(...)）
+        
+        Returns:
+            是否已启动（同一连接已有分析在进行时返回False）
+        """
+        if self.current_task is not None and not self.current_task.done():
+            coroutine.close()
+            self.websocket.send_message({
+                "message": "已有分析正在进行，请等待完成后再提交",
+                "type": "warning",
+                "timestamp": datetime.datetime.now().strftime("%H:%M:%S")
+            })
+            return False
+        self.current_task = asyncio.create_task(coroutine)
+        return True
+    
+    async def cancel_tasks(self):
+        """取消当前连接正在执行的分析并等待其退出（其他连接仍在等待的共享分析会继续运行）"""
+        task, self.current_task = self.current_task, None
+        if task is None or task.done():
+            return
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            print(f"取消分析任务时出错: {e}")
     
     async def send_log(self, message: str, log_type: str = "info"):
         """发送日志消息到前端"""
         timestamp = datetime.datetime.now().strftime("%H:%M:%S")
-        await self.websocket.send_text(json.dumps({
+        await deliver(self.output, {
             "message": message,
             "type": log_type,
             "timestamp": timestamp
-        }))
+        })
+    
+    async def send_event(self, payload: dict):
+        """发送结构化消息到前端"""
+        await deliver(self.output, payload)
+    
+    async def send_final_report(self, report: str):
+        """以 report_delta 分块推送最终报告，避免发送单个巨大的消息"""
+        streamer = ReportDeltaStreamer(self.send_event, stream="final_report", title="最终报告")
+        await streamer.send_text(report)
+        await streamer.end()
+    
+    async def replay_cached_report(self, cached: dict, replay_logs: bool = False):
+        """
+        直接发送缓存的报告
+        
+        Args:
+            cached: ReportCache 中的报告条目
+            replay_logs: 是否按原顺序重放完整的日志时间线（否则只发送最终报告）
+        """
+        created_at = datetime.datetime.fromtimestamp(cached["created_at"]).strftime("%H:%M:%S")
+        await self.send_log(f"💾 使用缓存的分析报告（生成于 {created_at}），如需重新分析请强制刷新", "info")
+        
+        if replay_logs:
+            for event in cached["events"]:
+                await deliver(self.websocket, event if isinstance(event, dict) else json.loads(event))
+            return
+        
+        await self.send_log("=== 综合分析报告 ===", "success")
+        await self.send_final_report(cached['report'])
+        await self.send_log("执行完成", "execution_complete")
+    
+    async def run_shared_analysis(self, company_name: str, stock_code: str,
+                                  force_refresh: bool = False, replay_logs: bool = False):
+        """
+        运行分析并发送最终报告；相同股票当天已有分析在进行时直接加入，共享其日志和报告
+        
+        Args:
+            company_name: 公司名称
+            stock_code: 股票代码
+            force_refresh: 忽略缓存的报告，重新分析
+            replay_logs: 命中缓存时是否重放完整的日志时间线
+        """
+        trade_date = datetime.datetime.now().strftime("%Y-%m-%d")
+        
+        if self.report_cache is not None and not force_refresh:
+            cached = self.report_cache.get(stock_code, trade_date)
+            if cached is not None:
+                await self.replay_cached_report(cached, replay_logs)
+                return
+        
+        key = (stock_code, trade_date, "full")
+        if self.registry.is_running(key):
+            await self.send_log(f"🔗 {company_name} ({stock_code}) 的分析正在进行中，已加入共享分析", "info")
+        
+        async def runner(broadcaster):
+            final_report = await self.run_and_report(broadcaster, company_name, stock_code)
+            # 只缓存成功完成的分析（有步骤失败或没有投资决策时不缓存）
+            if self.report_cache is not None and not self.is_failed_report(final_report):
+                self.report_cache.put(stock_code, trade_date, company_name, str(final_report), broadcaster.history)
+            return final_report
+        
+        await self.registry.run(key, self.websocket, runner)
+    
+    @staticmethod
+    def is_failed_report(final_report) -> bool:
+        """判断分析结果是否失败（run_analysis 出错、任一步骤失败或没有生成投资决策）"""
+        if not isinstance(final_report, dict):
+            return True
+        return bool(final_report.get("error") or final_report.get("errors") or not final_report.get("investment_decision"))
+    
+    async def run_and_report(self, output, company_name: str, stock_code: str):
+        """执行分析并将日志、最终报告和完成信号发送到给定的输出（通常为日志分发器）"""
+        self.output = output
+        self.workflow.set_websocket(output)
+        try:
+            # 运行多agent分析
+            await self.send_log("启动多Agent分析系统...", "info")
+            final_report = await self.workflow.run_analysis(company_name, stock_code)
+            
+            if final_report:
+                await self.send_log("=== 综合分析报告 ===", "success")
+                await self.send_final_report(str(final_report))
+            else:
+                await self.send_log("未能生成最终报告", "error")
+            
+            # 发送执行完成信号
+            await self.send_log("执行完成", "execution_complete")
+            return final_report
+        
+        except Exception as e:
+            await self.send_log(f"执行过程中发生错误: {e}", "error")
+            import traceback
+            error_details = traceback.format_exc()
+            await self.send_log(f"错误详情: {error_details}", "error")
+            await self.send_log("执行完成", "execution_complete")
+        
+        finally:
+            self.output = self.websocket
+            self.workflow.set_websocket(self.websocket)
     
     def parse_query(self, query: str):
         """解析用户查询，提取公司名称和股票代码"""
@@ -61,7 +213,7 @@ class MultiAgentWebSocketManager:
         
         return company_name, stock_code
     
-    async def execute_multi_agent_analysis(self, query: str):
+    async def execute_multi_agent_analysis(self, query: str, force_refresh: bool = False, replay_logs: bool = False):
         """执行多agent分析"""
         try:
             await self.send_log("开始解析查询内容...", "info")
@@ -84,25 +236,8 @@ class MultiAgentWebSocketManager:
             
             await self.send_log(f"解析结果 - 公司名称: {company_name}, 股票代码: {stock_code}", "success")
             
-            # 运行多agent分析
-            await self.send_log("启动多Agent分析系统...", "info")
-            final_report = await self.workflow.run_analysis(company_name, stock_code)
-            
-            if final_report:
-                await self.send_log("=== 综合分析报告 ===", "success")
-                await self.send_log(f"📄 最终报告:\n{final_report}", "success")
-                # # 分段发送长文本报告
-                # if len(final_report) > 2000:
-                #     parts = [final_report[i:i+2000] for i in range(0, len(final_report), 2000)]
-                #     for i, part in enumerate(parts):
-                #         await self.send_log(f"📄 报告 ({i+1}/{len(parts)}): {part}", "success")
-                # else:
-                #     await self.send_log(f"📄 最终报告: {final_report}", "success")
-            else:
-                await self.send_log("未能生成最终报告", "error")
-            
-            # 发送执行完成信号
-            await self.send_log("执行完成", "execution_complete")
+            # 运行（或加入正在进行的）多agent分析
+            await self.run_shared_analysis(company_name, stock_code, force_refresh, replay_logs)
             
         except Exception as e:
             await self.send_log(f"执行过程中发生错误: {e}", "error")
@@ -111,7 +246,8 @@ class MultiAgentWebSocketManager:
             await self.send_log(f"错误详情: {error_details}", "error")
             await self.send_log("执行完成", "execution_complete")
 
-    async def execute_multi_agent_analysis_direct(self, company_name: str, stock_code: str):
+    async def execute_multi_agent_analysis_direct(self, company_name: str, stock_code: str,
+                                                  force_refresh: bool = False, replay_logs: bool = False):
         """直接执行多agent分析，无需解析查询"""
         try:
             await self.send_log(f"开始分析: {company_name} ({stock_code})", "info")
@@ -124,18 +260,8 @@ class MultiAgentWebSocketManager:
                 
             await self.send_log(f"分析目标 - 公司名称: {company_name}, 股票代码: {stock_code}", "success")
             
-            # 运行多agent分析
-            await self.send_log("启动多Agent分析系统...", "info")
-            final_report = await self.workflow.run_analysis(company_name, stock_code)
-            
-            if final_report:
-                await self.send_log("=== 综合分析报告 ===", "success")
-                await self.send_log(f"📄 最终报告:\n{final_report}", "success")
-            else:
-                await self.send_log("未能生成最终报告", "error")
-            
-            # 发送执行完成信号
-            await self.send_log("执行完成", "execution_complete")
+            # 运行（或加入正在进行的）多agent分析
+            await self.run_shared_analysis(company_name, stock_code, force_refresh, replay_logs)
             
         except Exception as e:
             await self.send_log(f"执行过程中发生错误: {e}", "error")
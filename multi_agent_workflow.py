@@ -1,7 +1,5 @@
 from langchain_mcp_adapters.client import MultiServerMCPClient
 from langgraph.prebuilt import create_react_agent
-from langchain_google_genai import ChatGoogleGenerativeAI
-import os
 from dotenv import load_dotenv
 from typing import Annotated, TypedDict, List
 from langchain_core.messages import BaseMessage, HumanMessage, AIMessage
@@ -14,9 +12,44 @@ import json
 
 # 导入新创建的agent类
 from agents import FundamentalAgent, TechnicalAgent, ValuationAgent, SummaryAgent, InvestmentAgent
+from tool_cache import ToolResultCache
+from llm_cache import LLMCacheMissError
+from outbound_queue import deliver
+from resource_pool import AgentResourcePool, MCP_CONNECTIONS, create_llm
+from technical_indicators import compute_indicators, summarize, format_summary, parse_kline_markdown
 
 load_dotenv()
 
+# 预取阶段单个工具调用的超时时间（秒）
+PREFETCH_TIMEOUT = 30.0
+# 预取K线的回看天数（自然日）
+PREFETCH_KLINE_DAYS = 180
+# 预取估值指标的回看天数（自然日）
+PREFETCH_VALUATION_DAYS = 365
+# 各季度财报的法定披露截止日（月, 日），第四季度为次年
+REPORT_DEADLINES = {1: (4, 30), 2: (8, 31), 3: (10, 31), 4: (4, 30)}
+
+
+def latest_reported_quarter(current_date: str):
+    """
+    获取截至指定日期已完成披露的最近一个报告期
+    
+    Args:
+        current_date: 日期字符串 (YYYY-MM-DD)
+        
+    Returns:
+        (年份, 季度)
+    """
+    today = datetime.datetime.strptime(current_date, "%Y-%m-%d").date()
+    for year in (today.year, today.year - 1, today.year - 2):
+        for quarter in (4, 3, 2, 1):
+            month, day = REPORT_DEADLINES[quarter]
+            deadline = datetime.date(year + 1 if quarter == 4 else year, month, day)
+            if deadline <= today:
+                return year, quarter
+    return today.year - 2, 4
+
+
 class MultiAgentState(TypedDict):
     company_name: str
     stock_code: str
@@ -31,23 +64,28 @@ class MultiAgentState(TypedDict):
     summary_analysis: str
     investment_decision: str
     final_report: str
+    prefetched_data: dict
+    technical_indicators: str
+    errors: list  # 执行失败的步骤（非空时结果不可作为正常分析使用）
     messages: Annotated[list[BaseMessage], add_messages]
 
 class MultiAgentWorkflow:
-    def __init__(self, websocket: WebSocket = None, verbose: bool = True):
+    def __init__(self, websocket: WebSocket = None, verbose: bool = True, llm_cache=None,
+                 tool_cache: ToolResultCache = None, resource_pool: AgentResourcePool = None):
         self.websocket = websocket
         self.verbose = verbose
+        self.llm_cache = llm_cache  # 可选的LLM响应缓存（如 PersistentLLMCache）
+        self.resource_pool = resource_pool  # 可选的进程级共享资源池，可用时直接借用其中的会话和模型
+        # MCP工具结果缓存（使用资源池时与其他连接共享）
+        self.tool_cache = tool_cache or (resource_pool.tool_cache if resource_pool else ToolResultCache())
         
-        # 优化MCP客户端配置 - 使用测试验证的工作配置
-        self.client = MultiServerMCPClient({
-            "a_share_data_provider": {
-                "url": "http://localhost:3000/mcp/",
-                "transport": "streamable_http"
-            }
-        })
+        # 优化MCP客户端配置 - 使用测试验证的工作配置（资源池不可用时使用）
+        self.client = MultiServerMCPClient(MCP_CONNECTIONS)
         self.tools = None
         self.llm = None
         self._initialized = False  # 追踪初始化状态
+        self._pool_generation = None  # 借用的资源所属的资源池代数
+        self._compiled_workflows = {}  # 工作流名称 -> 编译后的图（节点为实例方法，每个实例只需编译一次）
         
         # 初始化agent实例，传入verbose参数
         self.fundamental_agent = FundamentalAgent(verbose=self.verbose)
@@ -60,16 +98,61 @@ class MultiAgentWorkflow:
         """发送日志消息到前端"""
         if self.websocket:
             timestamp = datetime.datetime.now().strftime("%H:%M:%S")
-            await self.websocket.send_text(json.dumps({
+            await deliver(self.websocket, {
                 "message": message,
                 "type": log_type,
                 "timestamp": timestamp
-            }))
+            })
         else:
             print(f"[{log_type.upper()}] {message}")
     
+    def set_websocket(self, websocket):
+        """切换日志输出目标（工作流及所有agent）"""
+        self.websocket = websocket
+        for agent in [self.fundamental_agent, self.technical_agent, 
+                     self.valuation_agent, self.summary_agent, self.investment_agent]:
+            agent.set_websocket(websocket)
+    
+    def configure_agents(self):
+        """为所有agent设置LLM、工具和WebSocket"""
+        for agent in [self.fundamental_agent, self.technical_agent, 
+                     self.valuation_agent, self.summary_agent, self.investment_agent]:
+            agent.set_llm(self.llm)
+            agent.set_tools(self.tools)
+            agent.set_websocket(self.websocket)
+    
+    async def borrow_from_pool(self) -> bool:
+        """
+        从共享资源池借用MCP会话和模型
+        
+        Returns:
+            是否借用成功（资源池不可用时返回False，由调用方回退到独立连接）
+        """
+        pool = self.resource_pool
+        if self._initialized and self._pool_generation == pool.generation and pool.ready:
+            await self.send_log("使用共享的MCP会话和模型", "info")
+            return True
+        
+        if not await pool.start():
+            if self._pool_generation is not None:
+                # 之前借用的会话已失效，需要重新建立独立连接
+                self._initialized = False
+                self._pool_generation = None
+            await self.send_log("⚠️ 共享资源池不可用，改用独立连接", "warning")
+            return False
+        
+        self.llm, self.tools = pool.acquire()
+        self._pool_generation = pool.generation
+        self.configure_agents()
+        self._initialized = True
+        await self.send_log(f"✅ 已接入共享资源池，可用工具数量: {len(self.tools)}", "success")
+        return True
+    
     async def initialize_tools_and_model(self):
-        """初始化工具和模型（带缓存和优化的连接管理）"""
+        """初始化工具和模型（优先借用共享资源池，否则建立独立连接）"""
+        if self.resource_pool is not None and await self.borrow_from_pool():
+            return True
+        
         if self._initialized:
             await self.send_log("使用已初始化的连接", "info")
             return True
@@ -88,10 +171,12 @@ class MultiAgentWorkflow:
                     await self.send_log(f"尝试连接 MCP 服务器 ({attempt + 1}/{max_retries})", "info")
                     
                     # 设置适中的超时时间，确保MCP连接稳定
-                    self.tools = await asyncio.wait_for(
+                    tools = await asyncio.wait_for(
                         self.client.get_tools(), 
                         timeout=30.0  # 增加超时时间
                     )
+                    # 为工具添加结果缓存，多个agent重复调用相同工具时直接复用结果
+                    self.tools = self.tool_cache.wrap_tools(tools)
                     
                     await self.send_log(f"✅ MCP连接成功！可用工具数量: {len(self.tools)}", "success")
                     break
@@ -124,24 +209,12 @@ class MultiAgentWorkflow:
             
             # 初始化 Gemini 模型
             await self.send_log("正在初始化 Gemini 模型...", "info")
-            if not os.getenv("GOOGLE_API_KEY"):
-                raise Exception("GOOGLE_API_KEY 未设置")
-            
-            self.llm = ChatGoogleGenerativeAI(
-                model=os.getenv("GEMINI_MODEL", "gemini-2.0-flash"),
-                timeout=60,  # 设置模型调用超时
-                max_retries=2,  # 设置模型重试次数
-                temperature=0.1  # 降低随机性
-            )
+            self.llm = create_llm(self.llm_cache)  # llm_cache为None时不使用缓存
             
             await self.send_log("✅ 系统初始化完成", "success")
             
             # 为所有agent设置LLM、工具和WebSocket
-            for agent in [self.fundamental_agent, self.technical_agent, 
-                         self.valuation_agent, self.summary_agent, self.investment_agent]:
-                agent.set_llm(self.llm)
-                agent.set_tools(self.tools)
-                agent.set_websocket(self.websocket)
+            self.configure_agents()
             
             await self.send_log("Gemini 模型和Agent配置完成", "success")
             self._initialized = True
@@ -165,26 +238,118 @@ class MultiAgentWorkflow:
         await self.send_log("🚀 启动并行分析流程...", "info")
         return state
     
+    def build_prefetch_requests(self, state: MultiAgentState) -> dict:
+        """
+        构建标准数据包的工具调用请求
+        
+        Args:
+            state: 当前状态
+            
+        Returns:
+            数据项 -> (标题, 工具名, 参数)
+        """
+        code = state["stock_code"]
+        current_date = state.get("current_date") or datetime.datetime.now().strftime("%Y-%m-%d")
+        today = datetime.datetime.strptime(current_date, "%Y-%m-%d")
+        kline_start = (today - datetime.timedelta(days=PREFETCH_KLINE_DAYS)).strftime("%Y-%m-%d")
+        valuation_start = (today - datetime.timedelta(days=PREFETCH_VALUATION_DAYS)).strftime("%Y-%m-%d")
+        year, quarter = latest_reported_quarter(current_date)
+        report = {"code": code, "year": str(year), "quarter": quarter}
+        
+        return {
+            "basic_info": ("股票基本信息", "get_stock_basic_info", {"code": code}),
+            "industry": ("行业分类", "get_stock_industry", {"code": code, "date": current_date}),
+            "k_data": (f"最近{PREFETCH_KLINE_DAYS}天日K线", "get_historical_k_data",
+                       {"code": code, "start_date": kline_start, "end_date": current_date}),
+            "profit": (f"{year}年Q{quarter}盈利能力", "get_profit_data", report),
+            "growth": (f"{year}年Q{quarter}成长能力", "get_growth_data", report),
+            "balance": (f"{year}年Q{quarter}偿债能力", "get_balance_data", report),
+            "cash_flow": (f"{year}年Q{quarter}现金流量", "get_cash_flow_data", report),
+            "valuation": ("估值指标", "get_valuation_metrics",
+                          {"code": code, "start_date": valuation_start, "end_date": current_date}),
+        }
+    
+    async def data_prefetch(self, state: MultiAgentState) -> MultiAgentState:
+        """数据预取节点：确定性地并发获取标准数据包，供三个专业分析agent共享"""
+        await self.send_log("📦 正在并发预取标准数据包...", "info")
+        
+        tools_by_name = {tool.name: tool for tool in (self.tools or [])}
+        requests = {
+            key: request for key, request in self.build_prefetch_requests(state).items()
+            if request[1] in tools_by_name
+        }
+        
+        async def fetch(title, tool_name, args):
+            return await asyncio.wait_for(tools_by_name[tool_name].ainvoke(args), timeout=PREFETCH_TIMEOUT)
+        
+        results = await asyncio.gather(
+            *[fetch(*request) for request in requests.values()],
+            return_exceptions=True
+        )
+        
+        prefetched_data = {}
+        for (key, (title, tool_name, args)), result in zip(requests.items(), results):
+            if isinstance(result, Exception):
+                await self.send_log(f"⚠️ 预取{title}失败: {result}", "warning")
+                continue
+            prefetched_data[key] = {"title": title, "tool": tool_name, "args": args, "content": str(result)}
+        
+        state["prefetched_data"] = prefetched_data
+        await self.send_log(f"✅ 数据预取完成: {len(prefetched_data)}/{len(requests)} 项", "success")
+        
+        # 回测会直接传入批量计算好的指标，实时分析时根据预取的K线计算
+        if not state.get("technical_indicators") and "k_data" in prefetched_data:
+            state["technical_indicators"] = self.compute_technical_indicators(prefetched_data["k_data"]["content"])
+        return state
+    
+    def compute_technical_indicators(self, kline_text: str) -> str:
+        """
+        根据预取的K线表格计算技术指标摘要
+        
+        Args:
+            kline_text: get_historical_k_data 返回的Markdown表格
+            
+        Returns:
+            格式化的指标摘要，无法解析时返回空字符串
+        """
+        kline = parse_kline_markdown(kline_text)
+        if kline is None or len(kline["close"]) == 0:
+            return ""
+        
+        indicators = compute_indicators(kline["close"], kline.get("high"), kline.get("low"), kline.get("volume"))
+        return format_summary(summarize(indicators), as_of=str(kline["dates"][-1]))
+    
     async def parallel_analysis(self, state: MultiAgentState) -> MultiAgentState:
         """并行执行三个分析agent"""
         await self.send_log("⚡ 开始并行执行三个专业分析...", "info")
         
         # 并行执行三个分析
         tasks = [
-            self.fundamental_agent.analyze(state),
-            self.technical_agent.analyze(state),
-            self.valuation_agent.analyze(state)
+            asyncio.ensure_future(self.fundamental_agent.analyze(state)),
+            asyncio.ensure_future(self.technical_agent.analyze(state)),
+            asyncio.ensure_future(self.valuation_agent.analyze(state))
         ]
         
-        # 等待所有分析完成
-        results = await asyncio.gather(*tasks, return_exceptions=True)
+        # 等待所有分析完成；分析被取消（如客户端断开）时取消全部子任务并等待其退出，再向上传递取消
+        try:
+            results = await asyncio.gather(*tasks, return_exceptions=True)
+        except asyncio.CancelledError:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+        
+        # 严格回放时缓存未命中需要中止回放
+        for result in results:
+            if isinstance(result, LLMCacheMissError):
+                raise result
         
         # 处理结果并更新状态
         agent_names = ["基本面分析", "技术分析", "估值分析"]
         for i, result in enumerate(results):
             if isinstance(result, Exception):
                 await self.send_log(f"❌ {agent_names[i]}失败: {result}", "error")
-                # 结果已经在agent的analyze方法中处理过了
+                state.setdefault("errors", []).append(f"{agent_names[i]}: {result}")
             else:
                 # 结果已经在agent的analyze方法中更新到state中
                 await self.send_log(f"✅ {agent_names[i]}完成", "success")
@@ -202,9 +367,12 @@ class MultiAgentWorkflow:
             await self.send_log("✅ 综合分析报告生成完成", "success")
             return result_state
             
+        except LLMCacheMissError:
+            raise
         except Exception as e:
             await self.send_log(f"❌ 综合分析报告生成失败: {e}", "error")
             state["summary_analysis"] = f"综合分析报告生成失败: {e}"
+            state.setdefault("errors", []).append(f"综合分析报告: {e}")
             return state
     
     async def investment_agent_node(self, state: MultiAgentState) -> MultiAgentState:
@@ -218,6 +386,8 @@ class MultiAgentWorkflow:
             await self.send_log("✅ 投资决策生成完成", "success")
             return result_state
             
+        except LLMCacheMissError:
+            raise
         except Exception as e:
             await self.send_log(f"❌ 投资决策生成失败: {e}", "error")
             state["investment_decision"] = {
@@ -230,14 +400,33 @@ class MultiAgentWorkflow:
                 "risk_level": "medium",
                 "reasons": [f"投资决策生成失败: {e}"]
             }
+            state.setdefault("errors", []).append(f"投资决策: {e}")
             return state
     
+    def get_workflow(self, name: str = "full"):
+        """
+        获取编译后的工作流图（首次使用时编译并缓存）
+        
+        Args:
+            name: "full" 为完整分析流程，"investment" 为回测使用的投资决策流程
+            
+        Returns:
+            编译后的工作流
+        """
+        app = self._compiled_workflows.get(name)
+        if app is None:
+            builders = {"full": self.create_workflow, "investment": self.create_investment_workflow}
+            app = builders[name]()
+            self._compiled_workflows[name] = app
+        return app
+    
     def create_workflow(self):
         """创建工作流图"""
         workflow = StateGraph(MultiAgentState)
         
         # 添加节点
         workflow.add_node("router", self.router_node)
+        workflow.add_node("data_prefetch", self.data_prefetch)
         workflow.add_node("parallel_analysis", self.parallel_analysis)
         workflow.add_node("summary", self.summary_agent_node)
         workflow.add_node("investment", self.investment_agent_node)
@@ -246,7 +435,8 @@ class MultiAgentWorkflow:
         workflow.set_entry_point("router")
         
         # 设置边
-        workflow.add_edge("router", "parallel_analysis")
+        workflow.add_edge("router", "data_prefetch")
+        workflow.add_edge("data_prefetch", "parallel_analysis")
         workflow.add_edge("parallel_analysis", "summary")
         workflow.add_edge("summary", "investment")
         workflow.add_edge("investment", END)
@@ -281,6 +471,9 @@ class MultiAgentWorkflow:
             "summary_analysis": "",
             "investment_decision": "",
             "final_report": "",
+            "prefetched_data": {},
+            "technical_indicators": "",
+            "errors": [],
             "messages": []
         }
         
@@ -304,7 +497,7 @@ class MultiAgentWorkflow:
             
             # 创建并运行工作流
             await self.send_log("🔧 构建分析工作流...", "info")
-            app = self.create_workflow()
+            app = self.get_workflow("full")
             
             # 运行工作流
             await self.send_log("🚀 开始执行分析工作流（无超时限制）...", "info")
@@ -312,9 +505,15 @@ class MultiAgentWorkflow:
             
             await self.send_log("🎉 所有分析完成！", "success")
             
-            # 返回完整的状态结果
+            # 返回状态结果；预取的原始数据只供各agent使用，不随报告发送和缓存
+            result.pop("prefetched_data", None)
+            # 有步骤失败时与回测接口一致地标记 error，调用方据此不缓存该报告
+            if result.get("errors"):
+                result["error"] = "；".join(result["errors"])
             return result
             
+        except LLMCacheMissError:
+            raise
         except Exception as e:
             error_msg = f"分析过程中发生错误: {e}"
             await self.send_log(f"❌ {error_msg}", "error")
@@ -336,6 +535,81 @@ class MultiAgentWorkflow:
             # await self.cleanup()
             pass
     
+    def build_state(self, input_data: dict) -> MultiAgentState:
+        """
+        根据输入数据构建工作流初始状态
+        
+        Args:
+            input_data: 包含分析所需数据的字典
+            
+        Returns:
+            初始状态
+        """
+        return {
+            "company_name": input_data.get("company_name", "未知公司"),
+            "stock_code": input_data.get("stock_code", "unknown"),
+            "current_time_info": input_data.get("current_time_info", ""),
+            "current_date": input_data.get("current_date", ""),
+            "current_price": input_data.get("current_price", 0.0),
+            "historical_prices": input_data.get("historical_prices", []),
+            "portfolio_state": input_data.get("portfolio_state", {}),
+            "fundamental_analysis": input_data.get("fundamental_analysis", ""),
+            "technical_analysis": input_data.get("technical_analysis", ""),
+            "valuation_analysis": input_data.get("valuation_analysis", ""),
+            "summary_analysis": input_data.get("summary_analysis", ""),
+            "investment_decision": "",
+            "final_report": "",
+            "prefetched_data": input_data.get("prefetched_data", {}),
+            "technical_indicators": input_data.get("technical_indicators", ""),
+            "errors": list(input_data.get("errors", [])),
+            "messages": []
+        }
+    
+    def parse_investment_decision(self, investment_decision) -> dict:
+        """解析投资决策（字符串形式时尝试按JSON解析）"""
+        if isinstance(investment_decision, str):
+            try:
+                return json.loads(investment_decision)
+            except:
+                # 解析失败时提供默认决策
+                return {
+                    "action": "HOLD",
+                    "confidence": 0.5,
+                    "target_price": None,
+                    "stop_loss": None,
+                    "position_size": 0.0,
+                    "holding_period": "medium",
+                    "risk_level": "medium",
+                    "reasons": ["决策解析失败"]
+                }
+        return investment_decision
+    
+    async def build_decision_result(self, result: dict) -> dict:
+        """
+        从工作流最终状态整理回测使用的结果字典
+        
+        Args:
+            result: 工作流最终状态
+            
+        Returns:
+            包含投资决策和各项分析的结果字典，有步骤失败时包含 error
+        """
+        investment_decision = self.parse_investment_decision(result.get('investment_decision', {}))
+        
+        await self.send_log(f"✅ 投资决策生成完成: {investment_decision.get('action', 'HOLD')}", "success")
+        
+        decision_result = {
+            "investment_decision": investment_decision,
+            "fundamental_analysis": result.get('fundamental_analysis', ''),
+            "technical_analysis": result.get('technical_analysis', ''),
+            "valuation_analysis": result.get('valuation_analysis', ''),
+            "summary_analysis": result.get('summary_analysis', '')
+        }
+        errors = result.get('errors') or []
+        if errors:
+            decision_result["error"] = "；".join(errors)
+        return decision_result
+    
     async def run(self, input_data: dict):
         """
         简化的运行接口，用于回测系统调用
@@ -344,77 +618,101 @@ class MultiAgentWorkflow:
             input_data: 包含分析所需数据的字典
             
         Returns:
-            包含投资决策的结果字典
+            包含投资决策的结果字典（分析失败时包含 error）
         """
         try:
-            company_name = input_data.get("company_name", "未知公司")
-            stock_code = input_data.get("stock_code", "unknown")
-            
-            await self.send_log(f"📊 开始单次分析: {company_name} ({stock_code})", "info")
-            
-            # 准备状态
-            state = {
-                "company_name": company_name,
-                "stock_code": stock_code,
-                "current_time_info": input_data.get("current_time_info", ""),
-                "current_date": input_data.get("current_date", ""),
-                "current_price": input_data.get("current_price", 0.0),
-                "historical_prices": input_data.get("historical_prices", []),
-                "portfolio_state": input_data.get("portfolio_state", {}),
-                "fundamental_analysis": "",
-                "technical_analysis": "",
-                "valuation_analysis": "",
-                "summary_analysis": "",
-                "investment_decision": "",
-                "final_report": "",
-                "messages": []
-            }
+            state = self.build_state(input_data)
+            
+            await self.send_log(f"📊 开始单次分析: {state['company_name']} ({state['stock_code']})", "info")
             
             # 确保已初始化
             if not await self.initialize_tools_and_model():
                 raise Exception("系统初始化失败")
             
-            # 创建简化的工作流（只到投资决策）
-            app = self.create_investment_workflow()
+            # 获取简化的工作流（只到投资决策）
+            app = self.get_workflow("investment")
             
             await self.send_log(f"🚀 开始单次分析（无超时限制）", "info")
             
             result = await app.ainvoke(state)
+            return await self.build_decision_result(result)
+            
+        except LLMCacheMissError:
+            raise
+        except Exception as e:
+            await self.send_log(f"❌ 单次分析失败: {e}", "error")
+            return {
+                "error": f"单次分析失败: {e}",
+                "investment_decision": {
+                    "action": "HOLD",
+                    "confidence": 0.5,
+                    "target_price": None,
+                    "stop_loss": None,
+                    "position_size": 0.0,
+                    "holding_period": "medium",
+                    "risk_level": "medium",
+                    "reasons": [f"分析失败: {str(e)}"]
+                }
+            }
+    
+    async def run_market_analysis(self, input_data: dict):
+        """
+        只执行与投资组合无关的三个专业分析（用于两阶段回测的并发阶段）
+        
+        Args:
+            input_data: 包含分析所需数据的字典
             
-            # 提取投资决策
-            investment_decision = result.get('investment_decision', {})
+        Returns:
+            包含三个专业分析结果和失败步骤（errors）的字典
+        """
+        state = self.build_state(input_data)
+        
+        try:
+            if not await self.initialize_tools_and_model():
+                raise Exception("系统初始化失败")
             
-            # 如果是字符串，尝试解析
-            if isinstance(investment_decision, str):
-                try:
-                    import json
-                    investment_decision = json.loads(investment_decision)
-                except:
-                    # 解析失败时提供默认决策
-                    investment_decision = {
-                        "action": "HOLD",
-                        "confidence": 0.5,
-                        "target_price": None,
-                        "stop_loss": None,
-                        "position_size": 0.0,
-                        "holding_period": "medium",
-                        "risk_level": "medium",
-                        "reasons": ["决策解析失败"]
-                    }
+            await self.send_log(f"📊 开始市场分析: {state['company_name']} ({state['stock_code']}) @ {state['current_date']}", "info")
+            state = await self.data_prefetch(state)
+            state = await self.parallel_analysis(state)
             
-            await self.send_log(f"✅ 投资决策生成完成: {investment_decision.get('action', 'HOLD')}", "success")
+        except LLMCacheMissError:
+            raise
+        except Exception as e:
+            await self.send_log(f"❌ 市场分析失败: {e}", "error")
+            state.setdefault("errors", []).append(f"市场分析: {e}")
+        
+        return {
+            "fundamental_analysis": state.get('fundamental_analysis', ''),
+            "technical_analysis": state.get('technical_analysis', ''),
+            "valuation_analysis": state.get('valuation_analysis', ''),
+            "errors": state.get('errors', [])
+        }
+    
+    async def run_investment_decision(self, input_data: dict):
+        """
+        基于已完成的市场分析和当前投资组合状态生成投资决策（用于两阶段回测的顺序阶段）
+        
+        Args:
+            input_data: 包含分析所需数据和三个专业分析结果的字典
             
-            return {
-                "investment_decision": investment_decision,
-                "fundamental_analysis": result.get('fundamental_analysis', ''),
-                "technical_analysis": result.get('technical_analysis', ''),
-                "valuation_analysis": result.get('valuation_analysis', ''),
-                "summary_analysis": result.get('summary_analysis', '')
-            }
+        Returns:
+            与 run 相同格式的结果字典
+        """
+        try:
+            state = self.build_state(input_data)
             
+            if not await self.initialize_tools_and_model():
+                raise Exception("系统初始化失败")
+            
+            result = await self.investment_agent_node(state)
+            return await self.build_decision_result(result)
+            
+        except LLMCacheMissError:
+            raise
         except Exception as e:
-            await self.send_log(f"❌ 单次分析失败: {e}", "error")
+            await self.send_log(f"❌ 投资决策生成失败: {e}", "error")
             return {
+                "error": f"投资决策生成失败: {e}",
                 "investment_decision": {
                     "action": "HOLD",
                     "confidence": 0.5,
@@ -434,6 +732,7 @@ class MultiAgentWorkflow:
         
         # 添加节点
         workflow.add_node("router", self.router_node)
+        workflow.add_node("data_prefetch", self.data_prefetch)
         workflow.add_node("parallel_analysis", self.parallel_analysis)
         workflow.add_node("investment_node", self.investment_agent_node)
         
@@ -441,7 +740,8 @@ class MultiAgentWorkflow:
         workflow.set_entry_point("router")
         
         # 添加边
-        workflow.add_edge("router", "parallel_analysis")
+        workflow.add_edge("router", "data_prefetch")
+        workflow.add_edge("data_prefetch", "parallel_analysis")
         workflow.add_edge("parallel_analysis", "investment_node")
         workflow.add_edge("investment_node", END)
         
@@ -0,0 +1,240 @@
+"""
+WebSocket出站消息队列
+
+每个连接一个有界队列和一个后台发送任务：agent只把消息放入队列，从不等待网络；
+发送任务按固定间隔把队列中的消息合并为一个JSON数组（orjson编码）发送，每帧不超过字节上限。
+客户端处理不过来时丢弃低优先级日志，并合并同一报告流的增量消息（合并后不超过一个报告分块）；
+积压达到硬上限时认为客户端已无法跟上，关闭该连接而不是无限制地占用内存
+"""
+
+import asyncio
+import json
+from collections import deque
+from typing import Any, Dict, Optional, Union
+
+import orjson
+
+from report_stream import REPORT_CHUNK_SIZE
+
+
+# 默认队列容量（条）
+DEFAULT_QUEUE_SIZE = 1000
+# 默认发送间隔（毫秒）
+DEFAULT_FLUSH_INTERVAL_MS = 50
+# 单个批次最多包含的消息数
+DEFAULT_MAX_BATCH = 200
+# 单个批次的最大字节数（单条消息超过上限时单独成帧）
+DEFAULT_MAX_BATCH_BYTES = 8 * 1024
+# 默认硬上限（条）：不可丢弃的消息也积压到该数量时关闭慢速连接
+DEFAULT_HARD_LIMIT = 4000
+# 队列积压时可以丢弃的消息类型（过程性的状态日志）
+LOW_PRIORITY_TYPES = {"info", "success"}
+# 因积压关闭连接时使用的关闭码（1013: Try Again Later）
+OVERFLOW_CLOSE_CODE = 1013
+# 关闭连接时等待剩余消息发送完成的时间（秒）
+CLOSE_DRAIN_TIMEOUT = 2.0
+
+
+def encode_message(message: Dict[str, Any]) -> str:
+    """使用orjson编码消息"""
+    return orjson.dumps(message, default=str).decode("utf-8")
+
+
+async def deliver(target, message: Dict[str, Any]) -> bool:
+    """
+    向日志目标发送一条消息
+
+    支持 send_message 的目标（OutboundQueue、LogBroadcaster）直接入队，不等待网络；
+    其他目标（如原始WebSocket）退回到 send_text
+
+    Args:
+        target: 日志目标
+        message: 消息字典
+
+    Returns:
+        是否成功交付
+    """
+    send_message = getattr(target, "send_message", None)
+    if send_message is not None:
+        return send_message(message)
+    await target.send_text(json.dumps(message))
+    return True
+
+
+class OutboundQueue:
+    """单个WebSocket连接的有界出站队列（批量发送、积压时丢弃低优先级日志）"""
+
+    def __init__(self, websocket, max_size: int = DEFAULT_QUEUE_SIZE,
+                 flush_interval_ms: float = DEFAULT_FLUSH_INTERVAL_MS, max_batch: int = DEFAULT_MAX_BATCH,
+                 max_batch_bytes: int = DEFAULT_MAX_BATCH_BYTES, hard_limit: int = DEFAULT_HARD_LIMIT):
+        """
+        初始化出站队列
+
+        Args:
+            websocket: 底层WebSocket连接
+            max_size: 队列容量，达到后丢弃低优先级日志
+            flush_interval_ms: 发送间隔（毫秒），期间的消息合并为一批
+            max_batch: 单个批次最多包含的消息数
+            max_batch_bytes: 单个批次的最大字节数
+            hard_limit: 硬上限，任何消息积压到该数量时关闭连接
+        """
+        self.websocket = websocket
+        self.max_size = max_size
+        self.flush_interval = flush_interval_ms / 1000.0
+        self.max_batch = max_batch
+        self.max_batch_bytes = max_batch_bytes
+        self.hard_limit = max(hard_limit, max_size)
+
+        self.closed = False
+        self.overflowed = False
+        self.sent = 0
+        self.frames = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self._queue = deque()
+        self._pending_drops = 0  # 尚未通知客户端的丢弃数量
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._close_task: Optional[asyncio.Task] = None
+
+    def start(self):
+        """启动后台发送任务"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    def send_message(self, message: Union[Dict[str, Any], str]) -> bool:
+        """
+        将消息放入队列（不阻塞）
+
+        Args:
+            message: 消息字典（兼容已编码的JSON字符串）
+
+        Returns:
+            是否已入队（连接已关闭或因积压被丢弃时返回False）
+        """
+        if self.closed:
+            return False
+        if isinstance(message, str):
+            message = json.loads(message)
+
+        message_type = message.get("type")
+
+        # 同一报告流、同一轮次的增量消息在发送前合并，合并后不超过一个报告分块
+        if message_type == "report_delta" and self._queue:
+            last = self._queue[-1]
+            if (last.get("type") == "report_delta" and last.get("stream") == message.get("stream")
+                    and last.get("turn") == message.get("turn")
+                    and len(last["delta"]) + len(message["delta"]) <= REPORT_CHUNK_SIZE):
+                self._queue[-1] = {**last, "delta": last["delta"] + message["delta"]}
+                self.coalesced += 1
+                return True
+
+        # 积压时丢弃低优先级日志；其他消息（警告、错误、结果、完成信号、报告内容）保留到硬上限
+        if len(self._queue) >= self.max_size:
+            if message_type in LOW_PRIORITY_TYPES:
+                self.dropped += 1
+                self._pending_drops += 1
+                return False
+            if len(self._queue) >= self.hard_limit:
+                self._overflow()
+                return False
+
+        self._queue.append(message)
+        self._wakeup.set()
+        return True
+
+    def _overflow(self):
+        """积压达到硬上限：丢弃队列、停止发送任务并关闭底层连接"""
+        print(f"⚠️ 客户端接收过慢，积压 {len(self._queue)} 条消息，关闭连接")
+        self.overflowed = True
+        self.closed = True
+        self.dropped += len(self._queue) + 1
+        self._queue.clear()
+        self._pending_drops = 0
+        self._wakeup.set()
+        if self._task is not None:
+            # 发送任务可能正阻塞在网络写入上，直接取消
+            self._task.cancel()
+        self._close_task = asyncio.ensure_future(self._close_websocket())
+
+    async def _close_websocket(self):
+        """以积压关闭码关闭底层连接（连接可能已断开）"""
+        try:
+            await self.websocket.close(code=OVERFLOW_CLOSE_CODE)
+        except Exception as e:
+            print(f"关闭慢速WebSocket连接失败: {e}")
+
+    async def send_text(self, text: str):
+        """兼容 WebSocket.send_text 接口（同样只入队）"""
+        self.send_message(text)
+
+    def _next_batch(self) -> list:
+        """取出一批待发送的消息（已编码，总字节数不超过上限，至少包含一条消息）"""
+        batch = []
+        size = 0
+        if self._pending_drops:
+            encoded = encode_message({
+                "message": f"⚠️ 网络拥塞，已省略 {self._pending_drops} 条日志",
+                "type": "warning"
+            })
+            batch.append(encoded)
+            size += len(encoded.encode("utf-8"))
+            self._pending_drops = 0
+        while self._queue and len(batch) < self.max_batch:
+            encoded = encode_message(self._queue[0])
+            encoded_size = len(encoded.encode("utf-8"))
+            if batch and size + encoded_size + 1 > self.max_batch_bytes:
+                break
+            self._queue.popleft()
+            batch.append(encoded)
+            size += encoded_size + 1
+        return batch
+
+    async def _run(self):
+        """后台发送循环：等待消息、攒批、编码并发送"""
+        try:
+            while not (self.closed and not self._queue):
+                await self._wakeup.wait()
+                self._wakeup.clear()
+                if not self.closed:
+                    # 等待一个发送间隔，让期间的消息合并为一批
+                    await asyncio.sleep(self.flush_interval)
+
+                while self._queue or self._pending_drops:
+                    batch = self._next_batch()
+                    frame = batch[0] if len(batch) == 1 else "[" + ",".join(batch) + "]"
+                    await self.websocket.send_text(frame)
+                    self.sent += len(batch)
+                    self.frames += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"发送WebSocket消息失败，停止发送: {e}")
+        finally:
+            self.closed = True
+            self._queue.clear()
+
+    async def close(self):
+        """停止接收新消息，尽量发送完剩余消息后结束发送任务"""
+        self.closed = True
+        self._wakeup.set()
+        if self._close_task is not None:
+            await self._close_task
+        if self._task is not None:
+            try:
+                await asyncio.wait_for(self._task, timeout=CLOSE_DRAIN_TIMEOUT)
+            except (asyncio.TimeoutError, asyncio.CancelledError):
+                self._task.cancel()
+            except Exception:
+                pass
+
+    def stats(self) -> Dict[str, Any]:
+        """发送统计"""
+        return {
+            "queued": len(self._queue),
+            "sent": self.sent,
+            "frames": self.frames,
+            "dropped": self.dropped,
+            "coalesced": self.coalesced,
+            "overflowed": self.overflowed
+        }
@@ -0,0 +1,309 @@
+"""
+向量化回测表现指标
+
+基于NumPy一次性计算年化收益、年化波动率、夏普比率、索提诺比率、卡玛比率、
+最大回撤及其持续时间、滚动窗口指标、相对基准的超额收益、跟踪误差、信息比率和阿尔法/贝塔，
+以及换手率和仓位暴露。
+输入可以是一维数组（单条资产曲线），也可以是二维数组（多条资产曲线 × 交易日），
+参数扫描等场景可以一次对成千上万条资产曲线批量打分。
+"""
+
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+from technical_indicators import rolling_std, sma
+
+
+# 每年的交易日数（用于年化）
+TRADING_DAYS_PER_YEAR = 252
+# 默认的年化无风险利率
+DEFAULT_RISK_FREE_RATE = 0.0
+# 滚动指标的默认窗口（交易日）
+DEFAULT_ROLLING_WINDOW = 20
+# 逐期收益率的标准差低于该值时视为没有波动（避免浮点误差使比率趋于无穷）
+ZERO_VOLATILITY = 1e-12
+
+
+def _as_2d(values) -> np.ndarray:
+    """转换为二维浮点数组 (曲线数, 交易日数)"""
+    array = np.asarray(values, dtype=float)
+    return array[np.newaxis, :] if array.ndim == 1 else array
+
+
+def _divide(numerator: np.ndarray, denominator: np.ndarray, fill: float = np.nan) -> np.ndarray:
+    """逐元素相除，分母为0时填充 fill"""
+    numerator, denominator = np.broadcast_arrays(np.asarray(numerator, dtype=float),
+                                                 np.asarray(denominator, dtype=float))
+    return np.divide(numerator, denominator, out=np.full(numerator.shape, fill), where=denominator != 0)
+
+
+def _volatility_or_zero(std: np.ndarray) -> np.ndarray:
+    """浮点误差级别的标准差归零"""
+    return np.where(std < ZERO_VOLATILITY, 0.0, std)
+
+
+def simple_returns(equity: np.ndarray) -> np.ndarray:
+    """逐期收益率 (曲线数, 交易日数 - 1)"""
+    equity = _as_2d(equity)
+    return _divide(np.diff(equity, axis=-1), equity[:, :-1], fill=0.0)
+
+
+def annualized_return(equity: np.ndarray, periods_per_year: float = TRADING_DAYS_PER_YEAR) -> np.ndarray:
+    """年化收益率（按复利折算，期数不足时为NaN）"""
+    equity = _as_2d(equity)
+    periods = equity.shape[-1] - 1
+    if periods < 1:
+        return np.full(len(equity), np.nan)
+    growth = _divide(equity[:, -1], equity[:, 0])
+    with np.errstate(invalid="ignore"):
+        return np.power(growth, periods_per_year / periods) - 1
+
+
+def annualized_volatility(returns: np.ndarray, periods_per_year: float = TRADING_DAYS_PER_YEAR) -> np.ndarray:
+    """年化波动率"""
+    returns = _as_2d(returns)
+    if returns.shape[-1] < 2:
+        return np.zeros(len(returns))
+    return returns.std(axis=-1) * np.sqrt(periods_per_year)
+
+
+def sharpe_ratio(returns: np.ndarray, risk_free_rate: float = DEFAULT_RISK_FREE_RATE,
+                 periods_per_year: float = TRADING_DAYS_PER_YEAR) -> np.ndarray:
+    """年化夏普比率（收益没有波动时为0）"""
+    returns = _as_2d(returns)
+    if returns.shape[-1] < 2:
+        return np.zeros(len(returns))
+    excess = returns - risk_free_rate / periods_per_year
+    std = _volatility_or_zero(returns.std(axis=-1))
+    return _divide(excess.mean(axis=-1), std, fill=0.0) * np.sqrt(periods_per_year)
+
+
+def sortino_ratio(returns: np.ndarray, risk_free_rate: float = DEFAULT_RISK_FREE_RATE,
+                  periods_per_year: float = TRADING_DAYS_PER_YEAR) -> np.ndarray:
+    """年化索提诺比率（只以下行波动衡量风险，没有下行波动时为0）"""
+    returns = _as_2d(returns)
+    if returns.shape[-1] < 2:
+        return np.zeros(len(returns))
+    excess = returns - risk_free_rate / periods_per_year
+    downside = _volatility_or_zero(np.sqrt(np.mean(np.minimum(excess, 0.0) ** 2, axis=-1)))
+    return _divide(excess.mean(axis=-1), downside, fill=0.0) * np.sqrt(periods_per_year)
+
+
+def drawdown_series(equity: np.ndarray) -> np.ndarray:
+    """逐日回撤（相对此前最高点，非正数）"""
+    equity = _as_2d(equity)
+    return _divide(equity, np.maximum.accumulate(equity, axis=-1), fill=1.0) - 1
+
+
+def max_drawdown(equity: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    最大回撤及其持续时间
+
+    Args:
+        equity: 资产曲线
+
+    Returns:
+        max_drawdown（正数表示的最大回撤幅度）、peak_index / trough_index（最大回撤的起点和谷底）、
+        max_duration（最长的水下期，即距上一个最高点的最多交易日数）
+    """
+    equity = _as_2d(equity)
+    drawdown = drawdown_series(equity)
+    trough = np.argmin(drawdown, axis=-1)
+
+    # 每个交易日对应的上一个最高点位置，两者之差即水下持续的交易日数
+    index = np.broadcast_to(np.arange(equity.shape[-1]), equity.shape)
+    last_peak = np.maximum.accumulate(np.where(drawdown >= 0, index, 0), axis=-1)
+    rows = np.arange(len(equity))
+
+    return {
+        "max_drawdown": 0.0 - drawdown[rows, trough],
+        "peak_index": last_peak[rows, trough],
+        "trough_index": trough,
+        "max_duration": (index - last_peak).max(axis=-1)
+    }
+
+
+def calmar_ratio(equity: np.ndarray, periods_per_year: float = TRADING_DAYS_PER_YEAR) -> np.ndarray:
+    """卡玛比率：年化收益 / 最大回撤（没有回撤时为NaN）"""
+    return _divide(annualized_return(equity, periods_per_year), max_drawdown(equity)["max_drawdown"])
+
+
+def alpha_beta(returns: np.ndarray, benchmark_returns: np.ndarray,
+               risk_free_rate: float = DEFAULT_RISK_FREE_RATE,
+               periods_per_year: float = TRADING_DAYS_PER_YEAR) -> Dict[str, np.ndarray]:
+    """
+    相对基准的阿尔法（年化）和贝塔
+
+    Args:
+        returns: 策略逐期收益率
+        benchmark_returns: 同一交易日网格上的基准逐期收益率（一维时对所有曲线共用）
+
+    Returns:
+        alpha、beta
+    """
+    returns = _as_2d(returns)
+    benchmark_returns = _as_2d(benchmark_returns)
+    centered = returns - returns.mean(axis=-1, keepdims=True)
+    benchmark_centered = benchmark_returns - benchmark_returns.mean(axis=-1, keepdims=True)
+    covariance = np.mean(centered * benchmark_centered, axis=-1)
+    beta = _divide(covariance, np.mean(benchmark_centered ** 2, axis=-1))
+
+    risk_free = risk_free_rate / periods_per_year
+    alpha = (returns.mean(axis=-1) - risk_free - beta * (benchmark_returns.mean(axis=-1) - risk_free)) * periods_per_year
+    return {"alpha": alpha, "beta": beta}
+
+
+def relative_metrics(equity: np.ndarray, benchmark: np.ndarray,
+                     risk_free_rate: float = DEFAULT_RISK_FREE_RATE,
+                     periods_per_year: float = TRADING_DAYS_PER_YEAR) -> Dict[str, np.ndarray]:
+    """
+    相对基准的表现
+
+    Args:
+        equity: 资产曲线
+        benchmark: 同一交易日网格上的基准价格或净值曲线（一维时对所有曲线共用）
+
+    Returns:
+        benchmark_return / benchmark_annual_return（基准的总收益和年化收益）、
+        excess_return / annual_excess_return（超额收益）、tracking_error（年化跟踪误差）、
+        information_ratio（信息比率）、alpha、beta
+    """
+    equity, benchmark = _as_2d(equity), _as_2d(benchmark)
+    returns, benchmark_returns = simple_returns(equity), simple_returns(benchmark)
+    # 共用的一维基准按曲线数广播，各项指标都是按曲线排列的数组
+    benchmark_return = np.broadcast_to(_divide(benchmark[:, -1], benchmark[:, 0]) - 1, len(equity))
+    benchmark_annual_return = np.broadcast_to(annualized_return(benchmark, periods_per_year), len(equity))
+
+    # 主动收益：每期相对基准多出的收益
+    active = returns - benchmark_returns
+    tracking_error = active.std(axis=-1) * np.sqrt(periods_per_year) if active.shape[-1] > 1 else np.zeros(len(active))
+
+    return {
+        "benchmark_return": benchmark_return,
+        "benchmark_annual_return": benchmark_annual_return,
+        "excess_return": _divide(equity[:, -1], equity[:, 0]) - 1 - benchmark_return,
+        "annual_excess_return": annualized_return(equity, periods_per_year) - benchmark_annual_return,
+        "tracking_error": tracking_error,
+        "information_ratio": _divide(active.mean(axis=-1) * periods_per_year, tracking_error),
+        **alpha_beta(returns, benchmark_returns, risk_free_rate, periods_per_year)
+    }
+
+
+def rolling_metrics(equity: np.ndarray, window: int = DEFAULT_ROLLING_WINDOW,
+                    risk_free_rate: float = DEFAULT_RISK_FREE_RATE,
+                    periods_per_year: float = TRADING_DAYS_PER_YEAR) -> Dict[str, np.ndarray]:
+    """
+    滚动窗口指标（与资产曲线等长，窗口不足的日期为NaN）
+
+    Args:
+        equity: 资产曲线
+        window: 窗口长度（交易日）
+
+    Returns:
+        rolling_return（窗口收益）、rolling_volatility（年化波动率）、rolling_sharpe（年化夏普比率）、
+        drawdown（逐日回撤）
+    """
+    equity = _as_2d(equity)
+    returns = simple_returns(equity)
+    pad = np.full((len(equity), 1), np.nan)
+
+    # 收益率比资产曲线少一期，前端补一个NaN对齐到资产曲线的日期
+    mean = np.concatenate([pad, sma(returns, window)], axis=-1)
+    std = np.concatenate([pad, rolling_std(returns, window)], axis=-1)
+
+    window_return = np.full(equity.shape, np.nan)
+    if equity.shape[-1] > window:
+        window_return[:, window:] = _divide(equity[:, window:], equity[:, :-window]) - 1
+
+    return {
+        "rolling_return": window_return,
+        "rolling_volatility": std * np.sqrt(periods_per_year),
+        "rolling_sharpe": _divide(mean - risk_free_rate / periods_per_year, std, fill=0.0) * np.sqrt(periods_per_year),
+        "drawdown": drawdown_series(equity)
+    }
+
+
+def turnover(trade_amounts: np.ndarray, equity: np.ndarray,
+             periods_per_year: float = TRADING_DAYS_PER_YEAR) -> np.ndarray:
+    """
+    年化换手率：(买入金额 + 卖出金额) / 2 / 平均资产，按年折算
+
+    Args:
+        trade_amounts: 每个交易日的成交金额（与资产曲线同形状）
+        equity: 资产曲线
+    """
+    trade_amounts, equity = _as_2d(trade_amounts), _as_2d(equity)
+    years = equity.shape[-1] / periods_per_year
+    return _divide(trade_amounts.sum(axis=-1) / 2, equity.mean(axis=-1), fill=0.0) / years
+
+
+def exposure(stock_value: np.ndarray, equity: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    仓位暴露
+
+    Args:
+        stock_value: 每个交易日的持仓市值（与资产曲线同形状）
+        equity: 资产曲线
+
+    Returns:
+        avg_exposure（持仓市值占总资产的平均比例）、time_in_market（有持仓的交易日占比）
+    """
+    stock_value, equity = _as_2d(stock_value), _as_2d(equity)
+    return {
+        "avg_exposure": _divide(stock_value, equity, fill=0.0).mean(axis=-1),
+        "time_in_market": np.mean(stock_value > 0, axis=-1)
+    }
+
+
+def compute_metrics(equity, trade_amounts=None, stock_value=None, benchmark=None,
+                    risk_free_rate: float = DEFAULT_RISK_FREE_RATE,
+                    periods_per_year: float = TRADING_DAYS_PER_YEAR) -> Dict[str, Any]:
+    """
+    批量计算全部汇总指标
+
+    Args:
+        equity: 资产曲线，一维 (交易日数) 或二维 (曲线数, 交易日数)
+        trade_amounts: 每个交易日的成交金额，提供时计算换手率
+        stock_value: 每个交易日的持仓市值，提供时计算仓位暴露
+        benchmark: 同一交易日网格上的基准价格或净值曲线，提供时计算超额收益、跟踪误差、信息比率和阿尔法/贝塔
+        risk_free_rate: 年化无风险利率
+        periods_per_year: 每年的期数（逐日资产曲线为交易日数）
+
+    Returns:
+        指标字典；一维输入时每项为 float（无法计算时为None，便于JSON序列化），
+        二维输入时每项为按曲线排列的数组（无法计算时为NaN）
+    """
+    single = np.ndim(equity) == 1
+    equity = _as_2d(equity)
+    returns = simple_returns(equity)
+    drawdown = max_drawdown(equity)
+    annual_return = annualized_return(equity, periods_per_year)
+
+    metrics = {
+        "total_return": _divide(equity[:, -1], equity[:, 0]) - 1,
+        "annual_return": annual_return,
+        "volatility": annualized_volatility(returns, periods_per_year),
+        "sharpe_ratio": sharpe_ratio(returns, risk_free_rate, periods_per_year),
+        "sortino_ratio": sortino_ratio(returns, risk_free_rate, periods_per_year),
+        "max_drawdown": drawdown["max_drawdown"],
+        "max_drawdown_duration": drawdown["max_duration"],
+        "calmar_ratio": _divide(annual_return, drawdown["max_drawdown"])
+    }
+
+    if trade_amounts is not None:
+        metrics["turnover"] = turnover(trade_amounts, equity, periods_per_year)
+    if stock_value is not None:
+        metrics.update(exposure(stock_value, equity))
+    if benchmark is not None:
+        metrics.update(relative_metrics(equity, benchmark, risk_free_rate, periods_per_year))
+
+    if single:
+        return {name: to_scalar(values[0]) for name, values in metrics.items()}
+    return metrics
+
+
+def to_scalar(value) -> Optional[float]:
+    """转换为Python数值，NaN和无穷大转换为None"""
+    value = float(value)
+    return value if np.isfinite(value) else None
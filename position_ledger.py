@@ -0,0 +1,119 @@
+"""
+持仓账本
+
+按股票增量维护持仓数量、持仓成本（平均成本法）、已实现盈亏和交易次数，
+每笔交易只做常数次更新，查询持仓状态时无需回扫交易记录
+"""
+
+from typing import Any, Dict
+
+
+# 持仓数量小于该值时视为已清仓（允许小数股，避免浮点残留）
+EMPTY_POSITION_EPSILON = 1e-9
+
+
+class Position:
+    """单只股票的持仓"""
+
+    def __init__(self):
+        self.shares = 0.0  # 持仓数量
+        self.cost_basis = 0.0  # 当前持仓的总成本
+        self.realized_pnl = 0.0  # 已实现盈亏
+        self.buy_count = 0  # 买入次数
+        self.sell_count = 0  # 卖出次数
+        self.buy_amount = 0.0  # 累计买入金额
+        self.sell_amount = 0.0  # 累计卖出金额
+
+    @property
+    def avg_cost(self) -> float:
+        """平均持仓成本"""
+        return self.cost_basis / self.shares if self.shares > 0 else 0.0
+
+    def buy(self, shares: float, amount: float):
+        """
+        记录买入
+
+        Args:
+            shares: 买入数量
+            amount: 买入金额
+        """
+        self.shares += shares
+        self.cost_basis += amount
+        self.buy_count += 1
+        self.buy_amount += amount
+
+    def sell(self, shares: float, amount: float) -> float:
+        """
+        记录卖出，按平均成本结转成本
+
+        Args:
+            shares: 卖出数量
+            amount: 卖出金额
+
+        Returns:
+            本次卖出的已实现盈亏
+        """
+        shares = min(shares, self.shares)
+        cost = self.avg_cost * shares
+        pnl = amount - cost
+
+        self.shares -= shares
+        self.cost_basis -= cost
+        if self.shares < EMPTY_POSITION_EPSILON:
+            self.shares = 0.0
+            self.cost_basis = 0.0
+
+        self.realized_pnl += pnl
+        self.sell_count += 1
+        self.sell_amount += amount
+        return pnl
+
+    def to_dict(self) -> Dict[str, Any]:
+        """持仓信息"""
+        return {
+            "shares": self.shares,
+            "avg_cost": self.avg_cost,
+            "cost_basis": self.cost_basis,
+            "realized_pnl": self.realized_pnl,
+            "buy_count": self.buy_count,
+            "sell_count": self.sell_count,
+            "buy_amount": self.buy_amount,
+            "sell_amount": self.sell_amount
+        }
+
+
+class PositionLedger:
+    """按股票维护的持仓账本"""
+
+    def __init__(self):
+        self.positions: Dict[str, Position] = {}
+        self.trade_count = 0
+
+    def get(self, stock_code: str) -> Position:
+        """获取股票持仓（未交易过时返回空持仓）"""
+        position = self.positions.get(stock_code)
+        if position is None:
+            position = self.positions[stock_code] = Position()
+        return position
+
+    def record(self, transaction: Dict[str, Any]) -> float:
+        """
+        记录一笔交易
+
+        Args:
+            transaction: 交易记录（stock_code、action、shares、amount）
+
+        Returns:
+            本次交易的已实现盈亏（买入为0）
+        """
+        position = self.get(transaction['stock_code'])
+        self.trade_count += 1
+        if transaction['action'] == 'BUY':
+            position.buy(transaction['shares'], transaction['amount'])
+            return 0.0
+        return position.sell(transaction['shares'], transaction['amount'])
+
+    @property
+    def realized_pnl(self) -> float:
+        """全部股票的已实现盈亏"""
+        return sum(position.realized_pnl for position in self.positions.values())
@@ -0,0 +1,144 @@
+"""
+分析报告缓存
+
+按 (股票代码, 交易日期) 缓存已完成的分析报告及其完整的日志事件序列，
+内存中按最近使用保留有限条目，同时持久化到SQLite，服务重启后仍可命中
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+
+# 默认的缓存数据库路径
+DEFAULT_REPORT_CACHE_PATH = os.path.join("data", "report_cache.sqlite")
+# 默认报告有效期（秒）
+DEFAULT_REPORT_TTL = 3600
+# 默认内存中保留的报告数量
+DEFAULT_MEMORY_ENTRIES = 128
+
+
+class ReportCache:
+    """分析报告缓存（内存LRU + SQLite持久化，带TTL）"""
+
+    def __init__(self, db_path: str = DEFAULT_REPORT_CACHE_PATH, ttl: float = DEFAULT_REPORT_TTL,
+                 memory_entries: int = DEFAULT_MEMORY_ENTRIES):
+        """
+        初始化缓存
+
+        Args:
+            db_path: SQLite数据库文件路径
+            ttl: 报告有效期（秒）
+            memory_entries: 内存中最多保留的报告数量
+        """
+        self.db_path = db_path
+        self.ttl = ttl
+        self.memory_entries = memory_entries
+
+        self.hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()  # (股票代码, 日期) -> 报告条目
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS reports (
+                    stock_code TEXT NOT NULL,
+                    trade_date TEXT NOT NULL,
+                    company_name TEXT,
+                    report TEXT NOT NULL,
+                    events TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    PRIMARY KEY (stock_code, trade_date)
+                )
+            """)
+
+    def _connect(self) -> sqlite3.Connection:
+        """创建数据库连接（每次操作独立连接，保证线程安全）"""
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def _remember(self, key, entry: Dict[str, Any]):
+        """写入内存LRU"""
+        with self._lock:
+            self._memory[key] = entry
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_entries:
+                self._memory.popitem(last=False)
+
+    def get(self, stock_code: str, trade_date: str) -> Optional[Dict[str, Any]]:
+        """
+        读取未过期的报告
+
+        Args:
+            stock_code: 股票代码
+            trade_date: 交易日期
+
+        Returns:
+            {company_name, report, events, created_at}，不存在或已过期时返回None
+        """
+        key = (stock_code, trade_date)
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+
+        if entry is None:
+            with self._connect() as conn:
+                row = conn.execute(
+                    "SELECT company_name, report, events, created_at FROM reports WHERE stock_code=? AND trade_date=?",
+                    key
+                ).fetchone()
+            if row:
+                entry = {"company_name": row[0], "report": row[1], "events": json.loads(row[2]), "created_at": row[3]}
+                self._remember(key, entry)
+
+        if entry is None or time.time() - entry["created_at"] > self.ttl:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+        return entry
+
+    def put(self, stock_code: str, trade_date: str, company_name: str, report: str, events: List[Dict[str, Any]]):
+        """
+        保存报告及其日志事件
+
+        Args:
+            stock_code: 股票代码
+            trade_date: 交易日期
+            company_name: 公司名称
+            report: 最终报告文本
+            events: 按顺序排列的日志消息（发送给前端的消息字典）
+        """
+        entry = {"company_name": company_name, "report": report, "events": list(events), "created_at": time.time()}
+        self._remember((stock_code, trade_date), entry)
+
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO reports (stock_code, trade_date, company_name, report, events, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (stock_code, trade_date, company_name, report,
+                 json.dumps(entry["events"], ensure_ascii=False), entry["created_at"])
+            )
+            conn.execute("DELETE FROM reports WHERE created_at < ?", (entry["created_at"] - self.ttl,))
+
+    def stats(self) -> Dict[str, Any]:
+        """缓存统计信息"""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "memory_entries": len(self._memory),
+            "ttl": self.ttl
+        }
@@ -0,0 +1,122 @@
+"""
+报告增量推送
+
+将模型流式输出的文本按固定时间间隔合并为 report_delta 消息发送给前端，
+使长时间运行的分析在几秒内就能看到内容，同时避免在结束时发送单个巨大的消息
+"""
+
+import asyncio
+import datetime
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+
+# 增量消息的合并间隔（毫秒）
+REPORT_DELTA_INTERVAL_MS = 100
+# 一次性推送已完成文本时每条消息的最大字符数
+REPORT_CHUNK_SIZE = 4096
+
+
+class ReportDeltaStreamer:
+    """
+    报告增量推送器
+
+    每个流（如某个agent的分析结果）按推理轮次编号，前端为每一轮显示一个不断增长的文本块，
+    最后一轮即最终结果。消息格式:
+    - {"type": "report_delta", "stream", "section", "title", "turn", "delta", "timestamp"}
+    - {"type": "report_end", "stream", "section", "title", "turn", "length", "timestamp"}
+    """
+
+    def __init__(self, send: Callable[[Dict[str, Any]], Awaitable[None]], stream: str, title: str,
+                 section: Optional[str] = None, interval_ms: float = REPORT_DELTA_INTERVAL_MS):
+        """
+        初始化推送器
+
+        Args:
+            send: 发送消息字典的协程函数
+            stream: 流标识（同一次分析中唯一）
+            title: 显示给用户的标题
+            section: 结果所属的状态键（默认与stream相同）
+            interval_ms: 合并间隔（毫秒）
+        """
+        self.send = send
+        self.stream = stream
+        self.title = title
+        self.section = section or stream
+        self.interval = interval_ms / 1000.0
+
+        self.turn = 0
+        self.turn_text = ""  # 当前轮次已推送（含缓冲）的文本
+        self._buffer = ""
+        self._last_flush = time.monotonic()
+        self._timer: Optional[asyncio.TimerHandle] = None  # 合并间隔到期时发送缓冲的定时器
+        self._timer_flush: Optional[asyncio.Task] = None  # 定时器启动的发送任务
+
+    def _message(self, message_type: str, **fields) -> Dict[str, Any]:
+        """构建消息字典"""
+        return {
+            "type": message_type,
+            "stream": self.stream,
+            "section": self.section,
+            "title": self.title,
+            "turn": self.turn,
+            **fields,
+            "timestamp": datetime.datetime.now().strftime("%H:%M:%S")
+        }
+
+    async def start_turn(self):
+        """开始新的推理轮次（先推送上一轮剩余的缓冲）"""
+        await self.flush()
+        self.turn += 1
+        self.turn_text = ""
+
+    async def push(self, text: str):
+        """追加文本，距上次发送超过合并间隔时立即发送，否则在间隔到期时由定时器发送"""
+        if not text:
+            return
+        if self.turn == 0:
+            self.turn = 1
+        self._buffer += text
+        self.turn_text += text
+        elapsed = time.monotonic() - self._last_flush
+        if elapsed >= self.interval:
+            await self.flush()
+        elif self._timer is None:
+            # 模型停顿或中途失败（没有后续 push 或 end）时，缓冲的文本也会在间隔到期后发出
+            self._timer = asyncio.get_running_loop().call_later(self.interval - elapsed, self._flush_on_timer)
+
+    def _flush_on_timer(self):
+        """定时器回调：发送仍在缓冲中的文本"""
+        self._timer = None
+        if self._buffer:
+            self._timer_flush = asyncio.ensure_future(self.flush())
+
+    async def flush(self):
+        """发送缓冲中的文本"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._buffer:
+            delta, self._buffer = self._buffer, ""
+            await self.send(self._message("report_delta", delta=delta))
+        self._last_flush = time.monotonic()
+
+    async def send_text(self, text: str):
+        """作为新的一轮分块推送一段已完成的文本"""
+        await self.start_turn()
+        for start in range(0, len(text), REPORT_CHUNK_SIZE):
+            self._buffer = text[start:start + REPORT_CHUNK_SIZE]
+            self.turn_text += self._buffer
+            await self.flush()
+
+    async def end(self, final_text: Optional[str] = None):
+        """
+        结束推送
+
+        Args:
+            final_text: 最终结果；与最后一轮推送的文本不一致时（如命中LLM缓存没有流式输出）补发完整结果
+        """
+        await self.flush()
+        if final_text is not None and self.turn_text.strip() != final_text.strip():
+            await self.send_text(final_text)
+        await self.send(self._message("report_end", length=len(self.turn_text)))
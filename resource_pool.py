@@ -0,0 +1,184 @@
+"""
+进程级共享资源池
+
+在应用启动时建立一组常驻的MCP会话并创建共享的LLM客户端，
+各WebSocket连接的工作流直接借用，无需每次连接都重新发现工具和初始化模型
+"""
+
+import asyncio
+import os
+import time
+from contextlib import AsyncExitStack
+from typing import List, Optional, Tuple
+
+from langchain_core.tools import BaseTool
+from langchain_google_genai import ChatGoogleGenerativeAI
+from langchain_mcp_adapters.client import MultiServerMCPClient
+from langchain_mcp_adapters.tools import load_mcp_tools
+
+from tool_cache import ToolResultCache
+
+
+# MCP服务器名称和连接配置
+MCP_SERVER_NAME = "a_share_data_provider"
+MCP_CONNECTIONS = {
+    MCP_SERVER_NAME: {
+        "url": "http://localhost:3000/mcp/",
+        "transport": "streamable_http"
+    }
+}
+# 默认常驻的MCP会话数量
+DEFAULT_SESSION_COUNT = 4
+# 建立会话池的超时时间（秒）
+POOL_START_TIMEOUT = 30.0
+# 启动失败后再次尝试的最小间隔（秒）
+POOL_RETRY_INTERVAL = 60.0
+
+
+def create_llm(llm_cache=None) -> ChatGoogleGenerativeAI:
+    """
+    创建Gemini模型客户端
+
+    Args:
+        llm_cache: 可选的LLM响应缓存，为None时不使用缓存
+
+    Returns:
+        ChatGoogleGenerativeAI 实例
+    """
+    if not os.getenv("GOOGLE_API_KEY"):
+        raise Exception("GOOGLE_API_KEY 未设置")
+
+    return ChatGoogleGenerativeAI(
+        model=os.getenv("GEMINI_MODEL", "gemini-2.0-flash"),
+        timeout=60,  # 设置模型调用超时
+        max_retries=2,  # 设置模型重试次数
+        temperature=0.1,  # 降低随机性
+        cache=llm_cache
+    )
+
+
+class AgentResourcePool:
+    """共享的MCP会话池、LLM客户端和工具结果缓存"""
+
+    def __init__(self, session_count: int = DEFAULT_SESSION_COUNT,
+                 tool_cache: Optional[ToolResultCache] = None, llm_cache=None):
+        """
+        初始化资源池（不会立即连接，需调用 start）
+
+        Args:
+            session_count: 常驻的MCP会话数量
+            tool_cache: 所有会话共享的工具结果缓存
+            llm_cache: 共享LLM客户端使用的响应缓存
+        """
+        self.session_count = session_count
+        self.tool_cache = tool_cache or ToolResultCache()
+        self.llm_cache = llm_cache
+        self.client = MultiServerMCPClient(MCP_CONNECTIONS)
+
+        self.llm = None
+        self.generation = 0  # 每次成功建立会话池时递增，工作流据此判断借用的资源是否仍然有效
+        self._tool_sets: List[List[BaseTool]] = []
+        self._next = 0
+        self._task: Optional[asyncio.Task] = None
+        self._stop: Optional[asyncio.Event] = None
+        self._start_lock = asyncio.Lock()
+        self._last_failure = 0.0
+
+    @property
+    def ready(self) -> bool:
+        """会话池和模型是否可用"""
+        return bool(self._tool_sets) and self.llm is not None
+
+    async def _hold_sessions(self, ready: asyncio.Future):
+        """
+        在独立任务中持有全部MCP会话，直到收到停止信号
+
+        会话的进入和退出必须在同一个任务中完成，因此不在调用方的任务中直接打开
+        """
+        try:
+            async with AsyncExitStack() as stack:
+                tool_sets = []
+                for _ in range(self.session_count):
+                    session = await stack.enter_async_context(self.client.session(MCP_SERVER_NAME))
+                    tools = await load_mcp_tools(session)
+                    tool_sets.append(self.tool_cache.wrap_tools(tools))
+
+                self._tool_sets = tool_sets
+                ready.set_result(True)
+                await self._stop.wait()
+        except Exception as e:
+            if not ready.done():
+                ready.set_exception(e)
+            else:
+                print(f"⚠️ MCP会话池异常退出: {e}")
+        finally:
+            self._tool_sets = []
+
+    async def start(self) -> bool:
+        """
+        建立会话池和共享模型（已就绪时直接返回）
+
+        Returns:
+            是否可用
+        """
+        async with self._start_lock:
+            if self.ready:
+                return True
+            if time.time() - self._last_failure < POOL_RETRY_INTERVAL:
+                return False
+
+            try:
+                if self.llm is None:
+                    self.llm = create_llm(self.llm_cache)
+
+                ready = asyncio.get_running_loop().create_future()
+                self._stop = asyncio.Event()
+                self._task = asyncio.create_task(self._hold_sessions(ready))
+                await asyncio.wait_for(ready, timeout=POOL_START_TIMEOUT)
+
+                self.generation += 1
+                self._next = 0
+                tool_count = len(self._tool_sets[0])
+                print(f"✅ 共享资源池已就绪: {self.session_count} 个MCP会话，可用工具数量: {tool_count}")
+                return True
+
+            except Exception as e:
+                self._last_failure = time.time()
+                if self._task is not None:
+                    self._task.cancel()
+                print(f"⚠️ 共享资源池启动失败: {e or type(e).__name__}")
+                return False
+
+    def acquire(self) -> Tuple[ChatGoogleGenerativeAI, List[BaseTool]]:
+        """
+        借用共享的模型和一组工具（轮询分配到各个会话，会话支持并发请求）
+
+        Returns:
+            (llm, tools)
+        """
+        if not self.ready:
+            raise RuntimeError("共享资源池未就绪")
+
+        tools = self._tool_sets[self._next % len(self._tool_sets)]
+        self._next += 1
+        return self.llm, tools
+
+    async def close(self):
+        """关闭全部MCP会话"""
+        if self._stop is not None:
+            self._stop.set()
+        if self._task is not None:
+            try:
+                await asyncio.wait_for(self._task, timeout=10.0)
+            except Exception:
+                self._task.cancel()
+        self._task = None
+
+    def status(self) -> dict:
+        """资源池状态（用于健康检查）"""
+        return {
+            "ready": self.ready,
+            "sessions": len(self._tool_sets),
+            "generation": self.generation,
+            "tool_cache": self.tool_cache.stats()
+        }
@@ -0,0 +1,307 @@
+"""
+向量化技术指标计算
+
+基于NumPy一次性计算均线、MACD、RSI、KDJ、布林带、支撑阻力位和量比。
+输入可以是一维数组（单只股票），也可以是二维数组（多只股票 × 交易日），
+回测时对整个区间批量计算一次，之后每个决策日只需按索引取值。
+"""
+
+import re
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+# 均线周期
+MA_PERIODS = (5, 10, 20, 60)
+# RSI周期
+RSI_PERIODS = (6, 12, 24)
+# MACD参数 (快线, 慢线, 信号线)
+MACD_PARAMS = (12, 26, 9)
+# KDJ参数 (RSV周期, K平滑, D平滑)
+KDJ_PARAMS = (9, 3, 3)
+# 布林带参数 (周期, 标准差倍数)
+BOLL_PARAMS = (20, 2.0)
+# 支撑阻力位的回看周期
+SUPPORT_RESISTANCE_PERIODS = (20, 60)
+# 量比的回看周期
+VOLUME_RATIO_PERIOD = 5
+
+
+def _as_2d(values) -> np.ndarray:
+    """转换为二维浮点数组 (序列数, 交易日数)"""
+    array = np.asarray(values, dtype=float)
+    return array[np.newaxis, :] if array.ndim == 1 else array
+
+
+def _pad_front(values: np.ndarray, window: int) -> np.ndarray:
+    """在时间轴前端补NaN，使滚动窗口结果与输入等长"""
+    pad = np.full(values.shape[:-1] + (window - 1,), np.nan)
+    return np.concatenate([pad, values], axis=-1)
+
+
+def sma(values: np.ndarray, window: int) -> np.ndarray:
+    """简单移动平均（基于累积和，窗口不足时为NaN）"""
+    values = _as_2d(values)
+    if values.shape[-1] < window:
+        return np.full(values.shape, np.nan)
+    cumsum = np.cumsum(np.insert(values, 0, 0.0, axis=-1), axis=-1)
+    return _pad_front((cumsum[:, window:] - cumsum[:, :-window]) / window, window)
+
+
+def rolling_std(values: np.ndarray, window: int) -> np.ndarray:
+    """滚动总体标准差（窗口不足时为NaN）"""
+    values = _as_2d(values)
+    if values.shape[-1] < window:
+        return np.full(values.shape, np.nan)
+    return _pad_front(sliding_window_view(values, window, axis=-1).std(axis=-1), window)
+
+
+def rolling_max(values: np.ndarray, window: int) -> np.ndarray:
+    """滚动最大值（窗口不足时为NaN）"""
+    values = _as_2d(values)
+    if values.shape[-1] < window:
+        return np.full(values.shape, np.nan)
+    return _pad_front(sliding_window_view(values, window, axis=-1).max(axis=-1), window)
+
+
+def rolling_min(values: np.ndarray, window: int) -> np.ndarray:
+    """滚动最小值（窗口不足时为NaN）"""
+    values = _as_2d(values)
+    if values.shape[-1] < window:
+        return np.full(values.shape, np.nan)
+    return _pad_front(sliding_window_view(values, window, axis=-1).min(axis=-1), window)
+
+
+def ema(values: np.ndarray, alpha: float, initial: Optional[float] = None) -> np.ndarray:
+    """
+    指数移动平均 y[t] = alpha * x[t] + (1 - alpha) * y[t-1]
+
+    递推部分交给 pandas 的 ewm（C实现），沿时间轴对所有序列同时计算
+
+    Args:
+        values: 输入数组
+        alpha: 平滑系数
+        initial: 初始值，为None时以第一个观测值作为初始值
+    """
+    values = _as_2d(values)
+    if initial is not None:
+        values = np.concatenate([np.full(values.shape[:-1] + (1,), initial), values], axis=-1)
+    result = pd.DataFrame(values.T).ewm(alpha=alpha, adjust=False).mean().to_numpy().T
+    return result[:, 1:] if initial is not None else result
+
+
+def compute_indicators(close, high=None, low=None, volume=None) -> Dict[str, np.ndarray]:
+    """
+    一次性计算全部技术指标
+
+    Args:
+        close: 收盘价，形状 (交易日数,) 或 (序列数, 交易日数)
+        high: 最高价（缺省时使用收盘价）
+        low: 最低价（缺省时使用收盘价）
+        volume: 成交量（缺省时不计算量能指标）
+
+    Returns:
+        指标名 -> 二维数组 (序列数, 交易日数)
+    """
+    close = _as_2d(close)
+    high = close if high is None else _as_2d(high)
+    low = close if low is None else _as_2d(low)
+
+    indicators = {"close": close, "high": high, "low": low}
+
+    # 移动平均线
+    for period in MA_PERIODS:
+        indicators[f"ma{period}"] = sma(close, period)
+
+    # MACD（国内惯例：柱状线为 2 × (DIF - DEA)）
+    fast, slow, signal = MACD_PARAMS
+    dif = ema(close, 2.0 / (fast + 1)) - ema(close, 2.0 / (slow + 1))
+    dea = ema(dif, 2.0 / (signal + 1))
+    indicators.update({"macd_dif": dif, "macd_dea": dea, "macd_hist": 2.0 * (dif - dea)})
+
+    # RSI（Wilder平滑）
+    change = np.diff(close, axis=-1, prepend=close[:, :1])
+    gain = np.clip(change, 0, None)
+    loss = np.clip(-change, 0, None)
+    for period in RSI_PERIODS:
+        avg_gain = ema(gain, 1.0 / period)
+        avg_loss = ema(loss, 1.0 / period)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rsi = np.where(avg_loss == 0, 100.0, 100.0 - 100.0 / (1.0 + avg_gain / avg_loss))
+        rsi[:, :period] = np.nan
+        indicators[f"rsi{period}"] = rsi
+
+    # KDJ（K、D初始值为50）
+    rsv_period, k_smooth, d_smooth = KDJ_PARAMS
+    lowest = rolling_min(low, rsv_period)
+    highest = rolling_max(high, rsv_period)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rsv = np.where(highest > lowest, (close - lowest) / (highest - lowest) * 100.0, 50.0)
+    rsv = np.where(np.isnan(lowest), 50.0, rsv)
+    k = ema(rsv, 1.0 / k_smooth, initial=50.0)
+    d = ema(k, 1.0 / d_smooth, initial=50.0)
+    indicators.update({"kdj_k": k, "kdj_d": d, "kdj_j": 3.0 * k - 2.0 * d})
+
+    # 布林带
+    boll_period, boll_width = BOLL_PARAMS
+    mid = sma(close, boll_period)
+    std = rolling_std(close, boll_period)
+    indicators.update({"boll_mid": mid, "boll_upper": mid + boll_width * std, "boll_lower": mid - boll_width * std})
+
+    # 支撑位和阻力位
+    for period in SUPPORT_RESISTANCE_PERIODS:
+        indicators[f"support{period}"] = rolling_min(low, period)
+        indicators[f"resistance{period}"] = rolling_max(high, period)
+
+    # 枢轴点（基于当日最高、最低、收盘）
+    pivot = (high + low + close) / 3.0
+    indicators.update({"pivot": pivot, "pivot_s1": 2.0 * pivot - high, "pivot_r1": 2.0 * pivot - low})
+
+    # 量能指标
+    if volume is not None:
+        volume = _as_2d(volume)
+        volume_ma = sma(volume, VOLUME_RATIO_PERIOD)
+        # 量比：当日成交量 / 前N日平均成交量
+        previous_ma = np.concatenate([np.full((volume.shape[0], 1), np.nan), volume_ma[:, :-1]], axis=-1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            indicators["volume_ratio"] = np.where(previous_ma > 0, volume / previous_ma, np.nan)
+        indicators[f"volume_ma{VOLUME_RATIO_PERIOD}"] = volume_ma
+
+    return indicators
+
+
+def _value(array: np.ndarray, series: int, index: int) -> Optional[float]:
+    """取单个数值，NaN返回None"""
+    value = float(array[series, index])
+    return None if np.isnan(value) else round(value, 4)
+
+
+def summarize(indicators: Dict[str, np.ndarray], index: int = -1, series: int = 0) -> Dict[str, Any]:
+    """
+    提取某个交易日的指标数值和信号
+
+    Args:
+        indicators: compute_indicators 的结果
+        index: 交易日索引
+        series: 序列索引（二维输入时）
+
+    Returns:
+        指标摘要字典
+    """
+    length = indicators["close"].shape[-1]
+    index = index % length
+    summary = {name: _value(array, series, index) for name, array in indicators.items() if name not in ("high", "low")}
+
+    signals = []
+    close = summary["close"]
+
+    mas = [summary.get(f"ma{period}") for period in MA_PERIODS]
+    if all(value is not None for value in mas):
+        if all(a > b for a, b in zip(mas, mas[1:])):
+            signals.append("均线多头排列")
+        elif all(a < b for a, b in zip(mas, mas[1:])):
+            signals.append("均线空头排列")
+
+    if index > 0:
+        dif_prev, dea_prev = indicators["macd_dif"][series, index - 1], indicators["macd_dea"][series, index - 1]
+        if summary["macd_dif"] is not None and summary["macd_dea"] is not None:
+            if dif_prev <= dea_prev and summary["macd_dif"] > summary["macd_dea"]:
+                signals.append("MACD金叉")
+            elif dif_prev >= dea_prev and summary["macd_dif"] < summary["macd_dea"]:
+                signals.append("MACD死叉")
+
+        k_prev, d_prev = indicators["kdj_k"][series, index - 1], indicators["kdj_d"][series, index - 1]
+        if k_prev <= d_prev and summary["kdj_k"] > summary["kdj_d"]:
+            signals.append("KDJ金叉")
+        elif k_prev >= d_prev and summary["kdj_k"] < summary["kdj_d"]:
+            signals.append("KDJ死叉")
+
+    rsi = summary.get(f"rsi{RSI_PERIODS[0]}")
+    if rsi is not None:
+        if rsi > 80:
+            signals.append(f"RSI{RSI_PERIODS[0]}超买")
+        elif rsi < 20:
+            signals.append(f"RSI{RSI_PERIODS[0]}超卖")
+
+    if summary["boll_upper"] is not None and close is not None:
+        if close > summary["boll_upper"]:
+            signals.append("价格突破布林上轨")
+        elif close < summary["boll_lower"]:
+            signals.append("价格跌破布林下轨")
+
+    summary["signals"] = signals
+    return summary
+
+
+def format_summary(summary: Dict[str, Any], as_of: str = "") -> str:
+    """
+    将指标摘要格式化为紧凑的提示词文本
+
+    Args:
+        summary: summarize 的结果
+        as_of: 数据日期
+
+    Returns:
+        提示词文本
+    """
+    def fmt(name: str) -> str:
+        value = summary.get(name)
+        return "N/A" if value is None else f"{value:.2f}"
+
+    lines = [
+        f"数据截至: {as_of}" if as_of else None,
+        f"收盘价: {fmt('close')}",
+        "均线: " + ", ".join(f"MA{period}={fmt(f'ma{period}')}" for period in MA_PERIODS),
+        f"MACD: DIF={fmt('macd_dif')}, DEA={fmt('macd_dea')}, 柱={fmt('macd_hist')}",
+        "RSI: " + ", ".join(f"RSI{period}={fmt(f'rsi{period}')}" for period in RSI_PERIODS),
+        f"KDJ: K={fmt('kdj_k')}, D={fmt('kdj_d')}, J={fmt('kdj_j')}",
+        f"布林带: 上轨={fmt('boll_upper')}, 中轨={fmt('boll_mid')}, 下轨={fmt('boll_lower')}",
+        "支撑/阻力: " + ", ".join(
+            f"{period}日 {fmt(f'support{period}')}/{fmt(f'resistance{period}')}" for period in SUPPORT_RESISTANCE_PERIODS
+        ) + f", 枢轴点 S1={fmt('pivot_s1')} P={fmt('pivot')} R1={fmt('pivot_r1')}",
+    ]
+    if "volume_ratio" in summary:
+        lines.append(f"量能: 量比={fmt('volume_ratio')}, {VOLUME_RATIO_PERIOD}日均量={fmt(f'volume_ma{VOLUME_RATIO_PERIOD}')}")
+    lines.append("信号: " + ("、".join(summary.get("signals") or []) or "无明显信号"))
+
+    return "\n".join(line for line in lines if line)
+
+
+def parse_kline_markdown(text: str) -> Optional[Dict[str, np.ndarray]]:
+    """
+    解析MCP工具返回的Markdown K线表格
+
+    Args:
+        text: 包含 date/open/high/low/close/volume 列的Markdown表格
+
+    Returns:
+        列名 -> 数组（含 dates 列），无法解析时返回None
+    """
+    rows: List[List[str]] = []
+    header: Optional[List[str]] = None
+    for line in str(text).splitlines():
+        line = line.strip()
+        if not line.startswith("|"):
+            continue
+        cells = [cell.strip() for cell in line.strip("|").split("|")]
+        if all(re.fullmatch(r":?-+:?", cell) for cell in cells if cell):
+            continue
+        if header is None:
+            header = [cell.lower() for cell in cells]
+        else:
+            rows.append(cells)
+
+    if not header or not rows or "close" not in header or "date" not in header:
+        return None
+
+    df = pd.DataFrame([row[:len(header)] for row in rows if len(row) >= len(header)], columns=header)
+    columns = {"dates": df["date"].to_numpy()}
+    for name in ("open", "high", "low", "close", "volume"):
+        if name in df:
+            columns[name] = pd.to_numeric(df[name], errors='coerce').to_numpy(dtype=float)
+
+    valid = ~np.isnan(columns["close"])
+    return {name: values[valid] for name, values in columns.items()}
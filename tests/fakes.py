@@ -0,0 +1,56 @@
+"""
+测试用的假模型
+
+按预设顺序返回消息并统计调用次数，用于验证每个推理步骤只调用一次模型
+"""
+
+from typing import Any, List, Optional
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+
+class CountingChatModel(BaseChatModel):
+    """依次返回 responses 中的消息并统计调用次数的假模型"""
+
+    responses: List[AIMessage]
+    calls: int = 0
+    model: str = "counting-fake"
+    temperature: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "counting-fake"
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        response = self.responses[min(self.calls, len(self.responses) - 1)]
+        self.calls += 1
+        return ChatResult(generations=[ChatGeneration(message=response)])
+
+    def bind_tools(self, tools: Any, **kwargs: Any) -> "CountingChatModel":
+        """工具调用由预设的消息决定，绑定工具时返回自身"""
+        return self
+
+
+# 投资决策Agent可以解析的决策JSON（专业分析Agent也会得到同样的文本，不影响流程）
+DECISION_JSON = '{"action": "BUY", "confidence": 0.8, "position_size": 0.5, "reasons": ["测试决策"]}'
+
+
+def seed_bars(store, code: str, dates: List[str], closes: List[float]):
+    """向本地行情存储写入日线（离线模式直接读取）"""
+    with store._connect() as conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO bars (code, frequency, adjustflag, date, open, high, low, close, volume) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            [(code, "d", "3", date, close, close, close, close, 1000.0) for date, close in zip(dates, closes)]
+        )
+
+
+def install_model(workflow, model: BaseChatModel):
+    """将模型装入工作流并标记为已初始化（不连接MCP服务器）"""
+    workflow.llm = model
+    workflow.tools = []
+    workflow.configure_agents()
+    workflow._initialized = True
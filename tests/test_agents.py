@@ -0,0 +1,56 @@
+"""Agent执行测试：流式执行一次即得到最终结果，不重复调用模型和工具"""
+
+import asyncio
+
+from langchain_core.messages import AIMessage
+from langchain_core.tools import tool
+
+from agents import FundamentalAgent, SummaryAgent
+from fakes import CountingChatModel
+
+
+STATE = {
+    "company_name": "贵州茅台",
+    "stock_code": "sh.600519",
+    "current_date": "2024-01-02",
+    "current_time_info": "2024-01-02 15:00:00",
+    "fundamental_analysis": "基本面",
+    "technical_analysis": "技术面",
+    "valuation_analysis": "估值",
+}
+
+
+def test_react_agent_calls_model_once_per_reasoning_step():
+    tool_calls = []
+
+    @tool
+    async def get_stock_basic_info(code: str) -> str:
+        """获取股票基本信息"""
+        tool_calls.append(code)
+        return "白酒龙头"
+
+    llm = CountingChatModel(responses=[
+        AIMessage(content="", tool_calls=[{"name": "get_stock_basic_info", "args": {"code": "sh.600519"}, "id": "call_1"}]),
+        AIMessage(content="基本面分析结论"),
+    ])
+    agent = FundamentalAgent(verbose=False)
+    agent.set_llm(llm)
+    agent.set_tools([get_stock_basic_info])
+
+    state = asyncio.run(agent.analyze(dict(STATE)))
+
+    assert state["fundamental_analysis"] == "基本面分析结论"
+    # 两个推理步骤（调用工具、给出结论）各调用一次模型，工具只执行一次
+    assert llm.calls == 2
+    assert tool_calls == ["sh.600519"]
+
+
+def test_summary_agent_calls_model_once():
+    llm = CountingChatModel(responses=[AIMessage(content="综合投资报告")])
+    agent = SummaryAgent(verbose=False)
+    agent.set_llm(llm)
+
+    state = asyncio.run(agent.analyze(dict(STATE)))
+
+    assert state["summary_analysis"] == "综合投资报告"
+    assert llm.calls == 1
@@ -0,0 +1,53 @@
+"""进行中分析登记测试：相同分析的多个请求共享一次运行和日志历史"""
+
+import asyncio
+
+from analysis_registry import InflightAnalysisRegistry
+
+
+class FakeQueue:
+    """记录收到的消息的出站队列"""
+
+    def __init__(self):
+        self.messages = []
+        self.closed = False
+
+    def send_message(self, message):
+        self.messages.append(message)
+        return True
+
+
+def test_subscribers_share_one_run_and_its_history():
+    async def main():
+        registry = InflightAnalysisRegistry()
+        key = ("sh.600519", "2024-01-02", "full")
+        release = asyncio.Event()
+        runs = []
+
+        async def runner(broadcaster):
+            runs.append(key)
+            broadcaster.send_message({"message": "开始分析", "type": "info"})
+            await release.wait()
+            broadcaster.send_message({"message": "执行完成", "type": "execution_complete"})
+            return {"final_report": "综合报告"}
+
+        first, second = FakeQueue(), FakeQueue()
+        first_task = asyncio.create_task(registry.run(key, first, runner))
+        await asyncio.sleep(0)
+        second_task = asyncio.create_task(registry.run(key, second, runner))
+        await asyncio.sleep(0)
+        assert registry.is_running(key)
+        assert registry.stats()["analyses"][0]["waiters"] == 2
+
+        release.set()
+        results = await asyncio.gather(first_task, second_task)
+        return registry, runs, results, first, second
+
+    registry, runs, results, first, second = asyncio.run(main())
+
+    assert len(runs) == 1
+    assert results[0] is results[1]
+    # 后加入的订阅者先收到历史消息，两者得到相同的完整日志
+    assert first.messages == second.messages
+    assert [m["message"] for m in second.messages] == ["开始分析", "执行完成"]
+    assert registry.stats()["inflight"] == 0
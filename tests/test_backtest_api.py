@@ -0,0 +1,139 @@
+"""回测任务接口测试：提交任务、按 Last-Event-ID 续传事件流、停止任务、已结束任务的LRU淘汰"""
+
+import asyncio
+import importlib
+import json
+import threading
+import time
+
+import pytest
+
+import backtest_jobs
+from backtest_jobs import BacktestJobManager, JOB_COMPLETED, JOB_STOPPED
+
+
+PARAMS = {"stock_code": "sh.600519", "company_name": "贵州茅台", "start_date": "2024-01-01",
+          "end_date": "2024-01-31", "initial_capital": 100000, "frequency": "weekly"}
+DECISIONS = 4
+
+
+class FakeBacktestSystem:
+    """发布若干决策事件后等待放行或取消，不访问行情和模型"""
+
+    release = threading.Event()
+
+    def __init__(self, **kwargs):
+        pass
+
+    async def run_backtest(self, stock_code, company_name, start_date, end_date, frequency,
+                           progress_callback, event_callback, cancel_token, **kwargs):
+        for index in range(DECISIONS):
+            event_callback("decision", {"index": index, "date": f"2024-01-{index + 2:02d}"})
+        while not (self.release.is_set() or cancel_token.cancelled):
+            await asyncio.sleep(0.01)
+        if cancel_token.cancelled:
+            return {"cancelled": True, "completed_decisions": DECISIONS}
+        return {"stock_code": stock_code, "total_return": 0.1}
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    """使用临时目录和假回测系统的接口客户端"""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(backtest_jobs, "BacktestSystem", FakeBacktestSystem)
+    FakeBacktestSystem.release = threading.Event()
+    backtest_api = importlib.import_module("backtest_api")
+    manager = BacktestJobManager(max_concurrent_jobs=2, max_finished_jobs=2, data_store=object(),
+                                 llm_cache=object(), checkpoint_dir=str(tmp_path / "checkpoints"))
+    monkeypatch.setattr(backtest_api, "job_manager", manager)
+    yield backtest_api.app.test_client(), manager
+    FakeBacktestSystem.release.set()
+    manager.shutdown()
+
+
+def wait_finished(manager, job_id, timeout=5.0):
+    """等待任务结束并返回任务（结束状态在工作线程返回前设置）"""
+    job = manager.get(job_id)
+    job.future.result(timeout)
+    return job
+
+
+def parse_events(body: str):
+    """解析SSE响应中的事件（忽略 retry 和心跳）"""
+    events = []
+    for block in body.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.split("\n") if not line.startswith(":"))
+        if "id" in fields:
+            events.append({"id": int(fields["id"]), "type": fields["event"], "data": json.loads(fields["data"])})
+    return events
+
+
+def test_submit_and_fetch_results(client):
+    client, manager = client
+    response = client.post("/api/backtest/start", json=PARAMS)
+    assert response.status_code == 202
+    job_id = response.get_json()["job_id"]
+
+    FakeBacktestSystem.release.set()
+    wait_finished(manager, job_id)
+
+    status = client.get(f"/api/backtest/jobs/{job_id}").get_json()
+    assert status["state"] == JOB_COMPLETED and status["has_results"]
+    assert client.get(f"/api/backtest/jobs/{job_id}/results").get_json()["total_return"] == 0.1
+    assert client.post("/api/backtest/start", json={"stock_code": "sh.600519"}).status_code == 400
+
+
+def test_reconnect_replays_only_newer_events(client):
+    client, manager = client
+    job_id = client.post("/api/backtest/start", json=PARAMS).get_json()["job_id"]
+    FakeBacktestSystem.release.set()
+    wait_finished(manager, job_id)
+
+    events = parse_events(client.get(f"/api/backtest/jobs/{job_id}/events").get_data(as_text=True))
+    ids = [event["id"] for event in events]
+    assert ids == list(range(1, len(ids) + 1))
+    assert len([event for event in events if event["type"] == "decision"]) == DECISIONS
+    assert events[-1]["type"] == "status" and events[-1]["data"]["state"] == JOB_COMPLETED
+
+    # 断线重连：只补发 Last-Event-ID 之后的事件
+    last_seen = ids[len(ids) // 2]
+    resumed = parse_events(client.get(f"/api/backtest/jobs/{job_id}/events",
+                                      headers={"Last-Event-ID": str(last_seen)}).get_data(as_text=True))
+    assert resumed == events[last_seen:]
+    assert client.get("/api/backtest/jobs/missing/events").status_code == 404
+
+
+def test_stop_running_job(client):
+    client, manager = client
+    job_id = client.post("/api/backtest/start", json=PARAMS).get_json()["job_id"]
+    job = manager.get(job_id)
+    deadline = time.time() + 5
+    while job._last_event_id < DECISIONS and time.time() < deadline:
+        time.sleep(0.01)
+
+    response = client.post(f"/api/backtest/jobs/{job_id}/stop")
+    assert response.status_code == 200
+    wait_finished(manager, job_id)
+
+    status = client.get(f"/api/backtest/jobs/{job_id}").get_json()
+    assert status["state"] == JOB_STOPPED and not status["is_running"]
+    assert status["has_results"]
+    # 已结束的任务不能再次停止
+    assert client.post(f"/api/backtest/jobs/{job_id}/stop").status_code == 400
+
+
+def test_finished_jobs_are_evicted_least_recently_used(client):
+    client, manager = client
+    FakeBacktestSystem.release.set()
+    job_ids = []
+    for _ in range(3):
+        job_ids.append(client.post("/api/backtest/start", json=PARAMS).get_json()["job_id"])
+        wait_finished(manager, job_ids[-1])
+        if len(job_ids) == 2:
+            # 访问第一个任务，使第二个任务成为最久未访问的任务
+            assert client.get(f"/api/backtest/jobs/{job_ids[0]}").status_code == 200
+
+    assert client.get(f"/api/backtest/jobs/{job_ids[1]}").status_code == 404
+    assert client.get(f"/api/backtest/jobs/{job_ids[0]}").status_code == 200
+    assert client.get(f"/api/backtest/jobs/{job_ids[2]}").status_code == 200
+    assert manager.stats()["finished"] == 2
@@ -0,0 +1,73 @@
+"""回测检查点测试：分析失败的决策点不缓存，恢复回测时重新分析"""
+
+import asyncio
+from typing import Any, List, Optional
+
+import pandas as pd
+import pytest
+from langchain_core.messages import AIMessage, BaseMessage
+
+from backtest_checkpoint import BacktestCheckpoint
+from backtest_system import BacktestSystem
+from fakes import DECISION_JSON, CountingChatModel, install_model, seed_bars
+from llm_cache import PersistentLLMCache
+from market_data_store import MarketDataStore
+
+
+START_DATE, END_DATE = "2024-01-01", "2024-01-31"
+
+
+class OutageChatModel(CountingChatModel):
+    """提示词涉及 outage_date 时抛出异常，模拟该决策点模型服务中断"""
+
+    outage_date: Optional[str] = None
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Any = None, **kwargs: Any):
+        if self.outage_date and any(self.outage_date in str(message.content) for message in messages):
+            raise RuntimeError("模型服务中断")
+        return super()._generate(messages, stop, run_manager, **kwargs)
+
+
+def make_backtest(tmp_path, outage_date=None):
+    """在离线行情上构建回测（模型服务在 outage_date 中断）"""
+    store = MarketDataStore(str(tmp_path / "market.sqlite"), offline=True)
+    dates = [d.strftime('%Y-%m-%d') for d in pd.bdate_range("2023-08-01", "2024-02-29")]
+    seed_bars(store, "sh.600519", dates, [100.0 + i * 0.1 for i in range(len(dates))])
+
+    backtest = BacktestSystem(initial_capital=100000.0, verbose=False, data_store=store,
+                              llm_cache=PersistentLLMCache(str(tmp_path / "llm.sqlite")))
+    model = OutageChatModel(responses=[AIMessage(content=DECISION_JSON)], outage_date=outage_date)
+    install_model(backtest.workflow, model)
+    return backtest, model
+
+
+def run_backtest(backtest, checkpoint, mode):
+    """运行每周决策的回测"""
+    return asyncio.run(backtest.run_backtest("sh.600519", "贵州茅台", START_DATE, END_DATE,
+                                             frequency="weekly", mode=mode, checkpoint=checkpoint))
+
+
+@pytest.mark.parametrize("mode", ["sequential", "two_phase"])
+def test_failed_decision_is_reanalyzed_on_resume(tmp_path, mode):
+    checkpoint = BacktestCheckpoint("job-1", str(tmp_path / "checkpoints"))
+    decision_dates = make_backtest(tmp_path)[0].generate_decision_dates(START_DATE, END_DATE, "weekly")
+    outage_date = decision_dates[1]
+
+    backtest, model = make_backtest(tmp_path, outage_date=outage_date)
+    results = run_backtest(backtest, checkpoint, mode)
+    calls_per_date = model.calls // (len(decision_dates) - 1)
+
+    # 失败的决策点记为失败、不进入分析缓存，检查点中记为未分析
+    assert results["failed_decisions"] == [outage_date]
+    assert f"decision_sh.600519_{outage_date}" not in backtest.analysis_cache
+    assert set(checkpoint.decisions()) == set(decision_dates) - {outage_date}
+
+    # 恢复：其他决策点从检查点重放，只重新分析失败的决策点
+    backtest, model = make_backtest(tmp_path)
+    results = run_backtest(backtest, checkpoint, mode)
+
+    assert results["failed_decisions"] == []
+    assert model.calls == calls_per_date > 0
+    assert set(checkpoint.decisions()) == set(decision_dates)
+    assert checkpoint.decisions()[outage_date]["action"] == "BUY"
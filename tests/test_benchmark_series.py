@@ -0,0 +1,56 @@
+"""基准序列缓存测试：只缓存昨天及之前已定稿的数据"""
+
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from benchmark_series import BenchmarkSeriesCache, CSI300_CODE
+
+
+class FakeDataStore:
+    """按请求区间返回工作日收盘价，并记录读取次数"""
+
+    def __init__(self):
+        self.reads = []
+
+    def get_bars(self, code, start_date, end_date, frequency="d", adjustflag="3"):
+        self.reads.append((start_date, end_date))
+        dates = pd.bdate_range(start_date, end_date)
+        return pd.DataFrame({"date": dates.strftime('%Y-%m-%d'), "close": [3500.0 + i for i in range(len(dates))]})
+
+
+def day(offset: int) -> str:
+    """今天之后 offset 天的日期（负数为之前）"""
+    return (datetime.now() + timedelta(days=offset)).strftime('%Y-%m-%d')
+
+
+def test_historical_range_is_cached():
+    store = FakeDataStore()
+    cache = BenchmarkSeriesCache(store)
+
+    first = cache.get(CSI300_CODE, "2024-01-01", "2024-03-31")
+    second = cache.get(CSI300_CODE, "2024-02-01", "2024-02-29")
+
+    assert len(store.reads) == 1
+    assert cache.stats()["hits"] == 1
+    assert len(first["dates"]) > len(second["dates"]) > 0
+
+
+def test_range_ending_today_is_reloaded():
+    store = FakeDataStore()
+    cache = BenchmarkSeriesCache(store)
+
+    first = cache.get(CSI300_CODE, day(-60), day(0))
+    cache.get(CSI300_CODE, day(-60), day(0))
+
+    # 当天的数据尚未定稿，每次都重新读取；缓存中只有昨天及之前的数据
+    assert len(store.reads) == 2
+    assert cache.stats()["hits"] == 0
+    assert str(cache._series[CSI300_CODE]["range_end"]) == day(-1)
+    assert cache._series[CSI300_CODE]["dates"].max() <= pd.Timestamp(day(-1)).to_datetime64()
+    assert first["dates"].max() == pd.bdate_range(day(-60), day(0))[-1].to_datetime64()
+
+    # 已定稿的区间直接命中缓存
+    cache.get(CSI300_CODE, day(-50), day(-1))
+    assert len(store.reads) == 2
+    assert cache.stats()["hits"] == 1
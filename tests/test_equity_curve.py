@@ -0,0 +1,66 @@
+"""逐日资产曲线测试：已知交易的逐日估值，没有交易时生成全部为现金的平坦曲线"""
+
+import pandas as pd
+import pytest
+
+from backtest_system import BacktestSystem
+from fakes import seed_bars
+from llm_cache import PersistentLLMCache
+from market_data_store import MarketDataStore
+
+
+STOCK_CODE = "sh.600519"
+DATES = [d.strftime('%Y-%m-%d') for d in pd.bdate_range("2024-01-02", "2024-01-12")]
+CLOSES = [10.0 + i for i in range(len(DATES))]
+
+
+def make_backtest(tmp_path):
+    """在离线行情上构建回测并预加载收盘价（1月2日起每个交易日上涨1元）"""
+    store = MarketDataStore(str(tmp_path / "market.sqlite"), offline=True)
+    seed_bars(store, STOCK_CODE, DATES, CLOSES)
+    backtest = BacktestSystem(initial_capital=10000.0, verbose=False, data_store=store,
+                              llm_cache=PersistentLLMCache(str(tmp_path / "llm.sqlite")))
+    backtest.preload_price_data([STOCK_CODE], DATES[0], DATES[-1])
+    return backtest
+
+
+def trade(date, action, shares):
+    price = CLOSES[DATES.index(date)]
+    return {"date": date, "stock_code": STOCK_CODE, "action": action, "shares": shares,
+            "price": price, "amount": shares * price}
+
+
+def test_daily_values_follow_known_trades(tmp_path):
+    backtest = make_backtest(tmp_path)
+    backtest.record_transaction(trade(DATES[1], "BUY", 100))
+    backtest.record_transaction(trade(DATES[4], "SELL", 100))
+
+    curve = backtest.build_equity_curve(DATES[0], DATES[-1])
+
+    assert [point["date"] for point in curve] == DATES
+    # 买入前和卖出后只有现金；持有期间按当日收盘价估值（11元买入，14元卖出）
+    assert [point["portfolio_value"] for point in curve] == pytest.approx(
+        [10000, 10000, 10100, 10200, 10300, 10300, 10300, 10300, 10300])
+    assert [point["stock_value"] for point in curve] == pytest.approx(
+        [0, 1100, 1200, 1300, 0, 0, 0, 0, 0])
+    assert curve[2]["cash"] == pytest.approx(8900)
+
+
+def test_no_trades_give_flat_cash_curve(tmp_path):
+    backtest = make_backtest(tmp_path)
+    backtest.daily_values = [
+        {"date": DATES[0], "portfolio_value": 10000.0, "cash": 10000.0, "stock_value": 0.0},
+        {"date": DATES[-1], "portfolio_value": 10000.0, "cash": 10000.0, "stock_value": 0.0},
+    ]
+
+    curve = backtest.build_equity_curve(DATES[0], DATES[-1])
+    assert [point["date"] for point in curve] == DATES
+    assert all(point == {"date": point["date"], "portfolio_value": 10000.0, "cash": 10000.0, "stock_value": 0.0}
+               for point in curve)
+
+    # 只持有现金的回测也按逐日曲线计算表现，而不是退回到决策点
+    performance = backtest.calculate_performance()
+    assert len(performance["equity_curve"]) == len(DATES)
+    assert performance["total_return"] == 0.0
+    assert performance["volatility"] == 0.0 and performance["max_drawdown"] == 0.0
+    assert performance["time_in_market"] == 0.0
@@ -0,0 +1,112 @@
+"""LLM响应缓存测试：共享缓存上的严格回放"""
+
+import asyncio
+
+import pandas as pd
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.outputs import ChatGeneration
+
+from backtest_system import BacktestSystem
+from fakes import DECISION_JSON, CountingChatModel, install_model, seed_bars
+from llm_cache import LLMCacheMissError, PersistentLLMCache, StrictLLMCache
+from market_data_store import MarketDataStore
+
+
+START_DATE, END_DATE = "2024-01-01", "2024-01-31"
+
+
+def run_backtest(tmp_path, llm_cache, strict_replay):
+    """在离线行情上运行每周决策的回测，返回结果和模型调用次数"""
+    store = MarketDataStore(str(tmp_path / "market.sqlite"), offline=True)
+    dates = [d.strftime('%Y-%m-%d') for d in pd.bdate_range("2023-08-01", "2024-02-29")]
+    seed_bars(store, "sh.600519", dates, [100.0 + i * 0.1 for i in range(len(dates))])
+
+    backtest = BacktestSystem(initial_capital=100000.0, verbose=False, data_store=store,
+                              llm_cache=llm_cache, strict_replay=strict_replay)
+    model = CountingChatModel(responses=[AIMessage(content=DECISION_JSON)], cache=backtest.llm_cache)
+    install_model(backtest.workflow, model)
+
+    results = asyncio.run(backtest.run_backtest("sh.600519", "贵州茅台", START_DATE, END_DATE, frequency="weekly"))
+    return results, model.calls
+
+
+def test_strict_view_raises_on_miss_and_shares_entries(tmp_path):
+    store = PersistentLLMCache(str(tmp_path / "llm.sqlite"))
+    messages = [HumanMessage(content="分析贵州茅台")]
+
+    with pytest.raises(LLMCacheMissError):
+        CountingChatModel(responses=[AIMessage(content="结论")], cache=StrictLLMCache(store)).invoke(messages)
+
+    CountingChatModel(responses=[AIMessage(content="结论")], cache=store).invoke(messages)
+    replay = CountingChatModel(responses=[AIMessage(content="其他")], cache=StrictLLMCache(store))
+
+    assert replay.invoke(messages).content == "结论"
+    assert replay.calls == 0
+    # 严格视图不改变共享缓存本身
+    assert store.strict is False
+
+
+def test_strict_replay_miss_fails_the_backtest(tmp_path):
+    store = PersistentLLMCache(str(tmp_path / "llm.sqlite"))
+
+    with pytest.raises(LLMCacheMissError):
+        run_backtest(tmp_path, store, strict_replay=True)
+
+
+def test_strict_replay_reuses_recorded_run(tmp_path):
+    store = PersistentLLMCache(str(tmp_path / "llm.sqlite"))
+    recorded, recorded_calls = run_backtest(tmp_path, store, strict_replay=False)
+    replayed, replayed_calls = run_backtest(tmp_path, store, strict_replay=True)
+
+    assert recorded_calls > 0
+    assert replayed_calls == 0
+    assert replayed["final_value"] == recorded["final_value"]
+    assert len(replayed["transactions"]) == len(recorded["transactions"]) > 0
+
+
+def cache_entries(cache):
+    """按写入顺序排列的缓存键，以及触发器维护的总数与实际是否一致"""
+    with cache._connect() as conn:
+        keys = [row[0] for row in conn.execute("SELECT key FROM llm_cache ORDER BY last_access")]
+        actual = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM llm_cache").fetchone()
+        return keys, tuple(cache._totals(conn)) == actual
+
+
+def fill(cache, count, content="结论"):
+    """写入 count 条不同的响应，返回各自的缓存键"""
+    keys = []
+    for i in range(count):
+        prompt = f'[{{"kwargs": {{"type": "human", "content": "问题 {i}"}}}}]'
+        cache.update(prompt, "llm", [ChatGeneration(message=AIMessage(content=content))])
+        keys.append(cache.make_key(prompt, "llm"))
+    return keys
+
+
+def test_eviction_keeps_most_recent_entries_within_limits(tmp_path):
+    cache = PersistentLLMCache(str(tmp_path / "llm.sqlite"), max_entries=5)
+    keys = fill(cache, 8)
+
+    remaining, consistent = cache_entries(cache)
+    assert remaining == keys[-5:]
+    assert consistent
+
+    size = cache.stats()["size_bytes"] // 5
+    by_size = PersistentLLMCache(str(tmp_path / "sized.sqlite"), max_bytes=size * 3)
+    keys = fill(by_size, 6)
+
+    remaining, consistent = cache_entries(by_size)
+    assert remaining == keys[-3:]
+    assert consistent
+    assert by_size.stats()["size_bytes"] <= size * 3
+
+
+def test_totals_survive_overwrite_and_reopen(tmp_path):
+    path = str(tmp_path / "llm.sqlite")
+    cache = PersistentLLMCache(path)
+    fill(cache, 3)
+    fill(cache, 3, content="更长的结论" * 10)
+
+    assert cache.stats()["entries"] == 3
+    assert cache_entries(cache)[1]
+    assert cache_entries(PersistentLLMCache(path))[1]
@@ -0,0 +1,70 @@
+"""本地行情存储测试：增量下载与baostock登录复用"""
+
+import market_data_store
+from market_data_store import MarketDataStore
+
+
+class FakeResultSet:
+    """模拟baostock结果集"""
+
+    def __init__(self, rows, error_code="0"):
+        self.rows = list(rows)
+        self.error_code = error_code
+        self.error_msg = "" if error_code == "0" else "会话已过期"
+
+    def next(self):
+        return bool(self.rows)
+
+    def get_row_data(self):
+        return self.rows.pop(0)
+
+
+class FakeBaostock:
+    """记录登录和查询次数的假baostock模块，可指定前若干次查询失败"""
+
+    def __init__(self, failures=0):
+        self.logins = 0
+        self.queries = 0
+        self.failures = failures
+
+    def login(self):
+        self.logins += 1
+        return FakeResultSet([])
+
+    def query_history_k_data_plus(self, code, fields, start_date, end_date, frequency, adjustflag):
+        self.queries += 1
+        if self.failures:
+            self.failures -= 1
+            return FakeResultSet([], error_code="10001001")
+        return FakeResultSet([[start_date, "10", "11", "9", "10.5", "1000"]])
+
+
+def make_store(tmp_path, monkeypatch, fake):
+    monkeypatch.setattr(market_data_store, "bs", fake)
+    monkeypatch.setattr(market_data_store, "_baostock_logged_in", False)
+    return MarketDataStore(str(tmp_path / "market.sqlite"))
+
+
+def test_login_is_reused_across_downloads(tmp_path, monkeypatch):
+    fake = FakeBaostock()
+    store = make_store(tmp_path, monkeypatch, fake)
+
+    store.get_bars("sh.600519", "2024-01-02", "2024-01-05")
+    store.get_bars("sh.600000", "2024-01-02", "2024-01-05")
+    # 已覆盖的区间不再下载
+    bars = store.get_bars("sh.600519", "2024-01-02", "2024-01-05")
+
+    assert fake.logins == 1
+    assert fake.queries == 2
+    assert bars["close"].tolist() == [10.5]
+
+
+def test_failed_query_relogs_in_and_retries(tmp_path, monkeypatch):
+    fake = FakeBaostock(failures=1)
+    store = make_store(tmp_path, monkeypatch, fake)
+
+    bars = store.get_bars("sh.600519", "2024-01-02", "2024-01-05")
+
+    assert fake.logins == 2
+    assert fake.queries == 2
+    assert bars["close"].tolist() == [10.5]
@@ -0,0 +1,65 @@
+"""共享分析测试：只缓存成功完成的分析报告"""
+
+import asyncio
+from typing import Any, List, Optional
+
+from langchain_core.messages import AIMessage, BaseMessage
+
+from fakes import CountingChatModel, DECISION_JSON, install_model
+from multi_agent_websocket import MultiAgentWebSocketManager
+from report_cache import ReportCache
+
+
+class FakeQueue:
+    """记录收到的消息的出站队列"""
+
+    def __init__(self):
+        self.messages = []
+        self.closed = False
+
+    def send_message(self, message):
+        self.messages.append(message)
+        return True
+
+
+class UnavailableChatModel(CountingChatModel):
+    """每次调用都失败的模型（模拟模型服务不可用）"""
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Any = None, **kwargs: Any):
+        raise RuntimeError("Gemini 503")
+
+
+def run_shared_analysis(tmp_path, model):
+    """运行一次共享分析，返回报告缓存和发送给客户端的消息"""
+    cache = ReportCache(str(tmp_path / "reports.sqlite"))
+    queue = FakeQueue()
+    manager = MultiAgentWebSocketManager(queue, report_cache=cache)
+    install_model(manager.workflow, model)
+    asyncio.run(manager.run_shared_analysis("贵州茅台", "sh.600519"))
+    return cache, queue
+
+
+def test_failed_analysis_is_not_cached(tmp_path):
+    cache, queue = run_shared_analysis(tmp_path, UnavailableChatModel(responses=[AIMessage(content="")]))
+
+    assert any("Gemini 503" in str(message.get("message", "")) for message in queue.messages)
+    assert cache.stats()["memory_entries"] == 0
+    with cache._connect() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM reports").fetchone()[0] == 0
+
+
+def test_successful_analysis_is_cached(tmp_path):
+    cache, queue = run_shared_analysis(tmp_path, CountingChatModel(responses=[AIMessage(content=DECISION_JSON)]))
+
+    assert cache.stats()["memory_entries"] == 1
+    assert queue.messages[-1]["type"] == "execution_complete"
+
+
+def test_is_failed_report():
+    decision = {"action": "BUY"}
+    assert MultiAgentWebSocketManager.is_failed_report(None)
+    assert MultiAgentWebSocketManager.is_failed_report({"error": "初始化失败", "investment_decision": decision})
+    assert MultiAgentWebSocketManager.is_failed_report({"errors": ["基本面分析: Gemini 503"], "investment_decision": decision})
+    assert MultiAgentWebSocketManager.is_failed_report({"errors": [], "investment_decision": ""})
+    assert not MultiAgentWebSocketManager.is_failed_report({"errors": [], "investment_decision": decision})
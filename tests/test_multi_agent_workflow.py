@@ -0,0 +1,27 @@
+"""完整分析流程测试：返回的结果只包含报告字段，不带预取的原始数据"""
+
+import asyncio
+
+from langchain_core.messages import AIMessage
+from langchain_core.tools import tool
+
+from fakes import CountingChatModel, DECISION_JSON, install_model
+from multi_agent_workflow import MultiAgentWorkflow
+
+
+def test_run_analysis_drops_prefetched_data():
+    @tool
+    async def get_stock_basic_info(code: str) -> str:
+        """获取股票基本信息"""
+        return "原始数据" * 1000
+
+    workflow = MultiAgentWorkflow(verbose=False)
+    install_model(workflow, CountingChatModel(responses=[AIMessage(content=DECISION_JSON)]))
+    workflow.tools = [get_stock_basic_info]
+
+    result = asyncio.run(workflow.run_analysis("贵州茅台", "sh.600519"))
+
+    assert "error" not in result
+    assert result["summary_analysis"] == DECISION_JSON
+    assert "prefetched_data" not in result
+    assert "原始数据" not in str(result)
@@ -0,0 +1,131 @@
+"""出站队列测试：大报告按分块成帧发送，合并的增量消息和批次都有大小上限"""
+
+import asyncio
+import json
+
+from outbound_queue import OutboundQueue, DEFAULT_MAX_BATCH_BYTES
+from report_stream import ReportDeltaStreamer, REPORT_CHUNK_SIZE
+
+
+class FakeWebSocket:
+    """记录发送的帧"""
+
+    def __init__(self):
+        self.frames = []
+
+    async def send_text(self, text: str):
+        self.frames.append(text)
+
+
+def messages_of(frames):
+    """展开帧中的消息（单条消息不包装为数组）"""
+    messages = []
+    for frame in frames:
+        data = json.loads(frame)
+        messages.extend(data if isinstance(data, list) else [data])
+    return messages
+
+
+def run_report(report: str, deltas=()):
+    async def main():
+        websocket = FakeWebSocket()
+        queue = OutboundQueue(websocket, flush_interval_ms=1)
+        queue.start()
+
+        async def send(message):
+            queue.send_message(message)
+
+        streamer = ReportDeltaStreamer(send, stream="final_report", title="最终报告")
+        # 模拟模型的流式输出（发送任务运行前全部入队，会被合并）
+        for delta in deltas:
+            streamer._buffer = delta
+            streamer.turn = streamer.turn or 1
+            await streamer.flush()
+        await streamer.send_text(report)
+        await streamer.end()
+        await queue.close()
+        return websocket
+
+    return asyncio.run(main())
+
+
+def test_large_report_is_sent_in_chunk_sized_frames():
+    report = "x" * 300_000
+    websocket = run_report(report)
+
+    messages = messages_of(websocket.frames)
+    deltas = [m["delta"] for m in messages if m["type"] == "report_delta"]
+    assert "".join(deltas) == report
+    assert max(len(delta) for delta in deltas) <= REPORT_CHUNK_SIZE
+    # 约75帧，每帧约一个4KB分块（末尾的小消息可能并入同一帧），没有超过批次上限的帧
+    assert 70 <= len(websocket.frames) <= 76
+    assert max(len(frame.encode("utf-8")) for frame in websocket.frames) <= DEFAULT_MAX_BATCH_BYTES
+
+
+def test_coalesced_deltas_stay_within_chunk_size():
+    websocket = run_report("", deltas=["报告内容" * 10] * 500)
+
+    deltas = [m["delta"] for m in messages_of(websocket.frames) if m["type"] == "report_delta"]
+    assert "".join(deltas) == "报告内容" * 10 * 500
+    # 合并减少了消息数量，但每条合并后的消息不超过一个报告分块
+    assert len(deltas) < 500
+    assert max(len(delta) for delta in deltas) <= REPORT_CHUNK_SIZE
+
+
+class StalledWebSocket(FakeWebSocket):
+    """客户端停止读取：第一次发送后一直阻塞，记录关闭码"""
+
+    def __init__(self):
+        super().__init__()
+        self.close_codes = []
+
+    async def send_text(self, text: str):
+        self.frames.append(text)
+        await asyncio.Event().wait()
+
+    async def close(self, code: int = 1000):
+        self.close_codes.append(code)
+
+
+def test_stalled_consumer_is_closed_at_hard_limit():
+    async def main():
+        websocket = StalledWebSocket()
+        queue = OutboundQueue(websocket, max_size=10, flush_interval_ms=1, hard_limit=30)
+        queue.start()
+        queue.send_message({"message": "开始", "type": "warning"})
+        await asyncio.sleep(0.01)  # 发送任务阻塞在第一帧上
+
+        accepted = []
+        for i in range(100):
+            message_type = ("success", "warning", "error")[i % 3]
+            accepted.append(queue.send_message({"message": f"状态 {i}", "type": message_type}))
+            assert len(queue._queue) <= queue.hard_limit
+        await queue.close()
+        return websocket, queue, accepted
+
+    websocket, queue, accepted = asyncio.run(main())
+
+    stats = queue.stats()
+    # 超过容量后成功日志被丢弃，警告和错误保留到硬上限，之后关闭连接
+    assert stats["overflowed"] and queue.closed
+    assert stats["queued"] == 0
+    assert websocket.close_codes == [1013]
+    assert len(websocket.frames) == 1
+    assert sum(accepted) == 30
+    assert queue.send_message({"message": "关闭后", "type": "error"}) is False
+
+
+def test_backlog_below_hard_limit_is_delivered():
+    async def main():
+        websocket = FakeWebSocket()
+        queue = OutboundQueue(websocket, max_size=10, flush_interval_ms=1, hard_limit=30)
+        for i in range(20):
+            queue.send_message({"message": f"警告 {i}", "type": "warning"})
+        queue.start()
+        await queue.close()
+        return websocket, queue
+
+    websocket, queue = asyncio.run(main())
+
+    assert not queue.stats()["overflowed"]
+    assert [m["message"] for m in messages_of(websocket.frames)] == [f"警告 {i}" for i in range(20)]
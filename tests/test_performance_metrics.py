@@ -0,0 +1,71 @@
+"""表现指标测试：批量计算与逐条一致，回撤持续时间，平坦曲线和单点曲线不产生无穷大或NaN"""
+
+import numpy as np
+import pytest
+
+from performance_metrics import compute_metrics, max_drawdown, relative_metrics
+
+
+def make_curves(count=4, length=60, seed=3):
+    """随机游走的资产曲线 (曲线数, 交易日数)"""
+    rng = np.random.default_rng(seed)
+    return 100000.0 * np.cumprod(1 + rng.normal(0.001, 0.02, (count, length)), axis=-1)
+
+
+def test_batch_matches_single_curves_with_shared_benchmark():
+    curves = make_curves()
+    benchmark = make_curves(count=1, seed=11)[0]
+    trade_amounts = np.abs(np.diff(curves, axis=-1, prepend=curves[:, :1]))
+    stock_value = curves * 0.5
+
+    batch = compute_metrics(curves, trade_amounts=trade_amounts, stock_value=stock_value, benchmark=benchmark)
+
+    assert all(np.shape(values) == (len(curves),) for values in batch.values())
+    for index, curve in enumerate(curves):
+        single = compute_metrics(curve, trade_amounts=trade_amounts[index], stock_value=stock_value[index],
+                                 benchmark=benchmark)
+        for name, value in single.items():
+            assert batch[name][index] == pytest.approx(value, rel=1e-12), name
+
+    relative = relative_metrics(curves, benchmark)
+    assert relative["benchmark_return"].shape == (len(curves),)
+    assert relative["benchmark_annual_return"].shape == (len(curves),)
+
+
+def test_max_drawdown_depth_and_duration():
+    # 110 见顶后回撤到 88（-20%），第 7 天回到 110 之上
+    equity = [100, 110, 99, 88, 95, 105, 108, 112, 111]
+    drawdown = max_drawdown(equity)
+
+    assert drawdown["max_drawdown"][0] == pytest.approx(0.2)
+    assert drawdown["peak_index"][0] == 1
+    assert drawdown["trough_index"][0] == 3
+    # 第 1 天见顶后水下 5 个交易日（第 2 至 6 天）
+    assert drawdown["max_duration"][0] == 5
+
+
+@pytest.mark.parametrize("equity", [
+    [100000.0] * 30,
+    (100000.0 * 1.001 ** np.arange(30)).tolist(),
+])
+def test_zero_variance_curve_gives_finite_ratios(equity):
+    with np.errstate(all="raise"):
+        metrics = compute_metrics(equity, benchmark=[3500.0] * 30)
+
+    assert metrics["sharpe_ratio"] == 0.0
+    assert metrics["sortino_ratio"] == 0.0
+    assert metrics["max_drawdown"] == 0.0
+    assert metrics["max_drawdown_duration"] == 0.0
+    # 没有回撤时卡玛比率无法计算，用None表示而不是无穷大
+    assert metrics["calmar_ratio"] is None
+
+
+def test_single_point_curve():
+    metrics = compute_metrics([100000.0], trade_amounts=[0.0], stock_value=[0.0])
+
+    assert metrics["total_return"] == 0.0
+    assert metrics["annual_return"] is None
+    assert metrics["volatility"] == 0.0
+    assert metrics["sharpe_ratio"] == 0.0 and metrics["sortino_ratio"] == 0.0
+    assert metrics["max_drawdown"] == 0.0 and metrics["max_drawdown_duration"] == 0.0
+    assert metrics["turnover"] == 0.0 and metrics["time_in_market"] == 0.0
@@ -0,0 +1,38 @@
+"""分析报告缓存测试：命中、未命中、过期和持久化"""
+
+import report_cache
+from report_cache import ReportCache
+
+
+EVENTS = [{"message": "启动多Agent分析系统...", "type": "info"}, {"message": "执行完成", "type": "execution_complete"}]
+
+
+def test_hit_miss_and_persistence(tmp_path):
+    path = str(tmp_path / "reports.sqlite")
+    cache = ReportCache(path, ttl=3600)
+
+    assert cache.get("sh.600519", "2024-01-02") is None
+    cache.put("sh.600519", "2024-01-02", "贵州茅台", "综合报告", EVENTS)
+
+    entry = cache.get("sh.600519", "2024-01-02")
+    assert entry["report"] == "综合报告" and entry["events"] == EVENTS
+    assert cache.get("sh.600519", "2024-01-03") is None
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 2
+
+    # 服务重启后从SQLite读取
+    assert ReportCache(path, ttl=3600).get("sh.600519", "2024-01-02")["report"] == "综合报告"
+
+
+def test_expired_report_is_a_miss(tmp_path, monkeypatch):
+    now = [1_000_000.0]
+    monkeypatch.setattr(report_cache.time, "time", lambda: now[0])
+    path = str(tmp_path / "reports.sqlite")
+    cache = ReportCache(path, ttl=60)
+    cache.put("sh.600519", "2024-01-02", "贵州茅台", "综合报告", EVENTS)
+
+    now[0] += 59
+    assert cache.get("sh.600519", "2024-01-02") is not None
+
+    now[0] += 2
+    assert cache.get("sh.600519", "2024-01-02") is None
+    assert ReportCache(path, ttl=60).get("sh.600519", "2024-01-02") is None
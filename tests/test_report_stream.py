@@ -0,0 +1,46 @@
+"""报告增量推送测试：模型停顿时缓冲的文本按时发出"""
+
+import asyncio
+
+from report_stream import ReportDeltaStreamer
+
+
+def test_buffered_text_is_flushed_after_silence():
+    async def main():
+        sent = []
+
+        async def send(message):
+            sent.append(message)
+
+        streamer = ReportDeltaStreamer(send, stream="fundamental_analysis", title="基本面分析", interval_ms=20)
+        await streamer.push("第一段")
+        await streamer.push("第二段")  # 都在合并间隔内，进入缓冲
+        assert sent == []
+
+        # 之后既没有新的 push 也没有 end
+        await asyncio.sleep(0.1)
+        return sent
+
+    sent = asyncio.run(main())
+
+    assert [m["delta"] for m in sent] == ["第一段第二段"]
+
+
+def test_timer_does_not_resend_flushed_text():
+    async def main():
+        sent = []
+
+        async def send(message):
+            sent.append(message)
+
+        streamer = ReportDeltaStreamer(send, stream="summary_analysis", title="综合分析", interval_ms=20)
+        await streamer.push("a")
+        await streamer.push("b")
+        await streamer.end("ab")
+        await asyncio.sleep(0.1)
+        return sent
+
+    sent = asyncio.run(main())
+
+    assert "".join(m.get("delta", "") for m in sent) == "ab"
+    assert sent[-1]["type"] == "report_end"
@@ -0,0 +1,163 @@
+"""技术指标测试：向量化实现与逐日循环的参考实现一致，短序列不报错"""
+
+import math
+
+import numpy as np
+import pytest
+
+from technical_indicators import (BOLL_PARAMS, KDJ_PARAMS, MACD_PARAMS, MA_PERIODS, RSI_PERIODS,
+                                  compute_indicators, format_summary, parse_kline_markdown, summarize)
+
+
+def make_bars(length=120, seed=7):
+    """随机游走的日线（最高价不低于收盘价，最低价不高于收盘价）"""
+    rng = np.random.default_rng(seed)
+    close = 100.0 + np.cumsum(rng.normal(0, 1.5, length))
+    high = close + rng.uniform(0, 2, length)
+    low = close - rng.uniform(0, 2, length)
+    volume = rng.uniform(1e5, 1e6, length)
+    return close, high, low, volume
+
+
+# ---- 逐日循环的参考实现 ----
+
+def ref_sma(values, window):
+    return [None if i + 1 < window else sum(values[i + 1 - window:i + 1]) / window for i in range(len(values))]
+
+
+def ref_ema(values, alpha, initial=None):
+    result, previous = [], initial
+    for value in values:
+        previous = value if previous is None else alpha * value + (1 - alpha) * previous
+        result.append(previous)
+    return result
+
+
+def ref_macd(close):
+    fast, slow, signal = MACD_PARAMS
+    dif = [a - b for a, b in zip(ref_ema(close, 2 / (fast + 1)), ref_ema(close, 2 / (slow + 1)))]
+    dea = ref_ema(dif, 2 / (signal + 1))
+    return dif, dea, [2 * (a - b) for a, b in zip(dif, dea)]
+
+
+def ref_rsi(close, period):
+    gains, losses = [0.0], [0.0]
+    for previous, current in zip(close, close[1:]):
+        gains.append(max(current - previous, 0.0))
+        losses.append(max(previous - current, 0.0))
+    avg_gain, avg_loss = ref_ema(gains, 1 / period), ref_ema(losses, 1 / period)
+    return [None if i < period else (100.0 if l == 0 else 100 - 100 / (1 + g / l))
+            for i, (g, l) in enumerate(zip(avg_gain, avg_loss))]
+
+
+def ref_kdj(close, high, low):
+    period, k_smooth, d_smooth = KDJ_PARAMS
+    k_values, d_values, j_values = [], [], []
+    k = d = 50.0
+    for i in range(len(close)):
+        if i + 1 < period:
+            rsv = 50.0
+        else:
+            lowest, highest = min(low[i + 1 - period:i + 1]), max(high[i + 1 - period:i + 1])
+            rsv = (close[i] - lowest) / (highest - lowest) * 100 if highest > lowest else 50.0
+        k = (rsv + (k_smooth - 1) * k) / k_smooth
+        d = (k + (d_smooth - 1) * d) / d_smooth
+        k_values.append(k)
+        d_values.append(d)
+        j_values.append(3 * k - 2 * d)
+    return k_values, d_values, j_values
+
+
+def ref_boll(close):
+    period, width = BOLL_PARAMS
+    mid, upper, lower = [], [], []
+    for i in range(len(close)):
+        if i + 1 < period:
+            mid.append(None), upper.append(None), lower.append(None)
+            continue
+        window = close[i + 1 - period:i + 1]
+        mean = sum(window) / period
+        std = math.sqrt(sum((value - mean) ** 2 for value in window) / period)
+        mid.append(mean), upper.append(mean + width * std), lower.append(mean - width * std)
+    return mid, upper, lower
+
+
+def assert_series(actual, expected):
+    """与参考序列逐项比较（参考值为None的位置应为NaN）"""
+    actual = np.asarray(actual).ravel()
+    assert len(actual) == len(expected)
+    for value, reference in zip(actual, expected):
+        if reference is None:
+            assert np.isnan(value)
+        else:
+            assert value == pytest.approx(reference, rel=1e-9, abs=1e-9)
+
+
+def test_indicators_match_loop_reference():
+    close, high, low, volume = make_bars()
+    indicators = compute_indicators(close, high, low, volume)
+    close_list, high_list, low_list = close.tolist(), high.tolist(), low.tolist()
+
+    for period in MA_PERIODS:
+        assert_series(indicators[f"ma{period}"], ref_sma(close_list, period))
+
+    dif, dea, hist = ref_macd(close_list)
+    assert_series(indicators["macd_dif"], dif)
+    assert_series(indicators["macd_dea"], dea)
+    assert_series(indicators["macd_hist"], hist)
+
+    for period in RSI_PERIODS:
+        assert_series(indicators[f"rsi{period}"], ref_rsi(close_list, period))
+
+    k, d, j = ref_kdj(close_list, high_list, low_list)
+    assert_series(indicators["kdj_k"], k)
+    assert_series(indicators["kdj_d"], d)
+    assert_series(indicators["kdj_j"], j)
+
+    mid, upper, lower = ref_boll(close_list)
+    assert_series(indicators["boll_mid"], mid)
+    assert_series(indicators["boll_upper"], upper)
+    assert_series(indicators["boll_lower"], lower)
+
+
+def test_batch_matches_single_series():
+    bars = [make_bars(seed=seed) for seed in range(3)]
+    batch = compute_indicators(*(np.vstack([b[i] for b in bars]) for i in range(4)))
+
+    for series, single_bars in enumerate(bars):
+        single = compute_indicators(*single_bars)
+        for name, values in single.items():
+            np.testing.assert_allclose(batch[name][series], values[0], equal_nan=True)
+
+
+@pytest.mark.parametrize("length", [1, 3, 8])
+def test_short_series_give_missing_values(length):
+    close, high, low, volume = make_bars(length)
+    indicators = compute_indicators(close, high, low, volume)
+
+    assert all(values.shape == (1, length) for values in indicators.values())
+    assert np.isnan(indicators["ma20"]).all()
+    assert np.isnan(indicators["boll_upper"]).all()
+    assert np.isnan(indicators["rsi24"]).all()
+
+    summary = summarize(indicators)
+    assert summary["ma60"] is None and summary["boll_mid"] is None and summary["rsi24"] is None
+    assert summary["close"] == pytest.approx(round(close[-1], 4))
+    assert "MA60=N/A" in format_summary(summary)
+
+
+def test_parse_kline_markdown_round_trip():
+    close, high, low, volume = make_bars(30)
+    dates = [f"2024-01-{day:02d}" for day in range(1, 31)]
+    lines = ["| date | open | high | low | close | volume |", "|---|---|---|---|---|---|"]
+    lines += [f"| {date} | {c:.4f} | {h:.4f} | {l:.4f} | {c:.4f} | {v:.0f} |"
+              for date, c, h, l, v in zip(dates, close, high, low, volume)]
+    lines.insert(5, "| 2024-01-04 | | | | - | |")  # 缺失的收盘价被跳过
+
+    parsed = parse_kline_markdown("K线数据:\n" + "\n".join(lines))
+
+    assert parsed["dates"].tolist() == dates
+    np.testing.assert_allclose(parsed["close"], close.round(4))
+    np.testing.assert_allclose(parsed["high"], high.round(4))
+    np.testing.assert_allclose(parsed["volume"], volume.round(0))
+    assert parse_kline_markdown("没有表格") is None
@@ -0,0 +1,104 @@
+"""工具结果缓存测试：未命中、并发请求合并、等待方取消"""
+
+import asyncio
+
+from tool_cache import ToolResultCache
+
+
+ARGS = {"code": "sh.600519", "start_date": "2023-01-01", "end_date": "2023-12-31"}
+
+
+class SlowTool:
+    """在 release 事件触发前一直挂起的工具，统计调用和取消次数"""
+
+    def __init__(self):
+        self.calls = 0
+        self.cancelled = 0
+        self.release = asyncio.Event()
+
+    async def __call__(self, **arguments):
+        self.calls += 1
+        try:
+            await self.release.wait()
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        return f"K线数据 {arguments['code']}"
+
+
+def test_miss_then_hit():
+    async def main():
+        cache = ToolResultCache()
+        tool = SlowTool()
+        tool.release.set()
+
+        first = await cache.call("get_historical_k_data", tool, ARGS)
+        second = await cache.call("get_historical_k_data", tool, ARGS)
+        return cache, tool, first, second
+
+    cache, tool, first, second = asyncio.run(main())
+
+    assert first == second == "K线数据 sh.600519"
+    assert tool.calls == 1
+    assert cache.stats()["get_historical_k_data"]["misses"] == 1
+    assert cache.stats()["get_historical_k_data"]["hits"] == 1
+    assert cache._waiters == {} and cache._inflight == {}
+
+
+def test_concurrent_miss_joins_inflight_call():
+    async def main():
+        cache = ToolResultCache()
+        tool = SlowTool()
+        callers = [asyncio.create_task(cache.call("get_historical_k_data", tool, ARGS)) for _ in range(3)]
+        await asyncio.sleep(0)
+        tool.release.set()
+        return cache, tool, await asyncio.gather(*callers)
+
+    cache, tool, results = asyncio.run(main())
+
+    assert results == ["K线数据 sh.600519"] * 3
+    assert tool.calls == 1
+    stats = cache.stats()["get_historical_k_data"]
+    assert stats["misses"] == 1 and stats["coalesced"] == 2
+    assert cache._waiters == {} and cache._inflight == {}
+
+
+def test_cancelled_caller_does_not_cancel_shared_call():
+    async def main():
+        cache = ToolResultCache()
+        tool = SlowTool()
+        leaving = asyncio.create_task(cache.call("get_historical_k_data", tool, ARGS))
+        staying = asyncio.create_task(cache.call("get_historical_k_data", tool, ARGS))
+        await asyncio.sleep(0)
+
+        leaving.cancel()
+        await asyncio.sleep(0)
+        assert not staying.done()
+
+        tool.release.set()
+        result = await staying
+        return cache, tool, leaving, result
+
+    cache, tool, leaving, result = asyncio.run(main())
+
+    assert leaving.cancelled()
+    assert result == "K线数据 sh.600519"
+    assert tool.calls == 1 and tool.cancelled == 0
+    assert cache._waiters == {} and cache._inflight == {}
+
+
+def test_last_caller_leaving_cancels_the_call():
+    async def main():
+        cache = ToolResultCache()
+        tool = SlowTool()
+        caller = asyncio.create_task(cache.call("get_historical_k_data", tool, ARGS))
+        await asyncio.sleep(0)
+        caller.cancel()
+        await asyncio.gather(caller, return_exceptions=True)
+        await asyncio.sleep(0)
+        return cache, tool
+
+    cache, tool = asyncio.run(main())
+
+    assert tool.cancelled == 1
+    assert cache._waiters == {} and cache._inflight == {}
@@ -0,0 +1,30 @@
+"""FIFO批次匹配测试：FIFO已实现盈亏与持仓账本的平均成本法盈亏"""
+
+from position_ledger import PositionLedger
+from trade_lots import analyze_trades
+
+
+TRANSACTIONS = [
+    {"date": "2024-01-02", "stock_code": "sh.600519", "action": "BUY", "shares": 100, "price": 10, "amount": 1000},
+    {"date": "2024-01-03", "stock_code": "sh.600519", "action": "BUY", "shares": 100, "price": 14, "amount": 1400},
+    {"date": "2024-01-04", "stock_code": "sh.600519", "action": "SELL", "shares": 100, "price": 15, "amount": 1500},
+    {"date": "2024-01-05", "stock_code": "sh.600519", "action": "SELL", "shares": 100, "price": 13, "amount": 1300},
+]
+
+
+def realized_after(count):
+    """前 count 笔交易后的 (平均成本法, FIFO) 已实现盈亏"""
+    ledger = PositionLedger()
+    for transaction in TRANSACTIONS[:count]:
+        ledger.record(transaction)
+    return ledger.realized_pnl, analyze_trades(TRANSACTIONS[:count])["summary"]["fifo_realized_pnl"]
+
+
+def test_fifo_and_average_cost_pnl_differ_while_holding():
+    # 第一次卖出：FIFO 匹配 10 元的批次，平均成本为 12 元
+    assert realized_after(3) == (300.0, 500.0)
+
+
+def test_fifo_and_average_cost_pnl_agree_after_closing():
+    assert realized_after(4) == (400.0, 400.0)
+    assert "realized_pnl" not in analyze_trades(TRANSACTIONS)["summary"]
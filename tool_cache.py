@@ -0,0 +1,230 @@
+"""
+MCP工具结果缓存
+
+包装 MultiServerMCPClient.get_tools() 返回的工具，按 (工具名, 规范化参数) 缓存调用结果：
+- 参数只涉及已结束的历史区间时，结果永久有效
+- 涉及当天（或未指定日期，即"最新"数据）时，使用较短的TTL
+- 相同参数的并发调用共享同一个进行中的请求
+"""
+
+import asyncio
+import calendar
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, timedelta
+from typing import Any, Dict, List, Optional
+
+from langchain_core.tools import BaseTool
+
+
+# "最新"数据的默认缓存时间（秒）
+DEFAULT_LIVE_TTL = 300
+# 默认最多保留的缓存条目数
+DEFAULT_MAX_ENTRIES = 5000
+# 财报发布滞后天数：报告期结束后超过该天数才视为数据已定稿
+FINANCIAL_REPORT_LAG_DAYS = 120
+
+# 表示区间结束位置的日期参数（按优先级）
+_END_DATE_KEYS = ("end_date", "date", "start_date")
+_DATE_PATTERN = re.compile(r"^(\d{4})(?:-(\d{2}))?(?:-(\d{2}))?$")
+
+
+def canonical_arguments(arguments: Dict[str, Any]) -> str:
+    """将工具参数规范化为稳定的字符串（键排序，忽略空值）"""
+    cleaned = {key: value for key, value in arguments.items() if value not in (None, "", [])}
+    return json.dumps(cleaned, ensure_ascii=False, sort_keys=True, default=str)
+
+
+def _period_end(value: str) -> Optional[date]:
+    """解析 YYYY / YYYY-MM / YYYY-MM-DD，返回该时间段的最后一天"""
+    match = _DATE_PATTERN.match(str(value).strip())
+    if not match:
+        return None
+
+    year, month, day = match.groups()
+    year = int(year)
+    if day:
+        return date(year, int(month), int(day))
+    if month:
+        month = int(month)
+        return date(year, month, calendar.monthrange(year, month)[1])
+    return date(year, 12, 31)
+
+
+def data_final_date(arguments: Dict[str, Any]) -> Optional[date]:
+    """
+    推断工具结果在哪一天之后不再变化
+
+    Args:
+        arguments: 工具参数
+
+    Returns:
+        数据定稿日期；参数中没有时间信息（查询最新数据）时返回None
+    """
+    for key in _END_DATE_KEYS:
+        if arguments.get(key):
+            end = _period_end(arguments[key])
+            if end:
+                return end
+
+    if arguments.get("year"):
+        try:
+            year = int(arguments["year"])
+        except (TypeError, ValueError):
+            return None
+        quarter = arguments.get("quarter")
+        if quarter:
+            month = int(quarter) * 3
+            end = date(year, month, calendar.monthrange(year, month)[1])
+        else:
+            end = date(year, 12, 31)
+        return end + timedelta(days=FINANCIAL_REPORT_LAG_DAYS)
+
+    return None
+
+
+class ToolResultCache:
+    """MCP工具调用结果缓存（带日期感知TTL和并发请求合并）"""
+
+    def __init__(self, live_ttl: float = DEFAULT_LIVE_TTL, max_entries: int = DEFAULT_MAX_ENTRIES):
+        """
+        初始化缓存
+
+        Args:
+            live_ttl: 涉及当天或最新数据的结果缓存时间（秒）
+            max_entries: 最多保留的条目数（超出后按最近使用淘汰）
+        """
+        self.live_ttl = live_ttl
+        self.max_entries = max_entries
+
+        self._entries = OrderedDict()  # key -> (过期时间或None, 结果)
+        self._inflight = {}  # key -> 进行中的asyncio.Task
+        self._waiters = {}  # 进行中的asyncio.Task -> 等待方数量
+        self._stats = {}  # 工具名 -> 统计计数
+        self._lock = threading.Lock()
+
+    def _count(self, tool_name: str, field: str):
+        """累加某个工具的统计计数"""
+        with self._lock:
+            stats = self._stats.setdefault(tool_name, {"hits": 0, "misses": 0, "coalesced": 0})
+            stats[field] += 1
+
+    def _ttl_for(self, arguments: Dict[str, Any]) -> Optional[float]:
+        """已结束的历史区间永久有效（返回None），否则使用短TTL"""
+        final_date = data_final_date(arguments)
+        if final_date is not None and final_date < date.today():
+            return None
+        return self.live_ttl
+
+    def _get(self, key: str) -> Any:
+        """读取未过期的缓存条目，不存在时返回 (False, None)"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return False, None
+            expires_at, result = entry
+            if expires_at is not None and expires_at < time.time():
+                del self._entries[key]
+                return False, None
+            self._entries.move_to_end(key)
+            return True, result
+
+    def _put(self, key: str, result: Any, ttl: Optional[float]):
+        """写入缓存条目并按最近使用淘汰"""
+        expires_at = None if ttl is None else time.time() + ttl
+        with self._lock:
+            self._entries[key] = (expires_at, result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    async def call(self, tool_name: str, coroutine, arguments: Dict[str, Any]) -> Any:
+        """
+        通过缓存调用工具
+
+        Args:
+            tool_name: 工具名
+            coroutine: 原始工具协程函数
+            arguments: 工具参数
+
+        Returns:
+            工具结果
+        """
+        key = f"{tool_name}:{canonical_arguments(arguments)}"
+
+        found, result = self._get(key)
+        if found:
+            self._count(tool_name, "hits")
+            return result
+
+        loop = asyncio.get_running_loop()
+        task = self._inflight.get(key)
+        if task is not None and task.get_loop() is loop:
+            self._count(tool_name, "coalesced")
+        else:
+            self._count(tool_name, "misses")
+
+            async def fetch():
+                result = await coroutine(**arguments)
+                self._put(key, result, self._ttl_for(arguments))
+                return result
+
+            task = loop.create_task(fetch())
+            self._inflight[key] = task
+            self._waiters[task] = 0
+            task.add_done_callback(self._forget)
+
+        # shield: 某个等待方被取消时不影响其他共享该请求的调用；所有等待方都离开时才取消请求本身
+        self._waiters[task] += 1
+        try:
+            return await asyncio.shield(task)
+        finally:
+            # 计数由等待方自己维护：最后一个等待方离开时移除计数，请求仍在进行则取消
+            remaining = self._waiters[task] - 1
+            if remaining:
+                self._waiters[task] = remaining
+            else:
+                del self._waiters[task]
+                if not task.done():
+                    task.cancel()
+
+    def _forget(self, task: asyncio.Task):
+        """请求结束后从进行中列表移除（等待方计数由等待方离开时移除）"""
+        for key, inflight in list(self._inflight.items()):
+            if inflight is task:
+                del self._inflight[key]
+
+    def wrap_tool(self, tool: BaseTool) -> BaseTool:
+        """为单个工具添加缓存（仅包装异步工具）"""
+        coroutine = getattr(tool, "coroutine", None)
+        if coroutine is None:
+            return tool
+
+        async def cached_coroutine(**arguments):
+            return await self.call(tool.name, coroutine, arguments)
+
+        return tool.model_copy(update={"coroutine": cached_coroutine})
+
+    def wrap_tools(self, tools: List[BaseTool]) -> List[BaseTool]:
+        """为工具列表添加缓存"""
+        return [self.wrap_tool(tool) for tool in tools]
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """
+        获取每个工具的缓存统计
+
+        Returns:
+            工具名 -> {hits, misses, coalesced, hit_rate}
+        """
+        with self._lock:
+            result = {}
+            for tool_name, stats in self._stats.items():
+                total = stats["hits"] + stats["misses"] + stats["coalesced"]
+                result[tool_name] = {
+                    **stats,
+                    "hit_rate": (stats["hits"] + stats["coalesced"]) / total if total else 0.0
+                }
+            return result
@@ -0,0 +1,186 @@
+"""
+FIFO批次匹配
+
+把每笔卖出按先进先出匹配到之前买入的批次，得到每次卖出（一次完整的买卖往返）的盈亏和持有天数，
+并汇总胜率、盈亏比等交易统计。
+
+这里的盈亏按FIFO批次成本计算（fifo_realized_pnl），与持仓账本按平均成本法结转的 realized_pnl 不同：
+两者只在尚有持仓时因剩余股数分摊的成本不同而有差异，全部清仓后相等
+
+匹配在一次线性扫描中向量化完成：买入和卖出的累计股数把“股数轴”切分为若干区间，
+每个区间恰好属于一个买入批次和一笔卖出，用 searchsorted 定位两者后按区间股数加权汇总
+"""
+
+from typing import Any, Dict, List
+
+import numpy as np
+
+
+# 小于该股数的匹配区间视为浮点误差，忽略
+SHARE_EPSILON = 1e-9
+
+
+def match_fifo(buy_shares: np.ndarray, buy_prices: np.ndarray, buy_dates: np.ndarray,
+               sell_shares: np.ndarray, sell_prices: np.ndarray, sell_dates: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    按先进先出匹配单只股票的买卖（买入、卖出各自按时间顺序排列）
+
+    Args:
+        buy_shares: 每笔买入的股数
+        buy_prices: 每笔买入的每股成本
+        buy_dates: 每笔买入的日期（datetime64[D]）
+        sell_shares: 每笔卖出的股数
+        sell_prices: 每笔卖出的每股价格
+        sell_dates: 每笔卖出的日期（datetime64[D]）
+
+    Returns:
+        按卖出排列的数组: shares（已匹配股数）、cost（匹配批次的成本）、proceeds（卖出收入）、
+        pnl（已实现盈亏）、holding_days（按股数加权的平均持有天数）
+    """
+    n_sells = len(sell_shares)
+    empty = np.zeros(n_sells)
+    if n_sells == 0 or len(buy_shares) == 0:
+        return {"shares": empty, "cost": empty, "proceeds": empty, "pnl": empty, "holding_days": empty}
+
+    buy_bounds = np.cumsum(buy_shares)
+    # 卖出不会超过之前的买入，超出部分只可能是浮点误差
+    sell_bounds = np.minimum(np.cumsum(sell_shares), buy_bounds[-1])
+
+    # 合并两组边界，相邻边界之间的区间属于同一个买入批次和同一笔卖出
+    bounds = np.union1d(buy_bounds, sell_bounds)
+    bounds = bounds[bounds <= sell_bounds[-1]]
+    starts = np.concatenate(([0.0], bounds[:-1]))
+    quantities = bounds - starts
+    valid = quantities > SHARE_EPSILON
+    starts, quantities = starts[valid], quantities[valid]
+
+    lots = np.searchsorted(buy_bounds, starts, side="right")
+    sells = np.searchsorted(sell_bounds, starts, side="right")
+
+    held = (sell_dates[sells] - buy_dates[lots]).astype("timedelta64[D]").astype(float)
+    shares = np.bincount(sells, weights=quantities, minlength=n_sells)
+    cost = np.bincount(sells, weights=quantities * buy_prices[lots], minlength=n_sells)
+    proceeds = sell_prices * shares
+    weighted_days = np.bincount(sells, weights=quantities * held, minlength=n_sells)
+
+    return {
+        "shares": shares,
+        "cost": cost,
+        "proceeds": proceeds,
+        "pnl": proceeds - cost,
+        "holding_days": np.divide(weighted_days, shares, out=np.zeros(n_sells), where=shares > 0)
+    }
+
+
+def summarize_round_trips(pnl: np.ndarray, cost: np.ndarray, holding_days: np.ndarray) -> Dict[str, Any]:
+    """
+    汇总往返交易统计
+
+    Args:
+        pnl: 每次往返的已实现盈亏
+        cost: 每次往返的成本
+        holding_days: 每次往返的持有天数
+
+    Returns:
+        胜率、盈亏比、平均盈利/亏损、平均持有天数、FIFO已实现盈亏等
+    """
+    count = len(pnl)
+    wins = pnl[pnl > 0]
+    losses = pnl[pnl < 0]
+    gross_profit = float(wins.sum())
+    gross_loss = float(-losses.sum())
+
+    return {
+        "round_trips": count,
+        "winning_trades": len(wins),
+        "losing_trades": len(losses),
+        "win_rate": len(wins) / count if count else 0.0,
+        "gross_profit": gross_profit,
+        "gross_loss": gross_loss,
+        # 没有亏损交易时盈亏比无穷大，返回None以便JSON序列化
+        "profit_factor": gross_profit / gross_loss if gross_loss > 0 else None,
+        "avg_win": float(wins.mean()) if len(wins) else 0.0,
+        "avg_loss": float(losses.mean()) if len(losses) else 0.0,
+        "avg_return": float(np.mean(np.divide(pnl, cost, out=np.zeros(count), where=cost > 0))) if count else 0.0,
+        "avg_holding_days": float(holding_days.mean()) if count else 0.0,
+        "fifo_realized_pnl": float(pnl.sum())
+    }
+
+
+def transactions_to_arrays(transactions: List[Dict[str, Any]]) -> Dict[str, np.ndarray]:
+    """
+    将交易记录转换为列数组
+
+    Args:
+        transactions: 按时间顺序排列的交易记录（date、stock_code、action、shares、amount）
+
+    Returns:
+        列数组: stock（股票序号）、is_buy、shares、price（每股金额，含费用）、date（datetime64[D]），
+        以及 stock_codes（序号对应的股票代码列表）
+    """
+    stock_index: Dict[str, int] = {}
+    stocks = [stock_index.setdefault(t['stock_code'], len(stock_index)) for t in transactions]
+    shares = np.array([t['shares'] for t in transactions], dtype=float)
+    amounts = np.array([t['amount'] for t in transactions], dtype=float)
+    return {
+        "stock_codes": list(stock_index),
+        "stock": np.array(stocks, dtype=np.int64),
+        "is_buy": np.array([t['action'] == 'BUY' for t in transactions], dtype=bool),
+        "shares": shares,
+        "price": np.divide(amounts, shares, out=np.zeros(len(shares)), where=shares > 0),
+        "date": np.array([t['date'] for t in transactions], dtype="datetime64[D]")
+    }
+
+
+def analyze_trades(transactions: List[Dict[str, Any]], include_round_trips: bool = True) -> Dict[str, Any]:
+    """
+    对交易记录做FIFO批次匹配并计算交易统计
+
+    Args:
+        transactions: 按时间顺序排列的交易记录（date、stock_code、action、shares、price、amount）
+        include_round_trips: 是否返回每笔往返的明细（参数扫描等只需要统计时可关闭）
+
+    Returns:
+        {"summary": 交易统计, "round_trips": 每笔卖出的往返明细}
+    """
+    round_trips = []
+    pnl_parts, cost_parts, days_parts = [], [], []
+    if transactions:
+        columns = transactions_to_arrays(transactions)
+        for stock, stock_code in enumerate(columns["stock_codes"]):
+            in_stock = columns["stock"] == stock
+            buys = in_stock & columns["is_buy"]
+            sells = in_stock & ~columns["is_buy"]
+            if not sells.any():
+                continue
+
+            matched = match_fifo(
+                columns["shares"][buys], columns["price"][buys], columns["date"][buys],
+                columns["shares"][sells], columns["price"][sells], columns["date"][sells]
+            )
+
+            # 只统计匹配到买入批次的卖出
+            closed = matched["shares"] > SHARE_EPSILON
+            pnl_parts.append(matched["pnl"][closed])
+            cost_parts.append(matched["cost"][closed])
+            days_parts.append(matched["holding_days"][closed])
+
+            if include_round_trips:
+                sell_dates = columns["date"][sells][closed].astype(str)
+                returns = np.divide(matched["pnl"], matched["cost"], out=np.zeros(len(closed)), where=matched["cost"] > 0)
+                for date, shares, cost, proceeds, pnl, ret, days in zip(
+                        sell_dates, matched["shares"][closed].tolist(), matched["cost"][closed].tolist(),
+                        matched["proceeds"][closed].tolist(), matched["pnl"][closed].tolist(),
+                        returns[closed].tolist(), matched["holding_days"][closed].tolist()):
+                    round_trips.append({
+                        "date": date, "stock_code": stock_code, "shares": shares, "cost": cost,
+                        "proceeds": proceeds, "pnl": pnl, "return": ret, "holding_days": days
+                    })
+
+    summary = summarize_round_trips(
+        np.concatenate(pnl_parts) if pnl_parts else np.array([]),
+        np.concatenate(cost_parts) if cost_parts else np.array([]),
+        np.concatenate(days_parts) if days_parts else np.array([])
+    )
+    round_trips.sort(key=lambda trip: trip["date"])
+    return {"summary": summary, "round_trips": round_trips}